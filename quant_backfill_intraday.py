@@ -1,10 +1,20 @@
 import requests
 import psycopg2
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
 import os
+import queue
+import threading
 import time
 import sys
 
+from quant_candle_loader import bulk_load_columns
+from quant_columnar import parse_chart_response
+from quant_calendar import exchange_today
+from quant_coverage import MIN_FILL, plan_missing_chunks
+from quant_fmp_client import TokenBucket, make_session, get_cached_bytes
+from quant_fmp_cache import get_cache
+
 # === Config ===
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
@@ -14,7 +24,10 @@ DB_PORT = os.environ.get("DB_PORT", "5432")
 FMP_API_KEY = os.environ.get("FMP_API_KEY")
 
 TOTAL_DAYS_BACK = 180
-CHUNK_SIZE = 3  # FMP allows ~3 days per 1min request
+
+# Universe mode: size these to the FMP plan (Starter = 300 requests/min)
+FMP_REQUESTS_PER_MINUTE = int(os.environ.get("FMP_REQUESTS_PER_MINUTE", "300"))
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "8"))
 
 FMP_URL = "https://financialmodelingprep.com/stable/historical-chart/1min"
 
@@ -23,61 +36,182 @@ def connect():
     conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
     return psycopg2.connect(conn_string)
 
-def fetch_chunk(symbol, from_date, to_date):
-    url = f"{FMP_URL}?symbol={symbol}&from={from_date}&to={to_date}&apikey={FMP_API_KEY}"
+def fetch_chunk(symbol, from_date, to_date, session=requests):
+    params = {"symbol": symbol, "from": from_date, "to": to_date, "apikey": FMP_API_KEY}
     print(f"📡 Fetching: {symbol} {from_date} → {to_date}")
     try:
-        res = requests.get(url)
-        res.raise_for_status()
-        return res.json()
+        return parse_chart_response(get_cached_bytes(session, None, FMP_URL, params, cache=get_cache()))
     except Exception as e:
         print(f"❌ Fetch failed: {e}")
-        return []
+        return None
 
-def insert_candles(symbol, candles):
+def insert_candles(symbol, candles, from_date, to_date):
     conn = connect()
-    cur = conn.cursor()
-    inserted = 0
+    try:
+        inserted, duplicates = bulk_load_columns(conn, symbol, candles, (from_date, to_date))
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"✅ Inserted {inserted} candles for {symbol} ({duplicates} duplicates skipped)")
 
-    for row in candles:
-        try:
-            dt = datetime.strptime(row["date"], "%Y-%m-%d %H:%M:%S")
-            cur.execute("""
-                INSERT INTO quant_candles_intraday (ticker, datetime, open, high, low, close, volume)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (ticker, datetime) DO NOTHING;
-            """, (symbol, dt, row["open"], row["high"], row["low"], row["close"], row["volume"]))
-            inserted += 1
-        except Exception as e:
-            print(f"⚠️ Skipping row due to error: {e}")
-
-    conn.commit()
-    conn.close()
-    print(f"✅ Inserted {inserted} candles for {symbol}")
+def plan_chunks(conn, symbol, days_back=TOTAL_DAYS_BACK, min_fill=MIN_FILL):
+    # Only the sessions the coverage index does not already hold in full.
+    today = exchange_today()
+    return plan_missing_chunks(conn, symbol, today - timedelta(days=days_back), today, min_fill=min_fill)
 
 # === Main Logic ===
-def backfill(symbol):
-    today = datetime.utcnow().date()
-    start_date = today - timedelta(days=TOTAL_DAYS_BACK)
-    current = start_date
-
-    while current < today:
-        from_str = current.strftime("%Y-%m-%d")
-        to_str = (current + timedelta(days=CHUNK_SIZE - 1)).strftime("%Y-%m-%d")
+def backfill(symbol, min_fill=MIN_FILL):
+    conn = connect()
+    chunks = plan_chunks(conn, symbol, min_fill=min_fill)
+    conn.close()
+    print(f"🧭 {len(chunks)} chunks missing for {symbol}")
 
+    for from_str, to_str in chunks:
         candles = fetch_chunk(symbol, from_str, to_str)
-        if candles:
-            insert_candles(symbol, candles)
-        else:
-            print(f"⚠️ No data returned for {symbol} {from_str} → {to_str}")
+        if candles is not None:
+            if len(candles["datetime"]) == 0:
+                print(f"⚠️ No data returned for {symbol} {from_str} → {to_str}")
+            insert_candles(symbol, candles, from_str, to_str)
 
-        current += timedelta(days=CHUNK_SIZE)
         time.sleep(1)  # avoid rate limits
 
+# === Universe Mode ===
+_stats_lock = threading.Lock()
+
+def _count(stats, key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+def _recover(conn):
+    # After a failed write: the same connection if it can still roll back,
+    # else a fresh one, else None.
+    try:
+        conn.rollback()
+        return conn
+    except Exception:
+        pass
+    try:
+        conn.close()
+    except Exception:
+        pass
+    try:
+        return connect()
+    except Exception as e:
+        print(f"❌ Reconnect failed: {e}")
+        return None
+
+def _write_candles(conn, write_queue, stats, failed):
+    # Single writer thread: one connection, one commit per fetched chunk.
+    # A connection that dies is replaced; if that fails too the writer stops,
+    # and `failed` (set however it exits) tells fetchers to stop queueing.
+    try:
+        while conn is not None:
+            item = write_queue.get()
+            if item is None:
+                break
+            symbol, candles, from_str, to_str = item
+            try:
+                inserted, duplicates = bulk_load_columns(conn, symbol, candles, (from_str, to_str))
+                conn.commit()
+                _count(stats, "inserted", inserted)
+                _count(stats, "duplicates", duplicates)
+            except Exception as e:
+                _count(stats, "write_errors")
+                print(f"❌ Write failed for {symbol}: {e}")
+                conn = _recover(conn)
+                if conn is None:
+                    print("❌ No database connection, dropping the remaining chunks")
+    finally:
+        failed.set()
+        if conn is not None:
+            conn.close()
+
+def _enqueue(write_queue, item, failed):
+    # Blocks while the queue is full, but gives up once the writer is gone.
+    while not failed.is_set():
+        try:
+            write_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _fetch_and_enqueue(session, limiter, write_queue, stats, failed, symbol, from_str, to_str):
+    if failed.is_set():
+        _count(stats, "skipped")
+        return
+    params = {"symbol": symbol, "from": from_str, "to": to_str, "apikey": FMP_API_KEY}
+    try:
+        candles = parse_chart_response(get_cached_bytes(session, limiter, FMP_URL, params, cache=get_cache()))
+    except Exception as e:
+        _count(stats, "fetch_errors")
+        print(f"❌ Fetch failed: {symbol} {from_str} → {to_str}: {e}")
+        return
+    if len(candles["datetime"]) == 0:
+        _count(stats, "empty")
+    # Empty chunks are written too, so the coverage index remembers them.
+    if not _enqueue(write_queue, (symbol, candles, from_str, to_str), failed):
+        _count(stats, "skipped")
+
+def backfill_universe(tickers, max_in_flight=MAX_IN_FLIGHT, requests_per_minute=FMP_REQUESTS_PER_MINUTE,
+                      days_back=TOTAL_DAYS_BACK, min_fill=MIN_FILL):
+    start_time = time.time()
+    conn = connect()
+    jobs = [(symbol, from_str, to_str)
+            for symbol in tickers
+            for from_str, to_str in plan_chunks(conn, symbol, days_back, min_fill)]
+    print(f"🔍 Backfilling {len(tickers)} tickers: {len(jobs)} requests at "
+          f"{requests_per_minute}/min, {max_in_flight} in flight")
+
+    limiter = TokenBucket(requests_per_minute)
+    session = make_session(pool_size=max_in_flight)
+    stats = {"inserted": 0, "duplicates": 0, "empty": 0, "fetch_errors": 0, "write_errors": 0, "skipped": 0}
+
+    # Bounded queue so fetches pause instead of buffering unbounded candles
+    # when the database falls behind.
+    write_queue = queue.Queue(maxsize=max_in_flight * 2)
+    failed = threading.Event()  # set once the writer stops taking chunks
+    writer = threading.Thread(target=_write_candles, args=(conn, write_queue, stats, failed), daemon=True)
+    writer.start()
+
+    done = 0
+    next_report = 100
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = set()
+        for job in jobs:
+            if len(pending) >= max_in_flight:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                done += len(finished)
+                if done >= next_report:
+                    print(f"📈 {done}/{len(jobs)} requests done, {stats['inserted']} candles inserted")
+                    next_report += 100
+            pending.add(pool.submit(_fetch_and_enqueue, session, limiter, write_queue, stats, failed, *job))
+        wait(pending)
+
+    _enqueue(write_queue, None, failed)
+    writer.join()
+    while not write_queue.empty():
+        if write_queue.get_nowait() is not None:
+            _count(stats, "skipped")
+    session.close()
+
+    elapsed = time.time() - start_time
+    print(f"✅ Inserted {stats['inserted']} candles ({stats['duplicates']} duplicates skipped), "
+          f"{stats['empty']} empty chunks, {stats['fetch_errors']} fetch errors, "
+          f"{stats['write_errors']} write errors, {stats['skipped']} requests skipped after the writer stopped")
+    print(f"⏱️ Done in {elapsed:.2f} seconds")
+    return stats
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        ticker = sys.argv[1].upper()
+    # --min-fill=0.8 refetches closed sessions holding under 80% of their bars.
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    min_fill = float(flags.get("min-fill", MIN_FILL))
+    if len(args) > 1:
+        backfill_universe([t.upper() for t in args], min_fill=min_fill)
+    elif args:
+        ticker = args[0].upper()
         print(f"🔍 Backfilling data for: {ticker}")
-        backfill(ticker)
+        backfill(ticker, min_fill)
     else:
-        print("❌ Please provide a ticker symbol. Example: python3 quant_backfill_intraday.py GRRR")
+        print("❌ Please provide a ticker symbol. Example: python3 quant_backfill_intraday.py GRRR [--min-fill=0.5]")
@@ -0,0 +1,284 @@
+import psycopg2
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import json
+import os
+import sys
+import time
+
+from quant_label_forward_returns import LABEL_TABLE
+from quant_label_kernels import forward_index
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+BACKTEST_DIR = os.environ.get("QUANT_BACKTEST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".quant_backtest"))
+BACKTEST_WORKERS = int(os.environ.get("BACKTEST_WORKERS", os.cpu_count() or 1))
+COMBOS_PER_TASK = 64
+COST_PCT = 0.02  # round-trip cost per trade, in percent of the entry price
+
+# Rule features, as expressions over the labeled-table columns.
+FEATURES = {"rsi": "rsi", "hist": "macd - macd_signal", "vwap": "close / vwap"}
+FEATURE_INPUTS = ["close", "rsi", "macd", "macd_signal", "vwap"]
+
+# Rule parameters: name -> (feature, comparison). A rule enters long on
+# every bar where all of its conditions hold.
+CONDITIONS = {
+    "rsi_below": ("rsi", np.less), "rsi_above": ("rsi", np.greater),
+    "hist_below": ("hist", np.less), "hist_above": ("hist", np.greater),
+    "vwap_below": ("vwap", np.less), "vwap_above": ("vwap", np.greater),
+}
+
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+# === Prepared Arrays ===
+# The universe is flattened once into one array per feature (tickers back to
+# back, each sorted by time) plus, per hold, the row index of the exit bar,
+# and saved as .npy files. Workers open them with mmap_mode="r", so every
+# process shares the page cache instead of a pickled copy.
+
+def load_ticker(symbol, source="db"):
+    columns = ["datetime"] + FEATURE_INPUTS
+    if source == "local":
+        from quant_local_mirror import read_local
+        return read_local(LABEL_TABLE, symbol, columns=columns, not_null=FEATURE_INPUTS)
+    conn = connect()
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM {LABEL_TABLE}
+        WHERE ticker = %s {"".join(f"AND {c} IS NOT NULL " for c in FEATURE_INPUTS)}
+        ORDER BY datetime;
+    """
+    df = pd.read_sql_query(query, conn, params=(symbol,))
+    conn.close()
+    return df
+
+def prepare_arrays(frames, holds, name, tolerance=0):
+    # frames: {ticker: frame with datetime + FEATURE_INPUTS}. Writes the
+    # arrays under BACKTEST_DIR/name and returns that directory.
+    if min(holds) <= tolerance:
+        raise ValueError(f"Every hold must be longer than the tolerance ({tolerance} min), got {sorted(holds)}")
+    path = os.path.join(BACKTEST_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    tickers = [t for t, df in frames.items() if len(df)]
+    lengths = [len(frames[t]) for t in tickers]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    stamps = np.concatenate([frames[t]["datetime"].to_numpy().astype("datetime64[m]") for t in tickers]) \
+        if tickers else np.empty(0, dtype="datetime64[m]")
+    np.save(os.path.join(path, "stamps.npy"), stamps)
+    np.save(os.path.join(path, "close.npy"),
+            np.concatenate([frames[t]["close"].to_numpy(np.float64) for t in tickers]) if tickers else np.empty(0))
+    for feature, expression in FEATURES.items():
+        values = [np.asarray(pd.eval(expression, local_dict={c: frames[t][c].to_numpy(np.float64) for c in FEATURE_INPUTS},
+                                     engine="python"), dtype=np.float64) for t in tickers]
+        np.save(os.path.join(path, f"{feature}.npy"), np.concatenate(values) if values else np.empty(0))
+    for hold in holds:
+        exits = np.full(offsets[-1], -1, dtype=np.int64)
+        for i, t in enumerate(tickers):
+            found = forward_index(stamps[offsets[i]:offsets[i + 1]], hold, tolerance)
+            exits[offsets[i]:offsets[i + 1]] = np.where(found >= 0, found + offsets[i], -1)
+        np.save(os.path.join(path, f"exit_{hold}.npy"), exits)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"tickers": tickers, "offsets": offsets.tolist(), "holds": list(holds), "tolerance": tolerance}, f)
+    return path
+
+def prepare(tickers, holds, name="universe", source="db", tolerance=0):
+    start_time = time.time()
+    frames = {symbol: load_ticker(symbol, source) for symbol in tickers}
+    path = prepare_arrays(frames, holds, name, tolerance)
+    print(f"✅ Prepared {sum(len(df) for df in frames.values())} rows for {len(tickers)} tickers in {path} "
+          f"({time.time() - start_time:.2f}s)")
+    return path
+
+def load_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+def open_arrays(path):
+    meta = load_meta(path)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+              for name in ["stamps", "close"] + list(FEATURES)}
+    for hold in meta["holds"]:
+        arrays[f"exit_{hold}"] = np.load(os.path.join(path, f"exit_{hold}.npy"), mmap_mode="r")
+    return arrays, meta
+
+# === Rule Evaluation ===
+# A rule is a set of thresholds plus a hold in minutes. Its entries are the
+# bars where every condition holds and the exit bar (hold minutes later, in
+# the same session) exists. Trades don't overlap within a ticker: after an
+# entry, the next one is the first candidate at or after its exit bar.
+# Tickers sit back to back in the arrays, so one greedy pass over the flat
+# candidate list enforces this per ticker; different tickers may hold
+# positions at the same time.
+
+def parameter_grid(grid):
+    # grid: {parameter: values}, with "hold" and any CONDITIONS names.
+    # Returns the list of combinations as dicts, the hold varying fastest.
+    names = [name for name in grid if name != "hold"] + ["hold"]
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+def non_overlapping(entries, exits):
+    # The greedy chain over sorted candidate entries: the first entry, then
+    # the first entry at or after its exit, and so on. Returns positions
+    # into entries. follower[j] is the entry taken after entry j; the chain
+    # from entry 0 is listed by pointer doubling (log(trades) rounds of
+    # array indexing) instead of a Python loop per trade.
+    m = len(entries)
+    if m == 0:
+        return np.zeros(0, dtype=np.intp)
+    # m: past the last entry. At least j + 1, so an exit at or before its
+    # entry can't stall the chain.
+    follower = np.append(np.maximum(np.searchsorted(entries, exits), np.arange(1, m + 1)), m)
+    path = np.zeros(1, dtype=np.intp)
+    while True:
+        step = follower[path]
+        step = step[step < m]
+        if len(step) == 0:
+            return path
+        path = np.concatenate([path, step])
+        follower = follower[follower]
+
+def trade_stats(returns, stamps):
+    # Per-rule statistics over net trade returns (percent), with the
+    # drawdown taken on the running sum in entry-time order.
+    n = len(returns)
+    if n == 0:
+        return {"trades": 0, "win_rate": np.nan, "avg_return": np.nan, "std_return": np.nan,
+                "total_return": 0.0, "t_stat": np.nan, "profit_factor": np.nan, "max_drawdown": 0.0}
+    std = returns.std(ddof=1) if n > 1 else np.nan
+    gains, losses = returns[returns > 0].sum(), -returns[returns < 0].sum()
+    equity = np.cumsum(returns[np.argsort(stamps, kind="stable")])
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    return {"trades": n, "win_rate": float((returns > 0).mean()), "avg_return": float(returns.mean()),
+            "std_return": float(std), "total_return": float(returns.sum()),
+            "t_stat": float(returns.mean() / std * np.sqrt(n)) if n > 1 and std > 0 else np.nan,
+            "profit_factor": float(gains / losses) if losses > 0 else np.inf,
+            "max_drawdown": float(drawdown.max())}
+
+def prefilter(arrays, rules):
+    # The rows any of the rules can enter on (each condition all rules
+    # share, at its loosest threshold), as (row index, arrays at those
+    # rows), so a batch of rules scans only those.
+    rows = np.ones(len(arrays["close"]), dtype=bool)
+    for name, (feature, compare) in CONDITIONS.items():
+        if all(name in rule for rule in rules):
+            thresholds = [rule[name] for rule in rules]
+            rows &= compare(arrays[feature], max(thresholds) if compare is np.less else min(thresholds))
+    index = np.flatnonzero(rows)
+    return index, {name: np.asarray(values)[index] for name, values in arrays.items()}
+
+def rule_mask(rows, rule):
+    # The bars where every condition of the rule holds.
+    mask = np.ones(len(rows["close"]), dtype=bool)
+    for name, threshold in rule.items():
+        if name != "hold":
+            feature, compare = CONDITIONS[name]
+            mask &= compare(rows[feature], threshold)
+    return mask
+
+def evaluate(arrays, rule, cost=COST_PCT, overlap=False, prefiltered=None, mask=None):
+    # trade_stats() of one rule over the prepared arrays; mask may be
+    # rule_mask() over the prefiltered rows, shared by rules that only
+    # differ in their hold.
+    index, rows = prefiltered or (np.arange(len(arrays["close"])), arrays)
+    exits = rows[f"exit_{rule['hold']}"]
+    valid = (rule_mask(rows, rule) if mask is None else mask) & (exits >= 0)
+    entries, exits = index[valid], exits[valid]
+    if not overlap:
+        taken = non_overlapping(entries, exits)
+        entries, exits = entries[taken], exits[taken]
+    close = arrays["close"]
+    entry_close = close[entries]
+    returns = (close[exits] - entry_close) / entry_close * 100 - cost
+    return trade_stats(returns, arrays["stamps"][entries])
+
+_ARRAYS = {}
+
+def _open(path):
+    # Plain ndarray views of the maps: still backed by the files, without
+    # np.memmap's per-index overhead.
+    _ARRAYS.update({name: np.asarray(values) for name, values in open_arrays(path)[0].items()})
+
+def _evaluate_task(rules, cost, overlap):
+    prefiltered = prefilter(_ARRAYS, rules)
+    results = []
+    conditions = mask = None
+    for rule in rules:
+        if {k: v for k, v in rule.items() if k != "hold"} != conditions:
+            conditions = {k: v for k, v in rule.items() if k != "hold"}
+            mask = rule_mask(prefiltered[1], rule)
+        results.append(evaluate(_ARRAYS, rule, cost, overlap, prefiltered, mask))
+    return results
+
+def grid_search(path, grid, cost=COST_PCT, overlap=False, workers=BACKTEST_WORKERS):
+    # One row per parameter combination: the parameters and trade_stats().
+    # Consecutive rules that only differ in their hold share an entry mask,
+    # and rules in a batch share their leading thresholds, which keeps the
+    # batch prefilter tight.
+    # Every hold needs the exit array prepare wrote for it; checked here
+    # rather than as a KeyError inside a worker.
+    if not grid.get("hold"):
+        raise ValueError("The grid needs at least one hold")
+    prepared = load_meta(path)["holds"]
+    missing = sorted(set(grid["hold"]) - set(prepared))
+    if missing:
+        raise ValueError(f"Holds {', '.join(map(str, missing))} were not prepared in {path} "
+                         f"(prepared: {', '.join(map(str, prepared))}); re-run prepare with them")
+    rules = parameter_grid(grid)
+    batches = [rules[i:i + COMBOS_PER_TASK] for i in range(0, len(rules), COMBOS_PER_TASK)]
+    if workers <= 1:
+        _open(path)
+        results = [_evaluate_task(batch, cost, overlap) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open, initargs=(path,)) as pool:
+            results = list(pool.map(_evaluate_task, batches, [cost] * len(batches), [overlap] * len(batches)))
+    stats = [row for batch in results for row in batch]
+    return pd.concat([pd.DataFrame(rules), pd.DataFrame(stats)], axis=1)
+
+def parse_grid(flags):
+    # --hold=5,10 --rsi_below=20,30 ... (CONDITIONS names, - or _).
+    grid = {}
+    for flag, values in flags.items():
+        name = flag.replace("-", "_")
+        if name == "hold":
+            grid[name] = [int(v) for v in values.split(",")]
+            if min(grid[name]) <= 0:
+                raise ValueError(f"--hold must be a positive number of minutes, got {values}")
+        elif name in CONDITIONS:
+            grid[name] = [float(v) for v in values.split(",")]
+    return grid
+
+# === Main ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    grid = parse_grid(flags)
+    if args and args[0] == "prepare" and "hold" in grid:
+        tickers = [a.upper() for a in args[1:]]
+        if not tickers:
+            from quant_local_mirror import list_tickers
+            conn = connect()
+            tickers = list_tickers(conn, LABEL_TABLE)
+            conn.close()
+        prepare(tickers, grid["hold"], flags.get("name", "universe"), "local" if "--local" in sys.argv else "db",
+                int(flags.get("tolerance", 0)))
+    elif args and args[0] == "search" and "hold" in grid:
+        start_time = time.time()
+        path = os.path.join(BACKTEST_DIR, flags.get("name", "universe"))
+        result = grid_search(path, grid, float(flags.get("cost", COST_PCT)), "--overlap" in sys.argv)
+        ranked = result[result["trades"] >= int(flags.get("min_trades", 30))].sort_values("avg_return", ascending=False)
+        print(ranked.head(int(flags.get("top", 20))).to_string(index=False))
+        print(f"\n⏱️ {len(result)} combinations in {time.time() - start_time:.2f} seconds")
+    else:
+        print("❌ Please provide a command and a hold grid. Example: "
+              "python3 quant_backtest.py prepare [GRRR ...] --hold=5,10,15,30 [--name=universe] [--local] "
+              "or python3 quant_backtest.py search --hold=5,10,15,30 --rsi_below=20,25,30 --hist_above=-0.01,0,0.01 "
+              "[--cost=0.02] [--overlap] [--min_trades=30] [--top=20] [--name=universe]")
@@ -0,0 +1,1510 @@
+import psycopg2
+from datetime import datetime, timedelta
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from quant_candle_loader import bulk_load_candles, bulk_load_columns, candles_to_copy_buffer
+from quant_columnar import parse_chart_response, columns_to_copy_binary, columns_to_frame
+from quant_fmp_cache import ResponseCache
+from quant_fmp_client import make_session, get_cached_json
+import quant_backfill_intraday
+import quant_label_forward_returns
+import quant_engineer_features
+import quant_label_pipeline
+import quant_bucket_analysis
+import quant_backtest
+import quant_quantile_sketch
+import quant_local_mirror
+from quant_partition_manager import migrate_table
+from quant_calendar import sessions_between, session_open_close
+from quant_engineer_features import compute_indicators
+from quant_feature_writer import bulk_write_features
+from quant_feature_registry import compute_features, resolve, default_features, warmup_bars
+from quant_label_forward_returns import HORIZONS, LABEL_TABLE, label_columns, label_in_database
+from quant_label_kernels import forward_labels
+from quant_bucket_analysis import ANALYSES, COUNT_RETURN, Axis, RETURN_COLUMNS, analyze, analyze_in_database
+from quant_backtest import FEATURES as RULE_FEATURES, grid_search, parameter_grid, prepare_arrays
+from quant_quantile_sketch import ADAPTIVE_ANALYSES, SKETCH_TABLE, analyze_adaptive, refresh_sketches
+from quant_bucket_significance import analyze_significance, significance
+from quant_bucket_store import STATS_TABLE, query_stats, refresh_ticker, register_analysis
+from quant_day_fingerprints import FINGERPRINT_TABLE
+from quant_label_forward_returns import LABEL_FEATURES
+from quant_incremental_features import IncrementalFeatures
+from quant_resample_bars import TIMEFRAMES, STATE_TABLE, candle_table, resample_ticker
+import numpy as np
+import pandas as pd
+
+# === Config ===
+# Benchmarks run against a local Postgres, never against Supabase.
+BENCH_DSN = os.environ.get("BENCH_DSN", "postgresql://postgres@localhost:5432/postgres")
+
+BENCH_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS quant_candles_intraday (
+        ticker TEXT NOT NULL,
+        datetime TIMESTAMP NOT NULL,
+        open DOUBLE PRECISION,
+        high DOUBLE PRECISION,
+        low DOUBLE PRECISION,
+        close DOUBLE PRECISION,
+        volume BIGINT,
+        PRIMARY KEY (ticker, datetime)
+    );
+    CREATE TABLE IF NOT EXISTS quant_features_intraday (
+        ticker TEXT NOT NULL,
+        datetime TIMESTAMP NOT NULL,
+        rsi DOUBLE PRECISION,
+        vwap DOUBLE PRECISION,
+        macd DOUBLE PRECISION,
+        macd_signal DOUBLE PRECISION,
+        ma_50 DOUBLE PRECISION,
+        ma_200 DOUBLE PRECISION,
+        rel_volume DOUBLE PRECISION,
+        is_uptrend BOOLEAN,
+        PRIMARY KEY (ticker, datetime)
+    );
+    CREATE TABLE IF NOT EXISTS quant_pattern_labeled_intraday (
+        ticker TEXT NOT NULL,
+        datetime TIMESTAMP NOT NULL,
+        rsi DOUBLE PRECISION,
+        vwap DOUBLE PRECISION,
+        macd DOUBLE PRECISION,
+        macd_signal DOUBLE PRECISION,
+        ma_50 DOUBLE PRECISION,
+        ma_200 DOUBLE PRECISION,
+        close DOUBLE PRECISION,
+        return_5min DOUBLE PRECISION,
+        return_10min DOUBLE PRECISION,
+        return_15min DOUBLE PRECISION,
+        PRIMARY KEY (ticker, datetime)
+    );
+"""
+
+# === Helpers ===
+def connect():
+    conn = psycopg2.connect(BENCH_DSN)
+    cur = conn.cursor()
+    cur.execute(BENCH_SCHEMA)
+    conn.commit()
+    return conn
+
+def synthetic_candles(n, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 2, 9, 30)
+    price = 100.0
+    candles = []
+    for i in range(n):
+        price = max(1.0, price + rng.gauss(0, 0.1))
+        high = price + abs(rng.gauss(0, 0.05))
+        low = price - abs(rng.gauss(0, 0.05))
+        candles.append({
+            "date": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "open": round(price, 4),
+            "high": round(high, 4),
+            "low": round(low, 4),
+            "close": round(price, 4),
+            "volume": rng.randint(100, 50000)
+        })
+    return candles
+
+def clear_ticker(conn, table, ticker):
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {table} WHERE ticker = %s;", (ticker,))
+    conn.commit()
+
+def report(label, rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"  {label:<28} {rows:>10} rows  {elapsed:>8.2f}s  {rate:>12,.0f} rows/sec")
+
+# === Benchmarks ===
+def insert_candles_row_by_row(conn, symbol, candles):
+    # The per-candle INSERT loop the quant scripts used before the bulk loader.
+    cur = conn.cursor()
+    for row in candles:
+        dt = datetime.strptime(row["date"], "%Y-%m-%d %H:%M:%S")
+        cur.execute("""
+            INSERT INTO quant_candles_intraday (ticker, datetime, open, high, low, close, volume)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (ticker, datetime) DO NOTHING;
+        """, (symbol, dt, row["open"], row["high"], row["low"], row["close"], row["volume"]))
+    conn.commit()
+
+def bench_candle_loader(rows=70200):
+    print(f"📊 Candle loader: {rows} synthetic 1-min candles")
+    candles = synthetic_candles(rows)
+    conn = connect()
+
+    clear_ticker(conn, "quant_candles_intraday", "BENCHROW")
+    start = time.time()
+    insert_candles_row_by_row(conn, "BENCHROW", candles)
+    report("row-by-row INSERT", rows, time.time() - start)
+
+    clear_ticker(conn, "quant_candles_intraday", "BENCHCOPY")
+    start = time.time()
+    inserted, duplicates = bulk_load_candles(conn, "BENCHCOPY", candles)
+    conn.commit()
+    report("COPY + merge (fresh)", rows, time.time() - start)
+
+    start = time.time()
+    inserted_again, duplicates_again = bulk_load_candles(conn, "BENCHCOPY", candles)
+    conn.commit()
+    report("COPY + merge (all dupes)", rows, time.time() - start)
+    print(f"  fresh: {inserted} inserted / {duplicates} duplicates, "
+          f"re-run: {inserted_again} inserted / {duplicates_again} duplicates")
+
+    clear_ticker(conn, "quant_candles_intraday", "BENCHROW")
+    clear_ticker(conn, "quant_candles_intraday", "BENCHCOPY")
+    conn.close()
+
+# === Fake FMP Server ===
+class FakeFMPHandler(BaseHTTPRequestHandler):
+    # Serves synthetic weekday sessions for /historical-chart/1min, logs the
+    # arrival time of every request and throttles every Nth one with a 429.
+    request_times = []
+    throttle_every = 25
+    latency = 0.05
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.request_times.append(time.monotonic())
+            count = len(self.request_times)
+        time.sleep(self.latency)
+
+        if self.throttle_every and count % self.throttle_every == 0:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        day = datetime.strptime(query["from"][0], "%Y-%m-%d")
+        to_day = datetime.strptime(query["to"][0], "%Y-%m-%d")
+        candles = []
+        while day <= to_day:
+            if day.weekday() < 5:
+                session = synthetic_candles(390, seed=day.toordinal())
+                opened = day.replace(hour=9, minute=30)
+                for i, candle in enumerate(session):
+                    candle["date"] = (opened + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+                candles.extend(reversed(session))
+            day += timedelta(days=1)
+
+        body = json.dumps(candles).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_fmp():
+    FakeFMPHandler.request_times = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFMPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/stable/historical-chart/1min"
+
+def peak_rate(times, window):
+    peak = 0
+    lo = 0
+    for hi in range(len(times)):
+        while times[hi] - times[lo] >= window:
+            lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+def clear_bench_symbols(conn, symbols):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM quant_candles_intraday WHERE ticker = ANY(%s);", (symbols,))
+    cur.execute("SELECT to_regclass('quant_candles_coverage');")
+    if cur.fetchone()[0] is not None:
+        cur.execute("DELETE FROM quant_candles_coverage WHERE ticker = ANY(%s);", (symbols,))
+    conn.commit()
+
+def bench_backfill_universe(tickers=10, days_back=30, requests_per_minute=600, max_in_flight=8):
+    print(f"📊 Universe backfill: {tickers} tickers, {days_back} days, "
+          f"limit {requests_per_minute}/min, {max_in_flight} in flight")
+    server, url = start_fake_fmp()
+    quant_backfill_intraday.FMP_URL = url
+    quant_backfill_intraday.connect = connect
+    symbols = [f"BENCH{i:03d}" for i in range(tickers)]
+
+    conn = connect()
+    clear_bench_symbols(conn, symbols)
+    grid_requests = tickers * -(-days_back // 3)
+    print(f"  a fixed 3-calendar-day grid would issue {grid_requests} requests")
+
+    for label in ("cold backfill", "top-up re-run"):
+        FakeFMPHandler.request_times = []
+        start = time.time()
+        stats = quant_backfill_intraday.backfill_universe(
+            symbols, max_in_flight=max_in_flight,
+            requests_per_minute=requests_per_minute, days_back=days_back
+        )
+        elapsed = time.time() - start
+
+        times = sorted(FakeFMPHandler.request_times)
+        throttled = len(times) // FakeFMPHandler.throttle_every
+        print(f"  {label}: {len(times)} requests ({throttled} answered with 429 and retried)")
+        if len(times) > 1:
+            print(f"  mean rate: {len(times) / elapsed * 60:,.0f}/min, "
+                  f"peak 1s window: {peak_rate(times, 1.0) * 60}/min, "
+                  f"peak 10s window: {peak_rate(times, 10.0) * 6}/min")
+        report("candles inserted", stats["inserted"], elapsed)
+
+    server.shutdown()
+    clear_bench_symbols(conn, symbols)
+    conn.close()
+
+def bench_fmp_cache(chunks=200):
+    print(f"📊 FMP response cache: {chunks} closed 3-day chunks")
+    server, url = start_fake_fmp()
+    FakeFMPHandler.throttle_every = 0
+    directory = tempfile.mkdtemp(prefix="fmp_cache_")
+    cache = ResponseCache(directory)
+    session = make_session()
+    first = datetime(2024, 1, 1)
+    ranges = [((first + timedelta(days=3 * i)).strftime("%Y-%m-%d"),
+               (first + timedelta(days=3 * i + 2)).strftime("%Y-%m-%d")) for i in range(chunks)]
+
+    for label in ("cold (network)", "warm (disk)"):
+        FakeFMPHandler.request_times = []
+        start = time.time()
+        rows = 0
+        for from_str, to_str in ranges:
+            params = {"symbol": "BENCH", "from": from_str, "to": to_str}
+            rows += len(get_cached_json(session, None, url, params, cache=cache))
+        report(f"{label}, {len(FakeFMPHandler.request_times)} requests", rows, time.time() - start)
+
+    total = cache.total_bytes
+    small = ResponseCache(directory, max_bytes=total // 2)
+    small.put(url, "BENCH", "2030-01-01", "2030-01-03", b"[]")
+    print(f"  cache size {total / 1024 ** 2:.1f} MiB, hits {cache.hits}, misses {cache.misses}; "
+          f"LRU eviction to half budget left {small.total_bytes / 1024 ** 2:.1f} MiB")
+
+    # An empty answer for a closed range is only trusted for empty_ttl.
+    cache.put(url, "EMPTY", "2024-01-02", "2024-01-04", b"[]")
+    assert cache.get(url, "EMPTY", "2024-01-02", "2024-01-04") == b"[]"
+    path = cache._path(url, "EMPTY", "2024-01-02", "2024-01-04")
+    stale = time.time() - cache.empty_ttl - 1
+    os.utime(path, (stale, stale))
+    assert cache.get(url, "EMPTY", "2024-01-02", "2024-01-04") is None
+    print(f"  empty closed-range answers expire after {cache.empty_ttl}s instead of never")
+
+    FakeFMPHandler.throttle_every = 25
+    server.shutdown()
+    shutil.rmtree(directory)
+
+def synthetic_chart_response(sessions, seed=42):
+    # FMP-shaped body: newest first, FMP's key order, one 390-bar session per weekday.
+    candles = []
+    day = datetime(2024, 1, 2)
+    while sessions:
+        if day.weekday() < 5:
+            session = synthetic_candles(390, seed=seed + sessions)
+            opened = day.replace(hour=9, minute=30)
+            for i, candle in enumerate(session):
+                candle["date"] = (opened + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+            candles.extend(session)
+            sessions -= 1
+        day += timedelta(days=1)
+    candles.reverse()
+    rows = [{"date": c["date"], "open": c["open"], "low": c["low"], "high": c["high"],
+             "close": c["close"], "volume": c["volume"]} for c in candles]
+    return json.dumps(rows).encode()
+
+def bench_columnar_parse(sessions=124, repeat=5):
+    raw = synthetic_chart_response(sessions)
+    print(f"📊 Columnar parse: {sessions} sessions (180 calendar days), "
+          f"{len(raw) / 1024 ** 2:.1f} MiB response, best of {repeat}")
+
+    def dict_path():
+        candles = json.loads(raw)
+        for row in candles:
+            datetime.strptime(row["date"], "%Y-%m-%d %H:%M:%S")
+        return candles
+
+    best = {}
+    for label, fn in (("json.loads + strptime", dict_path), ("parse_chart_response", lambda: parse_chart_response(raw))):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        best[label] = (min(times), result)
+
+    candles = best["json.loads + strptime"][1]
+    cols = best["parse_chart_response"][1]
+    rows = len(candles)
+    for label, (elapsed, _) in best.items():
+        report(label, rows, elapsed)
+
+    start = time.perf_counter()
+    candles_to_copy_buffer("BENCH", candles)
+    report("COPY buffer from dicts", rows, time.perf_counter() - start)
+    start = time.perf_counter()
+    columns_to_copy_binary("BENCH", cols)
+    report("binary COPY from columns", rows, time.perf_counter() - start)
+
+    conn = connect()
+    for label, load, payload in (("dicts", bulk_load_candles, candles), ("columns", bulk_load_columns, cols)):
+        clear_ticker(conn, "quant_candles_intraday", "BENCHCOL")
+        start = time.perf_counter()
+        inserted, _ = load(conn, "BENCHCOL", payload)
+        conn.commit()
+        report(f"bulk load from {label}", inserted, time.perf_counter() - start)
+    cur = conn.cursor()
+    cur.execute("SELECT min(datetime), max(datetime), sum(volume), sum(close) FROM quant_candles_intraday WHERE ticker = 'BENCHCOL';")
+    print(f"  stored range {cur.fetchone()}")
+
+    # A null FMP volume goes down the text path and is stored as NULL, not 0.
+    sample = json.loads(raw)[:3]
+    sample[1]["volume"] = None
+    clear_ticker(conn, "quant_candles_intraday", "BENCHCOL")
+    bulk_load_columns(conn, "BENCHCOL", parse_chart_response(json.dumps(sample).encode()))
+    conn.commit()
+    cur.execute("SELECT count(volume), count(*) FROM quant_candles_intraday WHERE ticker = 'BENCHCOL';")
+    assert cur.fetchone() == (2, 3)
+    print("  parity: a null volume is stored as NULL")
+    clear_bench_symbols(conn, ["BENCHCOL"])
+    conn.close()
+
+    assert len(cols["close"]) == rows
+    assert cols["close"][-1] == candles[0]["close"] and str(cols["datetime"][0]).replace("T", " ") == candles[-1]["date"]
+    print("  parity: columnar arrays match the decoded dicts")
+
+def explain(cur, query, params):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0][0]
+    relations = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return plan["Execution Time"], len(relations), plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)
+
+def bench_partition_pruning(tickers=20, months=12):
+    print(f"📊 Partition pruning: {tickers} tickers x {months} months of 1-min sessions")
+    conn = connect()
+    cur = conn.cursor()
+    for table in ("bench_candles_flat", "bench_candles_part", "bench_candles_part_legacy"):
+        cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE;")
+    cur.execute("""
+        CREATE TABLE bench_candles_flat (
+            ticker TEXT NOT NULL, datetime TIMESTAMP NOT NULL,
+            open DOUBLE PRECISION, high DOUBLE PRECISION, low DOUBLE PRECISION,
+            close DOUBLE PRECISION, volume BIGINT,
+            PRIMARY KEY (ticker, datetime)
+        );
+    """)
+    start = datetime(2024, 1, 1)
+    cur.execute("""
+        INSERT INTO bench_candles_flat
+        SELECT 'T' || t, ts, 100 + random(), 101, 99, 100 + random(), (random() * 10000)::bigint
+        FROM generate_series(1, %s) t,
+             generate_series(%s::timestamp, %s::timestamp + make_interval(months => %s), interval '1 minute') ts
+        WHERE extract(isodow FROM ts) < 6 AND ts::time >= '09:30' AND ts::time < '16:00';
+    """, (tickers, start, start, months))
+    rows = cur.rowcount
+    cur.execute("CREATE TABLE bench_candles_part (LIKE bench_candles_flat INCLUDING ALL);")
+    cur.execute("INSERT INTO bench_candles_part SELECT * FROM bench_candles_flat;")
+    migrate_table(cur, "bench_candles_part", premake_months=0)
+    cur.execute("DROP TABLE bench_candles_part_legacy;")
+    conn.commit()
+    cur.execute("ANALYZE bench_candles_flat; ANALYZE bench_candles_part;")
+    print(f"  {rows:,} rows per table")
+
+    last_month = start.replace(year=start.year + (start.month - 1 + months - 1) // 12,
+                               month=(start.month - 1 + months - 1) % 12 + 1)
+    queries = [
+        ("full history", "SELECT * FROM {table} WHERE ticker = %s ORDER BY datetime;", ("T1",)),
+        ("since last month", "SELECT * FROM {table} WHERE ticker = %s AND datetime >= %s ORDER BY datetime;",
+         ("T1", last_month)),
+        ("one day", "SELECT * FROM {table} WHERE ticker = %s AND datetime >= %s AND datetime < %s ORDER BY datetime;",
+         ("T1", last_month, last_month + timedelta(days=1))),
+    ]
+    for label, query, params in queries:
+        for table in ("bench_candles_flat", "bench_candles_part"):
+            explain(cur, query.format(table=table), params)  # warm the cache
+            elapsed, scanned, blocks = explain(cur, query.format(table=table), params)
+            print(f"  {label:<18} {table:<20} {elapsed:>8.2f} ms  {scanned:>3} relations  {blocks:>7} buffers")
+
+    for table in ("bench_candles_flat", "bench_candles_part"):
+        cur.execute(f"DROP TABLE {table} CASCADE;")
+    conn.commit()
+    conn.close()
+
+def session_candles(days, seed=42):
+    # Synthetic 1min bars covering each session's open to close.
+    rng = np.random.default_rng(seed)
+    stamps = np.concatenate([
+        np.arange(np.datetime64(opens, "m"), np.datetime64(closes, "m"))
+        for opens, closes in map(session_open_close, days)
+    ]).astype("datetime64[s]")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(stamps))))
+    return {
+        "datetime": stamps, "open": close + rng.normal(0, 0.02, len(stamps)),
+        "high": close + 0.05, "low": close - 0.05, "close": close,
+        "volume": rng.integers(100, 50000, len(stamps)),
+    }
+
+def bench_resample_bars(sessions=250):
+    print(f"📊 Resampler: {sessions} sessions of 1-min bars into {', '.join(TIMEFRAMES)}")
+    conn = connect()
+    cur = conn.cursor()
+    symbol = "BENCHRS"
+    tables = ["quant_candles_intraday", "quant_candles_coverage", STATE_TABLE] + [candle_table(t) for t in TIMEFRAMES]
+
+    def clear():
+        for table in tables:
+            cur.execute("SELECT to_regclass(%s);", (table,))
+            if cur.fetchone()[0]:
+                cur.execute(f"DELETE FROM {table} WHERE ticker = %s;", (symbol,))
+        conn.commit()
+
+    clear()
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions + 1]
+    history, latest = days[:-1], days[-1:]
+    cols = session_candles(history)
+    bulk_load_columns(conn, symbol, cols, (history[0], history[-1]))
+    # Backdate the history's coverage so the incremental run sees only the new session.
+    cur.execute("UPDATE quant_candles_coverage SET fetched_at = fetched_at - interval '1 day' WHERE ticker = %s;", (symbol,))
+    conn.commit()
+
+    start = time.perf_counter()
+    resample_ticker(conn, symbol)
+    report("initial resample", len(cols["close"]), time.perf_counter() - start)
+
+    # The new session comes with pre- and after-market bars, which the
+    # regular-session bars leave out, and a stale pre-market 60min bucket a
+    # run before the session filter would have stored.
+    new_cols = session_candles(latest, seed=7)
+    opens, closes = session_open_close(latest[0])
+    extended = np.concatenate([np.arange(np.datetime64(opens.replace(hour=4, minute=0), "m"), np.datetime64(opens, "m")),
+                               np.arange(np.datetime64(closes, "m"), np.datetime64(closes.replace(hour=20), "m"))])
+    new_cols = {c: np.concatenate([v, extended.astype(v.dtype) if c == "datetime" else np.resize(v, len(extended))])
+                for c, v in new_cols.items()}
+    bulk_load_columns(conn, symbol, new_cols, (latest[0], latest[0]))
+    cur.execute(f"INSERT INTO {candle_table('60min')} VALUES (%s, %s, 1, 1, 1, 1, 1);",
+                (symbol, opens.replace(hour=8, minute=30)))
+    conn.commit()
+    start = time.perf_counter()
+    resample_ticker(conn, symbol)
+    report("incremental (1 session)", len(new_cols["close"]), time.perf_counter() - start)
+
+    # Parity against a client-side pandas resample of the same minutes.
+    cur.execute("SELECT datetime, open, high, low, close, volume FROM quant_candles_intraday WHERE ticker = %s ORDER BY datetime;", (symbol,))
+    minutes = pd.DataFrame(cur.fetchall(), columns=["datetime", "open", "high", "low", "close", "volume"])
+    clock = minutes["datetime"].dt.hour * 60 + minutes["datetime"].dt.minute
+    minutes = minutes[(clock >= 9 * 60 + 30) & (clock < 16 * 60)]
+    for timeframe, size in TIMEFRAMES.items():
+        if size is None:
+            expected = minutes.groupby(minutes["datetime"].dt.normalize() + pd.Timedelta("9h30min"))
+        else:
+            expected = minutes.resample(f"{size}min", on="datetime", origin="start_day", offset="9h30min")
+        expected = expected.agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+        expected = expected[expected["volume"] > 0]
+        cur.execute(f"SELECT datetime, open, high, low, close, volume FROM {candle_table(timeframe)} WHERE ticker = %s ORDER BY datetime;", (symbol,))
+        stored = pd.DataFrame(cur.fetchall(), columns=["datetime", "open", "high", "low", "close", "volume"]).set_index("datetime")
+        assert len(stored) == len(expected), (timeframe, len(stored), len(expected))
+        assert (stored.index == expected.index).all()
+        assert np.allclose(stored.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+        print(f"  parity: {len(stored):>7} {timeframe} bars match pandas")
+
+    clear()
+    conn.close()
+
+def bench_incremental_features(rows=100000, batches=200, seed=42):
+    print(f"📊 Incremental features: {rows} rows, full recompute vs {batches} stateful batches")
+    cols = session_candles(sessions_between(datetime(2020, 1, 2).date(), datetime(2025, 12, 31).date()), seed)
+    df = columns_to_frame({name: arr[:rows] for name, arr in cols.items()})
+
+    start = time.perf_counter()
+    full = compute_indicators(df)
+    report("full recompute", len(df), time.perf_counter() - start)
+
+    # Uneven cut points, including single-row batches and cuts inside the
+    # RSI/MACD/SMA warm-up windows.
+    rng = np.random.default_rng(seed)
+    cuts = np.unique(np.concatenate([[1, 2, 13, 14, 15, 25, 33, 34, 199, 200, 201],
+                                     rng.integers(1, len(df), batches)]))
+    state = None
+    parts = []
+    start = time.perf_counter()
+    for lo, hi in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [len(df)]])):
+        engine = IncrementalFeatures(json.loads(json.dumps(state)) if state else None)
+        parts.append(engine.update(df.iloc[lo:hi]))
+        state = engine.state()
+    incremental = pd.concat(parts, ignore_index=True)
+    report(f"{len(parts)} incremental batches", len(df), time.perf_counter() - start)
+
+    for column in ["rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200", "rel_volume"]:
+        expected, actual = full[column].to_numpy(dtype=float), incremental[column].to_numpy(dtype=float)
+        assert np.array_equal(np.isnan(expected), np.isnan(actual)), column
+        assert np.allclose(expected, actual, rtol=1e-9, atol=1e-9, equal_nan=True), column
+    assert (full["is_uptrend"].to_numpy() == incremental["is_uptrend"].to_numpy()).all()
+    print("  parity: incremental batches match the full recompute (rtol 1e-9)")
+
+    # The per-run compute cost once the state exists: one session of new bars.
+    tail = df.iloc[-390:]
+    engine = IncrementalFeatures(state)
+    start = time.perf_counter()
+    engine.update(tail)
+    report("one new session from state", len(tail), time.perf_counter() - start)
+
+def compute_indicators_ta(df):
+    # compute_indicators as it was written against the `ta` package.
+    from ta.momentum import RSIIndicator
+    from ta.trend import MACD, SMAIndicator
+    df = df.copy()
+    df["rsi"] = RSIIndicator(close=df["close"], window=14).rsi()
+    df["vwap"] = (df["volume"] * (df["high"] + df["low"] + df["close"]) / 3).cumsum() / df["volume"].cumsum()
+    macd = MACD(close=df["close"])
+    df["macd"] = macd.macd()
+    df["macd_signal"] = macd.macd_signal()
+    df["ma_50"] = SMAIndicator(close=df["close"], window=50).sma_indicator()
+    df["ma_200"] = SMAIndicator(close=df["close"], window=200).sma_indicator()
+    df["is_uptrend"] = df["close"] > df["ma_50"]
+    df["rel_volume"] = df["volume"] / df["volume"].rolling(window=20).mean()
+    return df
+
+def bench_indicator_kernels(rows=10000000, seed=42):
+    print(f"📊 Indicator kernels vs ta: {rows:,} synthetic 1-min bars")
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, rows))
+    df = pd.DataFrame({
+        "datetime": np.arange(rows).astype("datetime64[m]"),
+        "open": close, "high": close + 0.05, "low": close - 0.05, "close": close,
+        "volume": rng.integers(100, 50000, rows),
+    })
+
+    results = {}
+    for label, compute in (("ta", compute_indicators_ta), ("numpy kernels", compute_indicators)):
+        start = time.perf_counter()
+        results[label] = compute(df)
+        report(label, rows, time.perf_counter() - start)
+        del results[label]
+        # Peak memory from a second, traced run (tracing slows allocation).
+        tracemalloc.start()
+        results[label] = compute(df)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {'':<28} peak allocations {peak / 2**20:>8.0f} MiB")
+
+    for label, module in (("ta", "ta.trend"), ("numpy kernels", "quant_indicator_kernels")):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        print(f"  interpreter start + import {label:<14} {time.perf_counter() - start:>8.2f}s")
+
+    expected, actual = results["ta"], results["numpy kernels"]
+    for column in ["rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200", "rel_volume"]:
+        a, b = expected[column].to_numpy(dtype=float), actual[column].to_numpy(dtype=float)
+        assert np.array_equal(np.isnan(a), np.isnan(b)), column
+        assert np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True), column
+        print(f"  parity: {column:<12} max abs diff {np.nanmax(np.abs(a - b)):.2e}")
+    assert (expected["is_uptrend"].to_numpy() == actual["is_uptrend"].to_numpy()).all()
+
+    # NULL closes and volumes load as NaN; ta confines each one to the
+    # windows that contain it and the kernels must too.
+    sample = df.iloc[:100000].copy()
+    sample["volume"] = sample["volume"].astype(np.float64)
+    sample.loc[rng.choice(len(sample), 50, replace=False), "close"] = np.nan
+    sample.loc[rng.choice(len(sample), 20, replace=False), "volume"] = np.nan
+    expected, actual = compute_indicators_ta(sample), compute_indicators(sample)
+    # The pandas VWAP would still add a NaN-close bar's volume to the
+    # denominator; the kernels leave the whole bar out.
+    pv = sample["volume"] * (sample["high"] + sample["low"] + sample["close"]) / 3
+    expected["vwap"] = pv.cumsum() / sample["volume"].where(pv.notna()).cumsum()
+    for column in ["rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200", "rel_volume"]:
+        a, b = expected[column].to_numpy(dtype=float), actual[column].to_numpy(dtype=float)
+        assert np.array_equal(np.isnan(a), np.isnan(b)), column
+        assert np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True), column
+        print(f"  NaN parity: {column:<11} {int(np.isnan(b).sum()):>6} NaNs, max abs diff {np.nanmax(np.abs(a - b)):.2e}")
+
+def insert_features_row_by_row(conn, symbol, df):
+    # The iterrows() INSERT loop store_features used before the bulk writer.
+    cur = conn.cursor()
+    for _, row in df.iterrows():
+        cur.execute("""
+            INSERT INTO quant_features_intraday (
+                ticker, datetime, rsi, vwap, macd, macd_signal, ma_50, ma_200, rel_volume, is_uptrend
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (ticker, datetime) DO NOTHING;
+        """, (
+            symbol, row["datetime"], row["rsi"], row["vwap"], row["macd"],
+            row["macd_signal"], row["ma_50"], row["ma_200"],
+            float(row["rel_volume"]) if not pd.isna(row["rel_volume"]) else None,
+            bool(row["is_uptrend"]) if not pd.isna(row["is_uptrend"]) else None
+        ))
+    return len(df)
+
+def bench_feature_writer(*sizes):
+    sizes = sizes or (100000, 1000000)
+    conn = connect()
+    symbol = "BENCHFW"
+    cols = session_candles(sessions_between(datetime(2010, 1, 4).date(), datetime(2025, 12, 31).date()))
+    for rows in sizes:
+        print(f"📊 Feature writer: {rows:,} rows")
+        features = compute_indicators(columns_to_frame({name: arr[:rows] for name, arr in cols.items()}))
+        clear_ticker(conn, "quant_features_intraday", symbol)
+
+        if rows <= 100000:
+            start = time.perf_counter()
+            insert_features_row_by_row(conn, symbol, features)
+            conn.commit()
+            report("iterrows INSERT loop", rows, time.perf_counter() - start)
+            clear_ticker(conn, "quant_features_intraday", symbol)
+
+        runs = [
+            ("COPY, DO NOTHING (new)", features, "nothing"),
+            ("COPY, DO NOTHING (dupes)", features, "nothing"),
+            ("COPY, DO UPDATE (same)", features, "update"),
+            ("COPY, DO UPDATE (changed)", features.assign(rsi=features["rsi"] + 1), "update"),
+        ]
+        for label, frame, mode in runs:
+            start = time.perf_counter()
+            written, unchanged = bulk_write_features(conn, symbol, frame, mode=mode)
+            conn.commit()
+            report(f"{label}", rows, time.perf_counter() - start)
+            print(f"  {'':<28} {written} written, {unchanged} unchanged")
+
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT count(*), count(rsi), count(*) FILTER (WHERE is_uptrend), sum(ma_200)
+            FROM quant_features_intraday WHERE ticker = %s;
+        """, (symbol,))
+        count, rsi_count, uptrend, ma_sum = cur.fetchone()
+        assert count == rows and rsi_count == features["rsi"].notna().sum()
+        assert uptrend == features["is_uptrend"].sum()
+        assert np.isclose(ma_sum, features["ma_200"].sum())
+        print("  parity: stored rows, NULLs and sums match the frame")
+
+        # A write naming optional columns the table already has must not lock
+        # readers out until it commits.
+        bulk_write_features(conn, symbol, features, mode="update", column_types={"rel_volume": "float64"})
+        reader = connect()
+        reader_cur = reader.cursor()
+        reader_cur.execute("SET lock_timeout = '1s';")
+        reader_cur.execute("SELECT count(*) FROM quant_features_intraday WHERE ticker = %s;", (symbol,))
+        reader.close()
+        conn.commit()
+        print("  locks: a reader runs while a write with existing optional columns is open")
+        clear_ticker(conn, "quant_features_intraday", symbol)
+    conn.close()
+
+def bench_feature_registry(rows=2000000, tail=5000, seed=42):
+    print(f"📊 Feature registry: {rows:,} bars, selective computation and warm-up windows")
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, rows))
+    columns = {"open": close, "high": close + 0.05, "low": close - 0.05, "close": close,
+               "volume": rng.integers(100, 50000, rows).astype(np.float64)}
+
+    full = compute_features(columns)
+    for names in (["rsi"], ["macd_signal"], ["ma_200"], ["rel_volume"], default_features()):
+        start = time.perf_counter()
+        compute_features(columns, names)
+        elapsed = time.perf_counter() - start
+        report(f"{','.join(names)[:28]}", rows, elapsed)
+        print(f"  {'':<28} computes {', '.join(resolve(names))}; warm-up {warmup_bars(names)} bars")
+
+    # Recomputing only the last `tail` bars from the derived warm-up matches
+    # the full-history values.
+    for name in [n for n in default_features() if warmup_bars([n]) is not None]:
+        first = rows - tail - warmup_bars([name])
+        window = compute_features({c: arr[first:] for c, arr in columns.items()}, [name])[name][-tail:]
+        expected = full[name][-tail:]
+        assert np.allclose(window.astype(float), expected.astype(float), rtol=1e-4, atol=1e-6, equal_nan=True), name
+    print("  parity: warm-up windows match the full-history values (rtol 1e-4)")
+
+def bench_session_features(sessions=2500):
+    print(f"📊 Session features: {sessions} sessions, segmented scans vs pandas groupby-apply")
+    days = sessions_between(datetime(2010, 1, 4).date(), datetime(2025, 12, 31).date())[-sessions:]
+    df = columns_to_frame(session_candles(days))
+    columns = {c: df[c].to_numpy() for c in ("datetime", "open", "high", "low", "close", "volume")}
+
+    start = time.perf_counter()
+    values = compute_features(columns, ["session_vwap", "session_volume", "or_high", "or_low"])
+    report("segmented kernels", len(df), time.perf_counter() - start)
+
+    def per_session(group):
+        pv = (group["volume"] * (group["high"] + group["low"] + group["close"]) / 3).cumsum()
+        volume = group["volume"].cumsum()
+        minutes = (group["datetime"] - group["datetime"].dt.normalize()).dt.total_seconds() / 60 - 570
+        opening = group[(minutes >= 0) & (minutes < 30)]
+        done = minutes >= 30
+        return pd.DataFrame({
+            "session_vwap": pv / volume, "session_volume": volume.astype(float),
+            "or_high": np.where(done, opening["high"].max(), np.nan),
+            "or_low": np.where(done, opening["low"].min(), np.nan),
+        }, index=group.index)
+
+    start = time.perf_counter()
+    expected = df.groupby(df["datetime"].dt.date, group_keys=False).apply(per_session)
+    report("pandas groupby-apply", len(df), time.perf_counter() - start)
+
+    for name in ("session_vwap", "session_volume", "or_high", "or_low"):
+        assert np.allclose(values[name], expected[name].to_numpy(), rtol=1e-9, equal_nan=True), name
+    print("  parity: session VWAP, cumulative volume and opening range match groupby-apply")
+
+def bench_label_forward_returns(sessions=250, drop_pct=2):
+    print(f"📊 Forward-return labels: {sessions} sessions, {drop_pct}% of minutes missing, "
+          "iterrows round trip vs window frames in Postgres")
+    conn = connect()
+    cur = conn.cursor()
+    symbol = "BENCHLB"
+    tables = [LABEL_TABLE, "quant_features_intraday", "quant_candles_intraday", "quant_candles_coverage"]
+    excursions = label_columns(HORIZONS + (30,), excursions=True)[4:]
+
+    def clear(*names):
+        for table in names:
+            cur.execute(f"DELETE FROM {table} WHERE ticker = %s;", (symbol,))
+        conn.commit()
+
+    def append(days, seed):
+        cols = session_candles(days, seed)
+        keep = np.random.default_rng(seed).random(len(cols["close"])) >= drop_pct / 100
+        cols = {name: arr[keep] for name, arr in cols.items()}
+        bulk_load_columns(conn, symbol, cols, (days[0], days[-1]))
+        bulk_write_features(conn, symbol, compute_indicators(columns_to_frame(cols)))
+        conn.commit()
+        # Fresh statistics, or the planner picks a nested loop over the
+        # just-loaded tables for the features-candles join.
+        cur.execute("ANALYZE quant_candles_intraday, quant_features_intraday;")
+        conn.commit()
+        return len(cols["close"])
+
+    def stored_labels(columns):
+        cur.execute(f"SELECT datetime, close, {', '.join(columns)} FROM {LABEL_TABLE} "
+                    "WHERE ticker = %s ORDER BY datetime;", (symbol,))
+        return pd.DataFrame(cur.fetchall(), columns=["datetime", "close"] + columns)
+
+    def check(columns, **options):
+        # Stored labels against the NumPy labeler over the whole history.
+        df = quant_label_forward_returns.add_forward_returns(quant_label_forward_returns.load_data(symbol), **options)
+        expected = df[df["return_5min"].notna()]
+        stored = stored_labels(columns)
+        assert len(stored) == len(expected) and (stored["datetime"].to_numpy() == expected["datetime"].to_numpy()).all()
+        assert np.allclose(stored[columns].to_numpy(dtype=float), expected[columns].to_numpy(dtype=float),
+                           equal_nan=True)
+        return len(stored)
+
+    clear(*tables)
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions + 1]
+    rows = append(days[:-1], 42)
+    returns = label_columns(HORIZONS)
+
+    quant_label_forward_returns.connect = connect
+    start = time.perf_counter()
+    df = quant_label_forward_returns.add_forward_returns(quant_label_forward_returns.load_data(symbol))
+    quant_label_forward_returns.save_labeled_data(symbol, df)
+    report("pandas + iterrows INSERTs", rows, time.perf_counter() - start)
+    expected = stored_labels(returns)
+    clear(LABEL_TABLE)
+
+    start = time.perf_counter()
+    labeled = label_in_database(conn, [symbol])
+    conn.commit()
+    report("INSERT ... SELECT, frames", labeled, time.perf_counter() - start)
+    stored = stored_labels(returns)
+    assert len(stored) == len(expected) and (stored["datetime"] == expected["datetime"]).all()
+    assert np.allclose(stored.iloc[:, 1:].to_numpy(dtype=float), expected.iloc[:, 1:].to_numpy(dtype=float),
+                       equal_nan=True)
+    print(f"  parity: {len(stored)} labeled rows match the pandas path")
+
+    start = time.perf_counter()
+    labeled = label_in_database(conn, [symbol])
+    conn.commit()
+    report("re-run, nothing new", labeled, time.perf_counter() - start)
+    assert labeled == 0
+
+    # With the label columns in place, an open labeling transaction leaves
+    # the table readable.
+    label_in_database(conn, [symbol])
+    reader = connect()
+    reader_cur = reader.cursor()
+    reader_cur.execute("SET lock_timeout = '1s';")
+    reader_cur.execute(f"SELECT count(*) FROM {LABEL_TABLE} WHERE ticker = %s;", (symbol,))
+    reader.close()
+    conn.commit()
+    print("  locks: a reader runs while a labeling transaction is open")
+
+    append(days[-1:], 7)
+    start = time.perf_counter()
+    labeled = label_in_database(conn, [symbol])
+    conn.commit()
+    report("incremental (1 session)", labeled, time.perf_counter() - start)
+    print(f"  parity: {check(returns)} labeled rows match a full NumPy relabel")
+
+    start = time.perf_counter()
+    labeled = label_in_database(conn, [symbol], HORIZONS + (30,), tolerance=2, excursions=True)
+    conn.commit()
+    report("+30 min, tolerance, MFE/MAE", labeled, time.perf_counter() - start)
+    print(f"  parity: {check(label_columns(HORIZONS + (30,), True), horizons=HORIZONS + (30,), tolerance=2, excursions=True)}"
+          " rows of returns and excursions match the NumPy labeler")
+
+    clear(*tables)
+    for column in ["return_30min"] + excursions:
+        cur.execute(f"ALTER TABLE {LABEL_TABLE} DROP COLUMN IF EXISTS {column};")
+    conn.commit()
+    conn.close()
+
+def bench_forward_labels(sessions=2500, drop_pct=2):
+    print(f"📊 Time-aware labels: {sessions} sessions, {drop_pct}% of minutes missing, NumPy vs pandas")
+    days = sessions_between(datetime(2010, 1, 4).date(), datetime(2025, 12, 31).date())[-sessions:]
+    cols = session_candles(days)
+    keep = np.random.default_rng(0).random(len(cols["close"])) >= drop_pct / 100
+    df = columns_to_frame({name: arr[keep] for name, arr in cols.items()})
+    df["datetime"] = df["datetime"].astype("datetime64[ns]")
+    horizons = HORIZONS + (30, 60)
+
+    start = time.perf_counter()
+    labels = forward_labels(df["datetime"].to_numpy(), df["close"].to_numpy(), horizons,
+                            high=df["high"].to_numpy(), low=df["low"].to_numpy())
+    report("searchsorted + van Herk", len(df), time.perf_counter() - start)
+
+    # Reference: merge_asof for the target bar, and time-based rolling
+    # windows over each session reversed in time for the excursions.
+    start = time.perf_counter()
+    day = df["datetime"].dt.normalize()
+    expected = {}
+    for h in horizons:
+        target = pd.DataFrame({"target": df["datetime"] + pd.Timedelta(minutes=h), "day": day})
+        found = pd.merge_asof(target, df[["datetime", "close"]].assign(day=day), left_on="target",
+                              right_on="datetime", by="day", tolerance=pd.Timedelta(0), direction="backward")
+        expected[f"return_{h}min"] = ((found["close"] - df["close"]) / df["close"] * 100).to_numpy()
+        flipped = df.assign(key=pd.Timestamp("2100-01-01") - (df["datetime"] - pd.Timestamp("1970-01-01")))
+        flipped = flipped.iloc[::-1].set_index("key")
+        rolling = flipped.groupby(day.iloc[::-1].to_numpy())[["high", "low"]].rolling(f"{h}min", closed="left")
+        highest = rolling["high"].max().droplevel(0).reindex(flipped.index).to_numpy()[::-1]
+        lowest = rolling["low"].min().droplevel(0).reindex(flipped.index).to_numpy()[::-1]
+        missing = np.isnan(expected[f"return_{h}min"])
+        expected[f"mfe_{h}min"] = np.where(missing, np.nan, (highest - df["close"]) / df["close"] * 100)
+        expected[f"mae_{h}min"] = np.where(missing, np.nan, (lowest - df["close"]) / df["close"] * 100)
+    report("pandas merge_asof + rolling", len(df), time.perf_counter() - start)
+
+    for name, values in expected.items():
+        assert np.allclose(labels[name], values, equal_nan=True), name
+    shifted = (df["close"].shift(-5) - df["close"]) / df["close"] * 100
+    wrong = (shifted.notna() & np.isnan(labels["return_5min"])).sum()
+    print(f"  parity: returns, MFE and MAE match pandas for {', '.join(map(str, horizons))} min")
+    print(f"  shift(-5) labels {wrong} bars ({wrong / len(df):.1%}) across a gap or the close")
+
+def bench_label_pipeline(sessions=250):
+    print(f"📊 Features and labels: {sessions} sessions, two passes vs the fused pipeline")
+    conn = connect()
+    cur = conn.cursor()
+    symbol = "BENCHLP"
+    tables = [LABEL_TABLE, "quant_features_intraday", "quant_candles_intraday", "quant_candles_coverage"]
+
+    def clear(*names):
+        for table in names:
+            cur.execute(f"DELETE FROM {table} WHERE ticker = %s;", (symbol,))
+        conn.commit()
+
+    def stored_labels():
+        cur.execute(f"SELECT datetime, rsi, macd_signal, ma_200, close, return_5min, return_10min, return_15min "
+                    f"FROM {LABEL_TABLE} WHERE ticker = %s ORDER BY datetime;", (symbol,))
+        return pd.DataFrame(cur.fetchall()).to_numpy()
+
+    clear(*tables)
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions]
+    cols = session_candles(days)
+    bulk_load_columns(conn, symbol, cols, (days[0], days[-1]))
+    cur.execute("ANALYZE quant_candles_intraday;")
+    conn.commit()
+    rows = len(cols["close"])
+    quant_engineer_features.connect = connect
+    quant_label_pipeline.connect = connect
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        quant_engineer_features.engineer_features(symbol)
+        cur.execute("ANALYZE quant_features_intraday;")
+        label_in_database(conn, [symbol])
+        conn.commit()
+        two_pass = time.perf_counter() - start
+    report("features, then SQL labels", rows, two_pass)
+    expected = stored_labels()
+    clear(LABEL_TABLE, "quant_features_intraday")
+
+    for label, persist in (("fused, both tables", True), ("fused, labels only", False)):
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            feature_rows, label_rows = quant_label_pipeline.run_pipeline(symbol, persist_features=persist)
+            elapsed = time.perf_counter() - start
+        report(label, rows, elapsed)
+        stored = stored_labels()
+        assert stored.shape == expected.shape and (stored[:, 0] == expected[:, 0]).all()
+        assert np.allclose(stored[:, 1:].astype(float), expected[:, 1:].astype(float), equal_nan=True)
+        cur.execute("SELECT count(*) FROM quant_features_intraday WHERE ticker = %s;", (symbol,))
+        assert cur.fetchone()[0] == (rows if persist else 0) == feature_rows
+        clear(LABEL_TABLE, "quant_features_intraday")
+    print(f"  parity: {len(expected)} labeled rows match the two-pass flow")
+
+    # A run part-way through the last session stores its newest rows with
+    # the longer horizons still NULL; the next run fills them in.
+    cutoff = np.datetime64(f"{days[-1]}T12:00")
+    later = cols["datetime"] >= cutoff
+    cur.execute("DELETE FROM quant_candles_intraday WHERE ticker = %s AND datetime >= %s;",
+                (symbol, cutoff.astype(datetime)))
+    conn.commit()
+    with redirect_stdout(io.StringIO()):
+        quant_label_pipeline.run_pipeline(symbol)
+        bulk_load_columns(conn, symbol, {name: arr[later] for name, arr in cols.items()}, (days[-1], days[-1]))
+        conn.commit()
+        start = time.perf_counter()
+        _, label_rows = quant_label_pipeline.run_pipeline(symbol)
+        elapsed = time.perf_counter() - start
+    report("fused, after the close", label_rows, elapsed)
+    stored = stored_labels()
+    assert stored.shape == expected.shape and (stored[:, 0] == expected[:, 0]).all()
+    assert np.allclose(stored[:, 1:].astype(float), expected[:, 1:].astype(float), equal_nan=True)
+    print("  parity: labels left pending at midday are filled in by the next run")
+
+    clear(*tables)
+    conn.close()
+
+def synthetic_labels(rows, seed=42):
+    # Labeled-table columns with realistic ranges, for the analysis benchmarks.
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 3, rows)
+    df = pd.DataFrame({
+        "rsi": rng.uniform(0, 100, rows), "macd": rng.normal(0, 0.05, rows),
+        "macd_signal": rng.normal(0, 0.05, rows), "vwap": close * rng.normal(1, 0.03, rows), "close": close,
+    })
+    for column in RETURN_COLUMNS:
+        df[column] = rng.normal(0, 0.2, rows)
+    df.loc[df.index[-15:], RETURN_COLUMNS[1:]] = np.nan
+    return df
+
+def analyze_groupby(df, axes):
+    # The pd.cut + categorical groupby the quant_analyze scripts used.
+    df = df.copy()
+    for axis in axes:
+        values = df[axis.expression] if axis.expression in df else df.eval(axis.expression)
+        df[f"{axis.name}_bucket"] = pd.cut(values, bins=list(axis.intervals.left) + [axis.intervals.right[-1]])
+    aggregations = {"count": (COUNT_RETURN, "count"), "rows": (RETURN_COLUMNS[0], "size")}
+    for column in RETURN_COLUMNS:
+        aggregations[f"avg_{column}"] = (column, "mean")
+        aggregations[f"std_{column}"] = (column, "std")
+    return df.groupby([f"{axis.name}_bucket" for axis in axes], observed=False).agg(**aggregations).reset_index()
+
+def bench_bucket_analysis(rows=20000000, seed=42):
+    print(f"📊 Bucket analysis: {rows:,} rows, digitize + bincount vs pd.cut + groupby")
+    df = synthetic_labels(rows, seed)
+    three = ANALYSES["rsi_macd"] + [Axis("vwap", "close / vwap", [0, 0.98, 1.0, 1.02, 1.05, 1.1, 1.2, 2])]
+    for name, axes in (("rsi", ANALYSES["rsi"]), ("rsi_macd", ANALYSES["rsi_macd"]), ("3 axes", three)):
+        start = time.perf_counter()
+        result = analyze(df, axes)
+        report(f"bincount, {name}", rows, time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = analyze_groupby(df, axes)
+        report(f"groupby, {name}", rows, time.perf_counter() - start)
+
+        assert (result["count"].to_numpy() == expected["count"].to_numpy()).all(), name
+        for column in result.columns[len(axes) + 1:]:
+            assert np.allclose(result[column], expected[column], equal_nan=True), (name, column)
+        print(f"  parity: {len(result)} buckets, counts, means and std devs match groupby")
+
+def bench_local_mirror(tickers=5, sessions=250):
+    print(f"📊 Local mirror: {tickers} tickers x {sessions} sessions, re-syncs after in-place rewrites")
+    conn = connect()
+    cur = conn.cursor()
+    symbols = [f"BENCHLM{i:03d}" for i in range(tickers)]
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions]
+    columns = LABEL_FEATURES + ["close"] + RETURN_COLUMNS
+    mirrored = quant_local_mirror.MIRROR_TABLES[LABEL_TABLE]
+    quant_local_mirror.MIRROR_DIR = tempfile.mkdtemp(prefix="quant_mirror_")
+
+    def clear():
+        cur.execute(f"DELETE FROM {LABEL_TABLE} WHERE ticker = ANY(%s);", (symbols,))
+        conn.commit()
+
+    def write_labels(symbol, session_days, seed, mode="nothing"):
+        stamps = session_candles(session_days)["datetime"]
+        df = synthetic_labels(len(stamps), seed).assign(datetime=stamps, ma_50=np.nan, ma_200=np.nan)
+        bulk_write_features(conn, symbol, df, LABEL_TABLE, mode, columns=columns, staging="quant_labels_staging")
+        conn.commit()
+        return len(df)
+
+    def sync(label):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            synced = quant_local_mirror.sync_table(conn, LABEL_TABLE, symbols)
+        report(label, synced, time.perf_counter() - start)
+
+    def check():
+        for symbol in symbols:
+            local = quant_local_mirror.read_local(LABEL_TABLE, symbol)
+            cur.execute(f"SELECT {', '.join(mirrored)} FROM {LABEL_TABLE} WHERE ticker = %s ORDER BY datetime;",
+                        (symbol,))
+            stored = pd.DataFrame(cur.fetchall(), columns=mirrored)
+            assert (local["datetime"].to_numpy() == pd.to_datetime(stored["datetime"]).to_numpy()).all(), symbol
+            for column in mirrored[1:]:
+                assert np.allclose(local[column].astype(float), stored[column].astype(float), equal_nan=True), column
+        conn.commit()
+
+    clear()
+    gap = days[100:105]
+    for seed, symbol in enumerate(symbols):
+        write_labels(symbol, days[:100] + days[105:-1], seed)
+    sync("initial sync")
+    sync("re-sync, nothing changed")
+    check()
+
+    # Rows changed before the newest stored day: a rewritten session (a
+    # feature --update run or relabeling), a backfilled gap, a deleted day,
+    # plus the usual appended session.
+    write_labels(symbols[0], days[50:51], 99, mode="update")
+    write_labels(symbols[1], gap, 98)
+    cur.execute(f"DELETE FROM {LABEL_TABLE} WHERE ticker = %s AND datetime::date = %s;", (symbols[2], days[10]))
+    write_labels(symbols[3], days[-1:], 97)
+    sync("re-sync, 4 changed days")
+    check()
+    print("  parity: after an in-place rewrite, a backfilled gap, a deleted day and an append, "
+          "the mirror matches the table")
+
+    clear()
+    shutil.rmtree(quant_local_mirror.MIRROR_DIR)
+    conn.close()
+
+def bench_bucket_store(tickers=20, sessions=250):
+    print(f"📊 Bucket statistics store: {tickers} tickers x {sessions} sessions, stored partials vs rescans")
+    conn = connect()
+    cur = conn.cursor()
+    symbols = [f"BENCHBS{i:03d}" for i in range(tickers)]
+    analysis, axes = "rsi_macd", ANALYSES["rsi_macd"]
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions + 1]
+    columns = LABEL_FEATURES + ["close"] + RETURN_COLUMNS
+
+    def clear():
+        for table in (LABEL_TABLE, STATS_TABLE, FINGERPRINT_TABLE):
+            cur.execute(f"DELETE FROM {table} WHERE ticker = ANY(%s);", (symbols,))
+        conn.commit()
+
+    def write_labels(symbol, session_days, seed):
+        stamps = session_candles(session_days)["datetime"]
+        df = synthetic_labels(len(stamps), seed).assign(datetime=stamps, ma_50=np.nan, ma_200=np.nan)
+        bulk_write_features(conn, symbol, df, LABEL_TABLE, columns=columns, staging="quant_labels_staging")
+        return len(df)
+
+    register_analysis(conn, analysis, axes)
+    clear()
+    rows = sum(write_labels(symbol, days[:-1], seed) for seed, symbol in enumerate(symbols))
+    cur.execute(f"ANALYZE {LABEL_TABLE};")
+    conn.commit()
+    quant_bucket_analysis.connect = connect
+
+    def rescan(symbols, start=None, end=None):
+        df = quant_bucket_analysis.load_labeled_data(symbols, axes, since=start)
+        if end is not None:
+            df = df[df["datetime"] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+        return analyze(df, axes)
+
+    def check(result, expected):
+        assert (result["count"].to_numpy() == expected["count"].to_numpy()).all()
+        for column in result.columns[len(axes) + 1:]:
+            assert np.allclose(result[column], expected[column], equal_nan=True), column
+
+    start = time.perf_counter()
+    expected = rescan(symbols)
+    report("rescan + analyze, universe", rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    cells = 0
+    for symbol in symbols:
+        cells += refresh_ticker(conn, analysis, symbol, axes)[1]
+        conn.commit()
+    report("initial refresh", rows, time.perf_counter() - start)
+    print(f"  {'':<28} {cells} stats rows ({rows / cells:.1f} labeled rows each)")
+
+    start = time.perf_counter()
+    result = query_stats(conn, analysis, symbols)
+    report("query, universe", cells, time.perf_counter() - start)
+    check(result, expected)
+
+    subset, first, last = symbols[:5], days[100], days[120]
+    start = time.perf_counter()
+    result = query_stats(conn, analysis, subset, first, last)
+    report("query, 5 tickers x 1 month", cells, time.perf_counter() - start)
+    check(result, rescan(subset, first, last))
+    print("  parity: merged statistics match a rescan of the labeled rows")
+
+    added = write_labels(symbols[0], days[-1:], 99)
+    conn.commit()
+    start = time.perf_counter()
+    read, written = refresh_ticker(conn, analysis, symbols[0], axes)
+    conn.commit()
+    report("incremental (1 session)", read, time.perf_counter() - start)
+    check(query_stats(conn, analysis, symbols), rescan(symbols))
+    print(f"  parity: after appending {added} rows, the store still matches a rescan")
+
+    # Older days changed in place: a backfilled day rewritten with new
+    # values, and a day deleted.
+    rewritten, deleted = days[40], days[60]
+    stamps = session_candles([rewritten])["datetime"]
+    df = synthetic_labels(len(stamps), 123).assign(datetime=stamps, ma_50=np.nan, ma_200=np.nan)
+    bulk_write_features(conn, symbols[1], df, LABEL_TABLE, mode="update", columns=columns, staging="quant_labels_staging")
+    cur.execute(f"DELETE FROM {LABEL_TABLE} WHERE ticker = %s AND datetime::date = %s;", (symbols[2], deleted))
+    conn.commit()
+    start = time.perf_counter()
+    read = sum(refresh_ticker(conn, analysis, symbol, axes)[0] for symbol in symbols)
+    conn.commit()
+    report("refresh, 2 older days", read, time.perf_counter() - start)
+    check(query_stats(conn, analysis, symbols), rescan(symbols))
+    start = time.perf_counter()
+    read = sum(refresh_ticker(conn, analysis, symbol, axes)[0] for symbol in symbols)
+    conn.commit()
+    report("refresh, nothing changed", read, time.perf_counter() - start)
+    assert read == 0
+    print("  parity: after rewriting and deleting older days, the store still matches a rescan")
+
+    clear()
+    conn.close()
+
+def bench_bucket_pushdown(*sizes, pandas_rows=5000000):
+    # Sizes in rows, grown in place; the pandas backend is skipped above
+    # pandas_rows, where fetching every labeled row outgrows a small box.
+    sizes = sizes or (1000000, 10000000, 50000000)
+    print(f"📊 Bucket analysis in Postgres (GROUP BY) vs fetching labeled rows into pandas")
+    conn = connect()
+    cur = conn.cursor()
+    chunk = 1000000
+    symbols = []
+    columns = LABEL_FEATURES + ["close"] + RETURN_COLUMNS
+    quant_bucket_analysis.connect = connect
+
+    for rows in sizes:
+        while len(symbols) * chunk < rows:
+            symbol = f"BENCHPD{len(symbols):03d}"
+            stamps = pd.date_range("2015-01-01", periods=chunk, freq="min")
+            df = synthetic_labels(chunk, len(symbols)).assign(datetime=stamps, ma_50=np.nan, ma_200=np.nan)
+            bulk_write_features(conn, symbol, df, LABEL_TABLE, columns=columns, staging="quant_labels_staging")
+            conn.commit()
+            symbols.append(symbol)
+        cur.execute(f"ANALYZE {LABEL_TABLE};")
+        conn.commit()
+        total = len(symbols) * chunk
+        print(f"  {total:,} labeled rows")
+
+        for name in ("rsi", "rsi_macd", "rsi_vwap"):
+            axes = ANALYSES[name]
+            start = time.perf_counter()
+            result = analyze_in_database(conn, symbols, axes)
+            report(f"sql, {name}", total, time.perf_counter() - start)
+            if total > pandas_rows:
+                print(f"  ⚠️ pandas, {name}: skipped above {pandas_rows:,} rows")
+                continue
+            start = time.perf_counter()
+            expected = analyze(quant_bucket_analysis.load_labeled_data(symbols, axes), axes)
+            report(f"pandas, {name}", total, time.perf_counter() - start)
+            assert (result["count"].to_numpy() == expected["count"].to_numpy()).all(), name
+            for column in result.columns[len(axes) + 1:]:
+                assert np.allclose(result[column], expected[column], equal_nan=True), (name, column)
+        if total <= pandas_rows:
+            print("  parity: SQL and pandas backends give the same counts, means and std devs")
+
+    # Zero divisors, bare and compound, land outside the buckets in both
+    # backends (NumPy's inf, SQL's NULL); expressions over anything but the
+    # labeled table's columns are rejected.
+    symbol = "BENCHPDZ"
+    df = synthetic_labels(100000, 7).assign(datetime=pd.date_range("2015-01-01", periods=100000, freq="min"),
+                                            ma_50=np.nan, ma_200=np.nan)
+    df.loc[df.index[::10], "macd_signal"] = df["macd"]
+    df.loc[df.index[5::20], "vwap"] = 0.0
+    bulk_write_features(conn, symbol, df, LABEL_TABLE, columns=columns, staging="quant_labels_staging")
+    conn.commit()
+    axes = [Axis("ratio", "rsi / (macd - macd_signal)", [-1e6, -1000, -100, 0, 100, 1000, 1e6]),
+            Axis("vwap", "close / vwap / 2 * (1 + 1)", [0, 0.98, 1.0, 1.02, 2])]
+    result = analyze_in_database(conn, [symbol], axes)
+    expected = analyze(quant_bucket_analysis.load_labeled_data([symbol], axes), axes)
+    assert (result["rows"].to_numpy() == expected["rows"].to_numpy()).all()
+    for column in result.columns[len(axes):]:
+        assert np.allclose(result[column], expected[column], equal_nan=True), column
+    for expression in ("(select rsi from quant_candles_intraday limit 1)", "pg_sleep(1) + rsi", "rsi ** 2"):
+        try:
+            analyze_in_database(conn, [symbol], [Axis("bad", expression, [0, 1])])
+            raise AssertionError(expression)
+        except ValueError:
+            conn.rollback()
+    print(f"  parity: zero divisors match pandas ({int(result['rows'].sum())} rows bucketed); "
+          "non-column expressions rejected")
+    symbols.append(symbol)
+
+    cur.execute(f"DELETE FROM {LABEL_TABLE} WHERE ticker = ANY(%s);", (symbols,))
+    conn.commit()
+    conn.close()
+
+def significance_loop(df, axes, resamples, seed=42):
+    # One pandas resample at a time: a bootstrap per bucket and a label
+    # shuffle plus groupby per permutation, the straightforward way.
+    rng = np.random.default_rng(seed)
+    size = int(np.prod([axis.buckets for axis in axes]))
+    buckets = quant_bucket_analysis.bucket_index({c: df[c].to_numpy() for c in df.columns}, axes)
+    returns = df[RETURN_COLUMNS][buckets < size]
+    buckets = buckets[buckets < size]
+    observed = returns.groupby(buckets).mean()
+    overall = returns.mean()
+    extreme = 0
+    for _ in range(resamples):
+        shuffled = returns.groupby(rng.permutation(buckets)).mean()
+        extreme = extreme + ((shuffled - overall).abs() >= (observed - overall).abs())
+    intervals = {}
+    for bucket, rows in returns.groupby(buckets):
+        means = pd.DataFrame([rows.sample(len(rows), replace=True, random_state=rng).mean() for _ in range(resamples)])
+        intervals[bucket] = means.quantile([0.025, 0.975])
+    return (1 + extreme) / (1 + resamples), intervals
+
+def bench_bucket_significance(rows=1000000, resamples=1000, loop_rows=100000, loop_resamples=100):
+    print(f"📊 Bucket significance: bootstrap CIs + permutation p-values, batched NumPy vs per-resample pandas")
+    axes = ANALYSES["rsi_macd"]
+    small = synthetic_labels(loop_rows, 7)
+    start = time.perf_counter()
+    result = significance(small, axes, resamples=loop_resamples)
+    report(f"batched, {loop_resamples} resamples", loop_rows, time.perf_counter() - start)
+    start = time.perf_counter()
+    significance_loop(small, axes, loop_resamples)
+    report(f"pandas loop, {loop_resamples} resamples", loop_rows, time.perf_counter() - start)
+    parallel = significance(small, axes, resamples=loop_resamples, workers=2)
+    assert np.allclose(result.to_numpy(), parallel.to_numpy(), equal_nan=True)
+    print("  reproducible: the same seed gives the same intervals and p-values with 1 or 2 workers")
+
+    df = synthetic_labels(rows, 7)
+    edge = df["rsi"] <= 20
+    df.loc[edge, RETURN_COLUMNS[0]] += 0.01  # one real edge among noise buckets
+    start = time.perf_counter()
+    result = analyze_significance(df, axes, resamples=resamples)
+    report(f"batched, {resamples} resamples", rows, time.perf_counter() - start)
+    column = RETURN_COLUMNS[0]
+    assert ((result[f"ci_low_{column}"] <= result[f"avg_{column}"])
+            & (result[f"avg_{column}"] <= result[f"ci_high_{column}"])).all()
+    flagged = result[f"p_{column}"] < 0.01
+    planted = result["rsi_bucket"].map(lambda interval: interval.right <= 20).astype(bool)
+    print(f"  {column}: {int(flagged[planted].sum())}/{int(planted.sum())} buckets with the planted edge at p < 0.01, "
+          f"{int(flagged[~planted].sum())}/{int((~planted).sum())} noise buckets")
+
+def backtest_loop(frames, rule, cost):
+    # One rule at a time: a pandas mask per ticker, then a Python loop that
+    # skips entries while a position is open.
+    returns = []
+    for df in frames.values():
+        features = {name: df.eval(expression).to_numpy() for name, expression in RULE_FEATURES.items()}
+        exits = quant_backtest.forward_index(df["datetime"].to_numpy(), rule["hold"])
+        mask = np.ones(len(df), dtype=bool)
+        for name, threshold in rule.items():
+            if name != "hold":
+                feature, compare = quant_backtest.CONDITIONS[name]
+                mask &= compare(features[feature], threshold)
+        close = df["close"].to_numpy()
+        busy_until = -1
+        for i in np.flatnonzero(mask):
+            if i < busy_until or exits[i] < 0:
+                continue
+            returns.append((close[exits[i]] - close[i]) / close[i] * 100 - cost)
+            busy_until = exits[i]
+    return len(returns), sum(returns)
+
+def bench_backtest(tickers=20, sessions=250, loop_rules=10):
+    print(f"📊 Backtest grid search: {tickers} tickers x {sessions} sessions, rule masks over memory-mapped arrays")
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions]
+    frames = {}
+    for seed in range(tickers):
+        df = compute_indicators(columns_to_frame(session_candles(days, seed)), sessions=True)
+        frames[f"BENCHBT{seed:03d}"] = df.dropna(subset=["rsi", "macd", "macd_signal", "vwap"]).reset_index(drop=True)
+    rows = sum(len(df) for df in frames.values())
+    grid = {"rsi_below": [20, 25, 30, 35, 40, 45, 50, 55], "hist_above": [-0.05, -0.02, -0.01, 0, 0.01, 0.02, 0.05],
+            "vwap_below": [0.99, 1.0, 1.01, 10], "hold": [5, 10, 15, 30, 60]}
+    combos = len(parameter_grid(grid))
+    cost = quant_backtest.COST_PCT
+
+    quant_backtest.BACKTEST_DIR = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        path = prepare_arrays(frames, grid["hold"], "bench")
+        report("prepare arrays", rows, time.perf_counter() - start)
+
+        results = []
+        for workers in (1, max(2, os.cpu_count() or 1)):
+            start = time.perf_counter()
+            results.append(grid_search(path, grid, cost, workers=workers))
+            elapsed = time.perf_counter() - start
+            print(f"  {f'grid, {workers} workers':<28} {combos:>10} combos {elapsed:>8.2f}s  {combos / elapsed:>12,.0f} combos/sec")
+        result = results[0]
+        pd.testing.assert_frame_equal(result, results[1])
+
+        rules = parameter_grid(grid)[::combos // loop_rules][:loop_rules]
+        start = time.perf_counter()
+        expected = [backtest_loop(frames, rule, cost) for rule in rules]
+        elapsed = time.perf_counter() - start
+        print(f"  {'pandas + trade loop':<28} {len(rules):>10} combos {elapsed:>8.2f}s  {len(rules) / elapsed:>12,.0f} combos/sec")
+        for rule, (trades, total) in zip(rules, expected):
+            row = result.iloc[parameter_grid(grid).index(rule)]
+            assert row["trades"] == trades and np.isclose(row["total_return"], total), (rule, row, trades, total)
+        print(f"  parity: {len(rules)} rules match the loop (trades and total return, non-overlapping)")
+        print(f"  busiest rule: {int(result['trades'].max())} trades; "
+              f"{int((result['trades'] >= 30).sum())}/{combos} rules with 30+ trades")
+
+        # Bad holds fail up front: unprepared ones before any worker starts,
+        # and zero, whose exits equal their entries, when the grid is parsed.
+        for bad in ({**grid, "hold": [5, 45]}, {"rsi_below": [30]}):
+            try:
+                grid_search(path, bad, cost, workers=2)
+                raise AssertionError(bad)
+            except ValueError:
+                pass
+        try:
+            quant_backtest.parse_grid({"hold": "0,5"})
+            raise AssertionError("hold=0")
+        except ValueError:
+            pass
+        entries = np.arange(10)
+        assert (quant_backtest.non_overlapping(entries, entries) == entries).all()
+        print("  guards: unprepared and zero holds are rejected; a zero-length trade chain terminates")
+    finally:
+        shutil.rmtree(quant_backtest.BACKTEST_DIR)
+
+def bench_quantile_bins(tickers=8, sessions=250):
+    print(f"📊 Adaptive bins: {tickers} tickers x {sessions} sessions at $100-$5000, day t-digests vs sorting the history")
+    conn = connect()
+    cur = conn.cursor()
+    symbols = [f"BENCHQB{i:03d}" for i in range(tickers)]
+    scales = np.geomspace(1, 50, tickers)
+    axes = ADAPTIVE_ANALYSES["rsi_macd"]
+    macd = axes[1]
+    days = sessions_between(datetime(2024, 1, 2).date(), datetime(2025, 12, 31).date())[:sessions + 1]
+
+    def clear():
+        quant_quantile_sketch.ensure_table(cur)
+        for table in (LABEL_TABLE, SKETCH_TABLE, FINGERPRINT_TABLE):
+            cur.execute(f"DELETE FROM {table} WHERE ticker = ANY(%s);", (symbols,))
+        conn.commit()
+
+    def write_labels(symbol, session_days, seed, scale):
+        cols = session_candles(session_days, seed)
+        for field in ("open", "high", "low", "close"):
+            cols[field] = cols[field] * scale
+        labels = quant_label_pipeline.label_frame(compute_indicators(columns_to_frame(cols), sessions=True))
+        bulk_write_features(conn, symbol, labels, LABEL_TABLE, columns=LABEL_FEATURES + ["close"] + RETURN_COLUMNS,
+                            staging="quant_labels_staging")
+        conn.commit()
+        return len(labels)
+
+    clear()
+    rows = sum(write_labels(symbol, days[:-1], seed, scale) for seed, (symbol, scale) in enumerate(zip(symbols, scales)))
+    cur.execute(f"ANALYZE {LABEL_TABLE};")
+    conn.commit()
+    quant_bucket_analysis.connect = connect
+
+    start = time.perf_counter()
+    for symbol in symbols:
+        refresh_sketches(conn, symbol, axes)
+        conn.commit()
+    report("sketch all days", rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    exact = {}
+    for symbol in symbols:
+        values = macd.values(quant_bucket_analysis.load_labeled_data([symbol], axes, returns=()))
+        exact[symbol] = (np.sort(values[np.isfinite(values)]), np.quantile(values[np.isfinite(values)], macd.quantiles[1:-1]))
+    report("read + sort, exact deciles", rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for symbol in symbols:
+        quant_quantile_sketch.ticker_edges(quant_quantile_sketch.load_digest(cur, symbol, macd.expression), macd.quantiles)
+    report("merge day sketches, deciles", rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result, edges = analyze_adaptive(conn, symbols, axes)
+    report("adaptive rsi_macd analysis", rows, time.perf_counter() - start)
+    worst = max(np.abs(np.searchsorted(ordered, edges[symbol]["macd"][1:-1]) / len(ordered) - macd.quantiles[1:-1]).max()
+                for symbol, (ordered, _) in exact.items())
+    print(f"  sketch deciles within {worst:.3%} of their exact rank on every ticker")
+    shares = result.groupby("macd_bucket", observed=True)["rows"].sum() / result["rows"].sum()
+    print(f"  rows per MACD decile: {shares.min():.1%} - {shares.max():.1%}")
+    fixed = ANALYSES["rsi_macd"][1]
+    ordered = exact[symbols[-1]][0]
+    outer = 1 - (np.searchsorted(ordered, fixed.edges[-2]) - np.searchsorted(ordered, fixed.edges[1])) / len(ordered)
+    print(f"  fixed MACD edges on the ${100 * scales[-1]:.0f} ticker: {outer:.1%} of rows in the two outer bins")
+
+    added = write_labels(symbols[0], days[-1:], 99, scales[0])
+    start = time.perf_counter()
+    read, written = refresh_sketches(conn, symbols[0], axes)
+    conn.commit()
+    report("incremental (1 session)", read, time.perf_counter() - start)
+    print(f"  {added} new rows: re-sketched {written} day")
+
+    # An older day relabeled with new values, and one deleted: their sketches
+    # follow, and the other days are not read again.
+    rewritten, deleted = days[40], days[60]
+    cols = session_candles([rewritten], 123)
+    labels = quant_label_pipeline.label_frame(compute_indicators(columns_to_frame(cols)))
+    bulk_write_features(conn, symbols[1], labels, LABEL_TABLE, mode="update",
+                        columns=LABEL_FEATURES + ["close"] + RETURN_COLUMNS, staging="quant_labels_staging")
+    cur.execute(f"DELETE FROM {LABEL_TABLE} WHERE ticker = %s AND datetime::date = %s;", (symbols[2], deleted))
+    conn.commit()
+    start = time.perf_counter()
+    read = sum(refresh_sketches(conn, symbol, axes)[0] for symbol in symbols)
+    conn.commit()
+    report("refresh, 2 older days", read, time.perf_counter() - start)
+    day_rows = quant_bucket_analysis.load_labeled_data([symbols[1]], axes, returns=(), days=[rewritten])
+    expected = quant_quantile_sketch.TDigest().update(macd.values({c: day_rows[c].to_numpy() for c in day_rows}))
+    stored = quant_quantile_sketch.load_digest(cur, symbols[1], macd.expression, rewritten, rewritten)
+    assert stored.count == expected.count and np.allclose(stored.quantile(macd.quantiles), expected.quantile(macd.quantiles))
+    assert quant_quantile_sketch.load_digest(cur, symbols[2], macd.expression, deleted, deleted).count == 0
+    assert sum(refresh_sketches(conn, symbol, axes)[0] for symbol in symbols) == 0
+    conn.commit()
+    print(f"  parity: {read} rows re-read; the rewritten day's sketch matches its rows, the deleted day's is gone")
+
+    clear()
+    conn.close()
+
+BENCHMARKS = {
+    "candle_loader": bench_candle_loader,
+    "backfill_universe": bench_backfill_universe,
+    "fmp_cache": bench_fmp_cache,
+    "columnar_parse": bench_columnar_parse,
+    "partition_pruning": bench_partition_pruning,
+    "resample_bars": bench_resample_bars,
+    "incremental_features": bench_incremental_features,
+    "indicator_kernels": bench_indicator_kernels,
+    "feature_writer": bench_feature_writer,
+    "feature_registry": bench_feature_registry,
+    "session_features": bench_session_features,
+    "label_forward_returns": bench_label_forward_returns,
+    "label_pipeline": bench_label_pipeline,
+    "forward_labels": bench_forward_labels,
+    "bucket_analysis": bench_bucket_analysis,
+    "local_mirror": bench_local_mirror,
+    "bucket_store": bench_bucket_store,
+    "bucket_pushdown": bench_bucket_pushdown,
+    "bucket_significance": bench_bucket_significance,
+    "backtest": bench_backtest,
+    "quantile_bins": bench_quantile_bins,
+}
+
+# === Main ===
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in BENCHMARKS:
+        args = [int(a) for a in sys.argv[2:]]
+        BENCHMARKS[sys.argv[1]](*args)
+    else:
+        print(f"❌ Please provide a benchmark name: {', '.join(BENCHMARKS)}. "
+              f"Example: BENCH_DSN=postgresql://localhost/bench python3 quant_benchmarks.py candle_loader")
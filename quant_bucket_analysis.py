@@ -0,0 +1,367 @@
+import psycopg2
+import numpy as np
+import pandas as pd
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from quant_feature_writer import table_columns
+from quant_label_forward_returns import HORIZONS, LABEL_TABLE, return_column
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+RETURN_COLUMNS = [return_column(h) for h in HORIZONS]
+# "count" in the analysis tables is the bucket's labeled rows for this
+# horizon (its non-null returns), as in the original analyze scripts; "rows"
+# counts every row in the bucket.
+COUNT_RETURN = return_column(10)
+
+# === Connect ===
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+# === Bucket Engine ===
+# An analysis is a list of axes, each a feature expression (a column or
+# arithmetic over columns, e.g. "close / vwap") cut at fixed edges. Every
+# row's bucket on each axis comes from digitizing against the edges, the
+# axes combine into one flat bucket id, and np.bincount over that id gives
+# the count, sum and sum of squares of every return horizon per bucket,
+# with no groupby and no sort.
+# Buckets are right-closed like pd.cut; values outside the edges or NaN
+# fall in no bucket.
+
+class Axis:
+    def __init__(self, name, expression, edges):
+        self.name = name
+        self.expression = expression
+        self.breaks = list(edges)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.intervals = pd.IntervalIndex.from_breaks(self.breaks)  # labels as pd.cut would print them
+
+    @property
+    def inputs(self):
+        return sorted(set(re.findall(r"\b[A-Za-z_]\w*", self.expression)))  # \b skips exponents (1e3)
+
+    @property
+    def buckets(self):
+        return len(self.edges) - 1
+
+    def values(self, columns):
+        if self.expression in columns:
+            return np.asarray(columns[self.expression], dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):  # x / 0 is inf (or NaN), outside every bucket
+            return np.asarray(pd.eval(self.expression, local_dict={c: columns[c] for c in self.inputs}, engine="python"),
+                              dtype=np.float64)
+
+class QuantileAxis(Axis):
+    # Bins at quantiles of the feature instead of fixed values (e.g. deciles
+    # of the MACD histogram), so they follow each ticker's own scale. The
+    # intervals are quantile ranges; bucketing needs the Axis from bind()
+    # with one ticker's edges at those quantiles.
+    def __init__(self, name, expression, quantiles):
+        super().__init__(name, expression, quantiles)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    def bind(self, edges):
+        return Axis(self.name, self.expression, edges)
+
+RSI_EDGES = [0, 20, 30, 40, 50, 60, 70, 80, 100]
+
+ANALYSES = {
+    "rsi": [Axis("rsi", "rsi", RSI_EDGES)],
+    "rsi_macd": [Axis("rsi", "rsi", RSI_EDGES),
+                 Axis("macd", "macd - macd_signal", [-5, -0.1, -0.01, 0.0, 0.01, 0.1, 5])],
+    "rsi_vwap": [Axis("rsi", "rsi", RSI_EDGES),
+                 Axis("vwap", "close / vwap", [0, 0.98, 1.0, 1.02, 1.05, 1.1, 1.2, 2])],
+}
+
+SHORT_EDGES = 16  # up to this many edges, counting comparisons beats np.digitize's binary search
+
+def _digitize(values, edges):
+    # np.digitize(values, edges, right=True): the number of edges below each
+    # value. NaN compares below every edge, so it lands outside too.
+    if len(edges) > SHORT_EDGES:
+        return np.digitize(values, edges, right=True)
+    ids = np.zeros(len(values), dtype=np.int8)
+    above = np.empty(len(values), dtype=bool)
+    for edge in edges:
+        ids += np.greater(values, edge, out=above)
+    return ids
+
+def bucket_index(columns, axes):
+    # Flat bucket id per row (the first axis varies slowest); rows outside
+    # some axis get the id one past the last bucket.
+    size = int(np.prod([axis.buckets for axis in axes]))
+    flat = np.zeros(len(columns[next(iter(columns))]), dtype=np.int64)
+    inside = None
+    for axis in axes:
+        ids = _digitize(axis.values(columns), axis.edges)
+        ok = (ids >= 1) & (ids <= axis.buckets)
+        flat *= axis.buckets
+        flat += ids
+        flat -= 1
+        inside = ok if inside is None else inside & ok
+    flat[~inside] = size
+    return flat
+
+def bucket_stats(columns, axes, returns=RETURN_COLUMNS, groups=None, group_count=1):
+    # {"rows": rows per bucket, "count"/"sum"/"sumsq": (returns, buckets)
+    # arrays over the non-NaN returns}. Sums of this form merge by addition.
+    # groups: an id in [0, group_count) per row (e.g. its day); the bucket
+    # axis then runs over group_count blocks of buckets, one per group.
+    size = int(np.prod([axis.buckets for axis in axes]))
+    flat = bucket_index(columns, axes)
+    if groups is not None:
+        outside = flat == size
+        flat += np.asarray(groups, dtype=np.int64) * size
+        size *= group_count
+        flat[outside] = size
+    rows = np.bincount(flat, minlength=size + 1)[:size]
+    stats = {"rows": rows,
+             "count": np.zeros((len(returns), size), dtype=np.int64),
+             "sum": np.zeros((len(returns), size)),
+             "sumsq": np.zeros((len(returns), size))}
+    for i, column in enumerate(returns):
+        values = np.asarray(columns[column], dtype=np.float64)
+        missing = np.isnan(values)
+        ids = flat
+        if missing.any():
+            # NaN returns go to the overflow bucket with the outside rows.
+            ids = np.where(missing, size, flat)
+            values = np.where(missing, 0.0, values)
+            stats["count"][i] = np.bincount(ids, minlength=size + 1)[:size]
+        else:
+            stats["count"][i] = rows
+        stats["sum"][i] = np.bincount(ids, weights=values, minlength=size + 1)[:size]
+        stats["sumsq"][i] = np.bincount(ids, weights=values * values, minlength=size + 1)[:size]
+    return stats
+
+def summarize(stats, axes, returns=RETURN_COLUMNS):
+    # One row per bucket combination: the axis intervals, the non-null count
+    # of COUNT_RETURN (of the first return when it isn't analyzed), the row
+    # count and the mean and sample standard deviation of every return.
+    buckets = pd.MultiIndex.from_product([axis.intervals for axis in axes],
+                                         names=[f"{axis.name}_bucket" for axis in axes])
+    result = buckets.to_frame(index=False)
+    returns = list(returns)
+    result["count"] = stats["count"][returns.index(COUNT_RETURN) if COUNT_RETURN in returns else 0]
+    result["rows"] = stats["rows"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, column in enumerate(returns):
+            n, total, squares = stats["count"][i], stats["sum"][i], stats["sumsq"][i]
+            mean = np.where(n > 0, total / n, np.nan)
+            variance = np.where(n > 1, (squares - total * mean) / (n - 1), np.nan)
+            result[f"avg_{column}"] = mean
+            result[f"std_{column}"] = np.sqrt(np.maximum(variance, 0))
+    return result
+
+def stats_from_rows(positions, values, axes, returns=RETURN_COLUMNS):
+    # bucket_stats arrays from per-bucket aggregate rows: positions holds
+    # each row's bucket on every axis, values its row count followed by the
+    # count, sum and sum of squares of every return.
+    shape = [axis.buckets for axis in axes]
+    size = int(np.prod(shape))
+    stats = {"rows": np.zeros(size, dtype=np.int64),
+             "count": np.zeros((len(returns), size), dtype=np.int64),
+             "sum": np.zeros((len(returns), size)),
+             "sumsq": np.zeros((len(returns), size))}
+    if len(positions):
+        cells = np.ravel_multi_index(np.asarray(positions, dtype=np.int64).T, shape)
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))  # NULL sums where no return was set
+        stats["rows"][cells] = values[:, 0]
+        for i in range(len(returns)):
+            stats["count"][i][cells] = values[:, 1 + 3 * i]
+            stats["sum"][i][cells] = values[:, 2 + 3 * i]
+            stats["sumsq"][i][cells] = values[:, 3 + 3 * i]
+    return stats
+
+def analyze(df, axes, returns=RETURN_COLUMNS):
+    columns = {c: df[c].to_numpy() for c in set(returns).union(*(axis.inputs for axis in axes))}
+    return summarize(bucket_stats(columns, axes, returns), axes, returns)
+
+# === Load Labeled Data ===
+def load_labeled_data(tickers, axes, source="db", returns=RETURN_COLUMNS, since=None, days=None):
+    # The axis inputs and returns of the tickers' labeled rows (from `since`
+    # on, or only on the dates in `days`, if given), skipping rows where an
+    # axis input is NULL.
+    inputs = sorted(set().union(*(axis.inputs for axis in axes)))
+    columns = ["datetime"] + inputs + list(returns)
+    if days is not None:
+        days = sorted(days)
+        since = days[0] if days else since
+    if source == "local":
+        from quant_local_mirror import read_local
+        df = pd.concat([read_local(LABEL_TABLE, ticker, columns=columns, start=since, not_null=inputs)
+                        for ticker in tickers], ignore_index=True)
+        if days is not None:
+            df = df[df["datetime"].dt.date.isin(days)].reset_index(drop=True)
+        return df
+
+    conn = connect()
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM {LABEL_TABLE}
+        WHERE ticker = ANY(%s) AND datetime >= %s {"".join(f"AND {c} IS NOT NULL " for c in inputs)}
+        {"AND datetime::date = ANY(%s::date[])" if days is not None else ""}
+        ORDER BY ticker, datetime;
+    """
+    params = (list(tickers), since or datetime(1900, 1, 1)) + ((days,) if days is not None else ())
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+# === SQL Backend ===
+# The same buckets as a GROUP BY in Postgres, so only one aggregate row per
+# bucket crosses the wire instead of every labeled row. Each axis becomes a
+# CASE over its edges, right-closed and NULL outside or for NaN, as in
+# _digitize; the sums come back in the bucket_stats layout and go through
+# the same summarize() as the pandas backend.
+
+SQL_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|([-+*/()]))")
+
+def _sql_tokens(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = SQL_TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Unsupported axis expression for SQL: {expression}")
+        tokens.append(match.groups())
+        position = match.end()
+    return tokens
+
+def sql_expression(expression, columns):
+    # Axis expressions are arithmetic (+ - * / and parentheses) over numbers
+    # and columns of the labeled table (`columns`); anything else is
+    # rejected. Operands are cast to float8 so integer columns divide as in
+    # NumPy, and every divisor goes through NULLIF, so x / 0 falls outside
+    # the buckets as inf does in NumPy instead of raising.
+    tokens = _sql_tokens(expression)
+    position = 0
+
+    def peek():
+        return tokens[position][2] if position < len(tokens) else None
+
+    def factor():
+        nonlocal position
+        if position == len(tokens):
+            raise ValueError(f"Unsupported axis expression for SQL: {expression}")
+        number, name, operator = tokens[position]
+        position += 1
+        if operator in ("-", "+"):
+            # Spaced, so "- -x" doesn't become a "--" comment.
+            return f"{operator} {factor()}"
+        if operator == "(":
+            inner = sum_of_terms()
+            if peek() != ")":
+                raise ValueError(f"Unbalanced parentheses in axis expression: {expression}")
+            position += 1
+            return f"({inner})"
+        if name is not None:
+            if name not in columns:
+                raise ValueError(f"Axis expression uses {name}, which is not a column of {LABEL_TABLE}")
+            return f"{name}::float8"
+        if number is not None:
+            return f"{number}::float8"
+        raise ValueError(f"Unsupported axis expression for SQL: {expression}")
+
+    def product():
+        nonlocal position
+        sql = factor()
+        while peek() in ("*", "/"):
+            operator = peek()
+            position += 1
+            operand = factor()
+            sql = f"{sql} * {operand}" if operator == "*" else f"{sql} / NULLIF({operand}, 0)"
+        return sql
+
+    def sum_of_terms():
+        nonlocal position
+        sql = product()
+        while peek() in ("+", "-"):
+            operator = peek()
+            position += 1
+            sql = f"{sql} {operator} {product()}"
+        return sql
+
+    sql = sum_of_terms()
+    if position != len(tokens):
+        raise ValueError(f"Unsupported axis expression for SQL: {expression}")
+    return sql
+
+def bucket_case(value, edges):
+    edges = [float(edge) for edge in edges]
+    whens = [f"WHEN {value} <= {edges[0]!r} THEN NULL"]
+    whens += [f"WHEN {value} <= {edge!r} THEN {i}" for i, edge in enumerate(edges[1:])]
+    return f"CASE {' '.join(whens)} END"
+
+def bucket_sql(axes, columns, returns=RETURN_COLUMNS):
+    # columns: the labeled table's columns, which the axes may use.
+    inputs = sorted(set().union(*(axis.inputs for axis in axes)))
+    values = [f"{sql_expression(axis.expression, columns)} AS v{k}" for k, axis in enumerate(axes)]
+    buckets = [f"{bucket_case(f'v{k}', axis.breaks)} AS b{k}" for k, axis in enumerate(axes)]
+    sums = [f"count({c}), sum({c}), sum({c} * {c})" for c in returns]
+    return f"""
+        SELECT {", ".join(buckets)}, count(*), {", ".join(sums)}
+        FROM (
+            SELECT {", ".join(values + list(returns))}
+            FROM {LABEL_TABLE}
+            WHERE ticker = ANY(%s) AND datetime >= %s {"".join(f"AND {c} IS NOT NULL " for c in inputs)}
+        ) labeled
+        GROUP BY {", ".join(str(k + 1) for k in range(len(axes)))};
+    """
+
+def analyze_in_database(conn, tickers, axes, returns=RETURN_COLUMNS, since=None):
+    cur = conn.cursor()
+    cur.execute(bucket_sql(axes, table_columns(cur, LABEL_TABLE), returns), (list(tickers), since or datetime(1900, 1, 1)))
+    rows = [row for row in cur.fetchall() if None not in row[:len(axes)]]
+    cur.close()
+    positions = [row[:len(axes)] for row in rows]
+    values = [row[len(axes):] for row in rows]
+    return summarize(stats_from_rows(positions, values, axes, returns), axes, returns)
+
+def bucket_table(tickers, axes, source="db", returns=RETURN_COLUMNS, backend="sql"):
+    # The analysis table from Postgres aggregates, or (backend="pandas", and
+    # always for the local mirror) from the labeled rows bucketed in NumPy.
+    if source == "local" or backend == "pandas":
+        return analyze(load_labeled_data(tickers, axes, source, returns), axes, returns)
+    conn = connect()
+    result = analyze_in_database(conn, tickers, axes, returns)
+    conn.close()
+    return result
+
+def parse_axis(spec):
+    # name=expression:edge,edge,...
+    name, rest = spec.split("=", 1)
+    expression, edges = rest.rsplit(":", 1)
+    return Axis(name, expression.strip(), [float(e) for e in edges.split(",")])
+
+# === Main ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    custom = [parse_axis(a[len("--axis="):]) for a in sys.argv[1:] if a.startswith("--axis=")]
+    if args and (args[0] in ANALYSES or custom):
+        axes = ANALYSES[args.pop(0)] if args[0] in ANALYSES else custom
+        tickers = [a.upper() for a in args]
+        returns = ([return_column(int(h)) for h in flags["horizons"].split(",")]
+                   if "horizons" in flags else RETURN_COLUMNS)
+        start_time = time.time()
+        print(f"🔍 Analyzing {', '.join(axis.name for axis in axes)} buckets for: {', '.join(tickers)}\n")
+        result = bucket_table(tickers, axes, "local" if "--local" in sys.argv else "db", returns,
+                              "pandas" if "--pandas" in sys.argv else "sql")
+        print(result)
+        print(f"\n⏱️ {result['rows'].sum()} bucketed rows in {time.time() - start_time:.2f} seconds")
+    else:
+        print(f"❌ Please provide an analysis ({', '.join(ANALYSES)}) and a ticker symbol. "
+              "Example: python3 quant_bucket_analysis.py rsi_macd GRRR [AAPL ...] [--horizons=5,10,15] [--pandas] [--local] "
+              "or python3 quant_bucket_analysis.py GRRR --axis='hist=macd - macd_signal:-5,-0.1,0,0.1,5'")
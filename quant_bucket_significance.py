@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+
+from quant_bucket_analysis import ANALYSES, RETURN_COLUMNS, analyze, bucket_index, load_labeled_data
+
+# === Config ===
+# One worker process per core, like quant_engineer_features; with a single
+# worker everything runs in-process.
+BOOTSTRAP_WORKERS = int(os.environ.get("BOOTSTRAP_WORKERS", os.cpu_count() or 1))
+RESAMPLES = 1000
+CONFIDENCE = 0.95
+SEED = 42
+BATCH_ELEMENTS = 1 << 22   # resample draws held in memory at once per task
+PERMUTATIONS_PER_TASK = 50
+
+# === Bootstrap and Permutation Tests ===
+# For every bucket and return: a percentile bootstrap confidence interval of
+# the mean, and a two-sided permutation p-value for "the bucket's mean
+# differs from the mean over all bucketed rows".
+# Rows are sorted by bucket so each bucket is a slice. A bootstrap batch is
+# an index matrix of (resamples, n) draws, turned into per-row counts with
+# one bincount, so the resampled sums of every return are a single matrix
+# product with the bucket's values. A permutation shuffles all rows once and
+# splits them at the bucket boundaries, which tests every bucket at once.
+# Each task gets its own child of one SeedSequence, so results depend on
+# the seed only, not on the number of workers.
+
+_ROWS = {}
+
+def _init(values, valid, starts):
+    # values and valid: (returns, rows) float64 sorted by bucket, NaN
+    # returns as 0 / 0.0; starts: first row of every occupied bucket.
+    labels = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, values.shape[1])))
+    missing = [np.flatnonzero(row == 0) for row in valid]
+    _ROWS.update(values=values, valid=valid, starts=starts, labels=labels, missing=missing,
+                 sizes=np.bincount(labels, minlength=len(starts)).astype(np.float64),
+                 has_missing=any(len(rows) for rows in missing))
+
+def _bucket_means(sums, counts):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / counts
+
+def _bootstrap_task(lo, hi, resamples, seed):
+    # Resampled means of bucket rows [lo, hi): (resamples, returns).
+    values, valid = _ROWS["values"][:, lo:hi], _ROWS["valid"][:, lo:hi]
+    rng = np.random.default_rng(seed)
+    n = hi - lo
+    batch = max(1, BATCH_ELEMENTS // n)
+    means = []
+    for done in range(0, resamples, batch):
+        b = min(batch, resamples - done)
+        draws = rng.integers(0, n, (b, n))
+        draws += (np.arange(b) * n)[:, None]
+        counts = np.bincount(draws.ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        sums = counts @ values.T
+        totals = counts @ valid.T if _ROWS["has_missing"] else np.float64(n)
+        means.append(_bucket_means(sums, totals))
+    return np.concatenate(means)
+
+def _permutation_task(permutations, seed):
+    # Bucket means under `permutations` random relabelings:
+    # (permutations, returns, buckets). Row j takes the bucket of position
+    # shuffle[j]; missing returns only need their own rows relabeled.
+    values, labels, sizes = _ROWS["values"], _ROWS["labels"], _ROWS["sizes"]
+    rng = np.random.default_rng(seed)
+    means = np.empty((permutations, len(values), len(sizes)))
+    for p in range(permutations):
+        relabeled = np.take(labels, rng.permutation(len(labels)))
+        for i, row in enumerate(values):
+            sums = np.bincount(relabeled, weights=row, minlength=len(sizes))
+            counts = sizes - np.bincount(relabeled[_ROWS["missing"][i]], minlength=len(sizes))
+            means[p, i] = _bucket_means(sums, counts)
+    return means
+
+def _run(tasks, workers, values, valid, starts):
+    # tasks: (function, args) pairs; results in order.
+    if workers <= 1:
+        _init(values, valid, starts)
+        return [function(*args) for function, args in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(values, valid, starts)) as pool:
+        futures = [pool.submit(function, *args) for function, args in tasks]
+        return [future.result() for future in futures]
+
+def significance(df, axes, returns=RETURN_COLUMNS, resamples=RESAMPLES, confidence=CONFIDENCE, seed=SEED,
+                 workers=BOOTSTRAP_WORKERS):
+    # One row per bucket, in summarize() order: ci_low_/ci_high_ (the
+    # bootstrap interval of the mean) and p_ (permutation p-value) per
+    # return. NaN for buckets too small to resample.
+    columns = {c: df[c].to_numpy() for c in set(returns).union(*(axis.inputs for axis in axes))}
+    size = int(np.prod([axis.buckets for axis in axes]))
+    flat = bucket_index(columns, axes)
+    order = np.argsort(flat, kind="stable")
+    flat = flat[order]
+    inside = int(np.searchsorted(flat, size))
+    order, flat = order[:inside], flat[:inside]
+    result = pd.DataFrame(np.nan, index=range(size),
+                          columns=[f"{stat}_{c}" for c in returns for stat in ("ci_low", "ci_high", "p")])
+    if not inside:
+        return result
+
+    raw = np.stack([np.asarray(columns[c], dtype=np.float64)[order] for c in returns])
+    valid = (~np.isnan(raw)).astype(np.float64)
+    values = np.nan_to_num(raw)
+    bounds = np.searchsorted(flat, np.arange(size + 1))
+    occupied = np.flatnonzero(np.diff(bounds) > 0)
+    resampled = occupied[np.diff(bounds)[occupied] > 1]  # a single row has no spread to bootstrap
+    starts = bounds[occupied]
+
+    children = np.random.SeedSequence(seed).spawn(len(resampled) + -(-resamples // PERMUTATIONS_PER_TASK))
+    tasks = [(_bootstrap_task, (bounds[k], bounds[k + 1], resamples, children[i])) for i, k in enumerate(resampled)]
+    for i, done in enumerate(range(0, resamples, PERMUTATIONS_PER_TASK)):
+        tasks.append((_permutation_task, (min(PERMUTATIONS_PER_TASK, resamples - done), children[len(resampled) + i])))
+    results = _run(tasks, workers, values, valid, starts)
+
+    tail = (1 - confidence) / 2 * 100
+    ci = np.full((2, len(returns), size), np.nan)
+    for k, means in zip(resampled, results[:len(resampled)]):
+        with np.errstate(all="ignore"):
+            ci[:, :, k] = np.nanpercentile(means, [tail, 100 - tail], axis=0)
+
+    overall = _bucket_means(values.sum(axis=1), valid.sum(axis=1))[:, None]
+    observed = np.abs(_bucket_means(np.add.reduceat(values, starts, axis=1), np.add.reduceat(valid, starts, axis=1))
+                      - overall)
+    extreme = np.zeros((len(returns), len(occupied)))
+    trials = np.zeros((len(returns), len(occupied)))
+    for means in results[len(resampled):]:
+        deviation = np.abs(means - overall)
+        extreme += (deviation >= observed * (1 - 1e-12)).sum(axis=0)  # ties within rounding count as extreme
+        trials += (~np.isnan(deviation)).sum(axis=0)
+    p = np.full((len(returns), size), np.nan)
+    p[:, occupied] = (1 + extreme) / (1 + trials)
+
+    for i, column in enumerate(returns):
+        result[f"ci_low_{column}"] = ci[0, i]
+        result[f"ci_high_{column}"] = ci[1, i]
+        result[f"p_{column}"] = p[i]
+    return result
+
+def analyze_significance(df, axes, returns=RETURN_COLUMNS, **options):
+    # analyze() with the significance columns appended; options go to
+    # significance().
+    return pd.concat([analyze(df, axes, returns), significance(df, axes, returns, **options)], axis=1)
+
+# === Main ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    if len(args) > 1 and args[0] in ANALYSES:
+        axes = ANALYSES[args[0]]
+        tickers = [a.upper() for a in args[1:]]
+        start_time = time.time()
+        print(f"🔍 Bootstrapping {args[0]} buckets for: {', '.join(tickers)}\n")
+        df = load_labeled_data(tickers, axes, "local" if "--local" in sys.argv else "db")
+        print(analyze_significance(df, axes, resamples=int(flags.get("resamples", RESAMPLES)),
+                                   confidence=float(flags.get("confidence", CONFIDENCE)),
+                                   seed=int(flags.get("seed", SEED))))
+        print(f"\n⏱️ {len(df)} rows in {time.time() - start_time:.2f} seconds")
+    else:
+        print(f"❌ Please provide an analysis ({', '.join(ANALYSES)}) and a ticker symbol. "
+              "Example: python3 quant_bucket_significance.py rsi_macd GRRR [--resamples=1000] "
+              "[--confidence=0.95] [--seed=42] [--local]")
@@ -0,0 +1,218 @@
+import psycopg2
+from psycopg2.extras import Json
+import numpy as np
+import io
+import os
+import sys
+import time
+
+from quant_bucket_analysis import ANALYSES, RETURN_COLUMNS, Axis, bucket_stats, load_labeled_data, stats_from_rows, summarize
+from quant_day_fingerprints import (changed_days, ensure_fingerprint_table, forget_built, load_built, save_built,
+                                    source_fingerprints)
+from quant_feature_writer import table_columns
+from quant_label_forward_returns import LABEL_TABLE
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+ANALYSIS_TABLE = "quant_bucket_analyses"
+STATS_TABLE = "quant_bucket_stats"
+STATS = ("n", "sum", "sumsq")
+
+# === Bucket Statistics Store ===
+# Per (analysis, ticker, day, bucket tuple): the rows in the bucket and, per
+# return horizon, the count, sum and sum of squares of the returns. These
+# add up across tickers and days, so any ticker set and date range is
+# answered by summing stored rows instead of rescanning the labeled table.
+# A refresh recomputes each ticker's days whose labeled rows changed since
+# they were aggregated (see quant_day_fingerprints): new days, trailing
+# horizons filled in, and older days rewritten by backfills, feature
+# --update runs or relabeling.
+
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+def consumer(analysis):
+    # The analysis's name among the day-fingerprint consumers.
+    return f"bucket_stats:{analysis}"
+
+def stat_column(stat, column):
+    return f"{stat}_{column}"
+
+def definition(axes, returns):
+    return {"axes": [[axis.name, axis.expression, axis.breaks] for axis in axes], "returns": list(returns)}
+
+def ensure_tables(cur, returns=RETURN_COLUMNS):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ANALYSIS_TABLE} (
+            analysis TEXT PRIMARY KEY,
+            definition JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            analysis TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            day DATE NOT NULL,
+            bucket SMALLINT[] NOT NULL,
+            rows BIGINT NOT NULL,
+            PRIMARY KEY (analysis, ticker, day, bucket)
+        );
+    """)
+    ensure_fingerprint_table(cur)
+    # ADD COLUMN IF NOT EXISTS locks the table even when the column is there,
+    # so only return columns missing from the catalog are altered.
+    existing = table_columns(cur, STATS_TABLE)
+    for column in returns:
+        for stat in STATS:
+            if stat_column(stat, column) not in existing:
+                pg_type = "BIGINT" if stat == "n" else "DOUBLE PRECISION"
+                cur.execute(f"ALTER TABLE {STATS_TABLE} ADD COLUMN IF NOT EXISTS {stat_column(stat, column)} {pg_type};")
+
+def register_analysis(conn, analysis, axes, returns=RETURN_COLUMNS, rebuild=False):
+    # Stored statistics are only valid for the axes and returns they were
+    # built with; a changed definition needs rebuild=True, which drops them.
+    cur = conn.cursor()
+    ensure_tables(cur, returns)
+    wanted = definition(axes, returns)
+    cur.execute(f"SELECT definition FROM {ANALYSIS_TABLE} WHERE analysis = %s;", (analysis,))
+    row = cur.fetchone()
+    if row is not None and row[0] != wanted:
+        if not rebuild:
+            raise ValueError(f"Analysis {analysis} changed since its statistics were built; refresh with rebuild")
+        cur.execute(f"DELETE FROM {STATS_TABLE} WHERE analysis = %s;", (analysis,))
+        forget_built(cur, consumer(analysis))
+    if row is None or row[0] != wanted:
+        cur.execute(f"""
+            INSERT INTO {ANALYSIS_TABLE} (analysis, definition) VALUES (%s, %s)
+            ON CONFLICT (analysis) DO UPDATE SET definition = EXCLUDED.definition, created_at = now();
+        """, (analysis, Json(wanted)))
+    cur.close()
+
+def load_definition(cur, analysis):
+    cur.execute(f"SELECT definition FROM {ANALYSIS_TABLE} WHERE analysis = %s;", (analysis,))
+    row = cur.fetchone()
+    if row is None:
+        raise KeyError(f"Unknown analysis: {analysis}")
+    return [Axis(*axis) for axis in row[0]["axes"]], row[0]["returns"]
+
+def _stats_to_copy_buffer(analysis, symbol, stats, days, shape, returns):
+    # COPY text rows for the non-empty (day, bucket) cells of bucket_stats
+    # computed with one group per day.
+    cells = np.flatnonzero(stats["rows"])
+    size = int(np.prod(shape))
+    day_text = np.datetime_as_string(days[cells // size], unit="D")
+    positions = np.unravel_index(cells % size, shape)
+    bucket_text = np.array(["{"] * len(cells), dtype=object)
+    for k, position in enumerate(positions):
+        bucket_text = bucket_text + ("," if k else "") + position.astype(str).astype(object)
+    text_cols = [np.full(len(cells), analysis), np.full(len(cells), symbol), day_text, bucket_text + "}",
+                 stats["rows"][cells].astype(str)]
+    for i in range(len(returns)):
+        text_cols += [stats["count"][i][cells].astype(str), stats["sum"][i][cells].astype(str),
+                      stats["sumsq"][i][cells].astype(str)]
+    buf = io.StringIO()
+    if len(cells):
+        buf.write("\n".join(map("\t".join, zip(*(c.tolist() for c in text_cols)))))
+        buf.write("\n")
+    buf.seek(0)
+    return buf, len(cells)
+
+def refresh_ticker(conn, analysis, symbol, axes, returns=RETURN_COLUMNS, source="db"):
+    # Returns (labeled rows read, stats rows written). The fingerprints are
+    # taken before the rows are read, so a day rewritten in between is
+    # recomputed again next time rather than missed. The caller owns the
+    # transaction.
+    cur = conn.cursor()
+    current = source_fingerprints(cur, LABEL_TABLE, symbol, source)
+    changed = changed_days(load_built(cur, consumer(analysis), symbol), current)
+    if not changed:
+        cur.close()
+        return 0, 0
+
+    df = load_labeled_data([symbol], axes, source, returns, days=changed)
+    cur.execute(f"DELETE FROM {STATS_TABLE} WHERE analysis = %s AND ticker = %s AND day = ANY(%s::date[]);",
+                (analysis, symbol, changed))
+    written = 0
+    if not df.empty:
+        stamps = df["datetime"].to_numpy().astype("datetime64[D]")
+        days, day_ids = np.unique(stamps, return_inverse=True)
+        columns = {c: df[c].to_numpy() for c in df.columns if c != "datetime"}
+        stats = bucket_stats(columns, axes, returns, groups=day_ids, group_count=len(days))
+        buf, written = _stats_to_copy_buffer(analysis, symbol, stats, days, [axis.buckets for axis in axes], returns)
+        names = ["analysis", "ticker", "day", "bucket", "rows"]
+        names += [stat_column(stat, column) for column in returns for stat in STATS]
+        cur.copy_expert(f"COPY {STATS_TABLE} ({', '.join(names)}) FROM STDIN", buf)
+    save_built(cur, consumer(analysis), symbol, current, changed)
+    cur.close()
+    return len(df), written
+
+def refresh(analysis, tickers=None, source="db", rebuild=False):
+    start_time = time.time()
+    axes = ANALYSES[analysis]
+    conn = connect()
+    register_analysis(conn, analysis, axes, rebuild=rebuild)
+    conn.commit()
+    if not tickers:
+        from quant_local_mirror import list_tickers
+        tickers = list_tickers(conn, LABEL_TABLE)
+    print(f"🔍 Refreshing {analysis} bucket statistics for {len(tickers)} tickers")
+
+    read = written = 0
+    for i, symbol in enumerate(tickers, 1):
+        rows, cells = refresh_ticker(conn, analysis, symbol, axes, source=source)
+        conn.commit()
+        read += rows
+        written += cells
+        if i % 25 == 0 or i == len(tickers):
+            print(f"📈 {i}/{len(tickers)} tickers, {read} labeled rows read, {written} stats rows written")
+    conn.close()
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")
+    return read, written
+
+# === Query ===
+def query_stats(conn, analysis, tickers=None, start=None, end=None):
+    # The summarize() table for the analysis over any tickers (all if None)
+    # and days in [start, end], merged from the stored statistics.
+    cur = conn.cursor()
+    axes, returns = load_definition(cur, analysis)
+    sums = [f"sum({stat_column(stat, column)})::float8" for column in returns for stat in STATS]
+    conditions = ["analysis = %s"]
+    params = [analysis]
+    for condition, value in (("ticker = ANY(%s)", tickers), ("day >= %s", start), ("day <= %s", end)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(list(value) if condition.startswith("ticker") else value)
+    cur.execute(f"""
+        SELECT bucket, sum(rows)::float8, {", ".join(sums)}
+        FROM {STATS_TABLE}
+        WHERE {" AND ".join(conditions)}
+        GROUP BY bucket;
+    """, params)
+    rows = cur.fetchall()
+    cur.close()
+
+    stats = stats_from_rows([row[0] for row in rows], [row[1:] for row in rows], axes, returns)
+    return summarize(stats, axes, returns)
+
+# === Main ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    if len(args) > 1 and args[0] == "refresh" and args[1] in ANALYSES:
+        refresh(args[1], [a.upper() for a in args[2:]] or None, "local" if "--local" in sys.argv else "db",
+                "--rebuild" in sys.argv)
+    elif len(args) > 1 and args[0] == "query":
+        start_time = time.time()
+        conn = connect()
+        print(query_stats(conn, args[1], [a.upper() for a in args[2:]] or None, flags.get("start"), flags.get("end")))
+        conn.close()
+        print(f"\n⏱️ Done in {time.time() - start_time:.3f} seconds")
+    else:
+        print(f"❌ Please provide a command and an analysis ({', '.join(ANALYSES)}). "
+              "Example: python3 quant_bucket_store.py refresh rsi [GRRR ...] [--rebuild] [--local] "
+              "or python3 quant_bucket_store.py query rsi [GRRR ...] [--start=2025-01-01] [--end=2025-06-30]")
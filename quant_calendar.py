@@ -0,0 +1,123 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# === NYSE Session Calendar ===
+# Rule-based holidays and early closes for the regular session, in exchange
+# time (FMP 1min candle timestamps are naive America/New_York).
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# One-off closures (national days of mourning) that no rule produces.
+SPECIAL_CLOSURES = {
+    date(2018, 12, 5): "George H. W. Bush Day of Mourning",
+    date(2025, 1, 9): "Jimmy Carter Day of Mourning",
+}
+
+def _nth_weekday(year, month, weekday, n):
+    day = date(year, month, 1)
+    day += timedelta(days=(weekday - day.weekday()) % 7)
+    return day + timedelta(weeks=n - 1)
+
+def _last_weekday(year, month, weekday):
+    day = date(year, month + 1, 1) - timedelta(days=1)
+    return day - timedelta(days=(day.weekday() - weekday) % 7)
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(day):
+    # Saturday holidays move to Friday, Sunday holidays to Monday.
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    holidays = {}
+
+    # New Year's Day is not moved back into the previous year when it is a Saturday.
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    holidays[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    holidays[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[_easter(year) - timedelta(days=2)] = "Good Friday"
+    holidays[_last_weekday(year, 5, 0)] = "Memorial Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    holidays[_observed(date(year, 7, 4))] = "Independence Day"
+    holidays[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    holidays[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    holidays[_observed(date(year, 12, 25))] = "Christmas Day"
+
+    for day, name in SPECIAL_CLOSURES.items():
+        if day.year == year:
+            holidays[day] = name
+    return holidays
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    candidates = [
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    ]
+    holidays = nyse_holidays(year)
+    return frozenset(day for day in candidates if day.weekday() < 5 and day not in holidays)
+
+# === Sessions ===
+def is_session(day):
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+def session_open_close(day):
+    # (open, close) as naive exchange-time datetimes, or None on non-session days.
+    if not is_session(day):
+        return None
+    close = EARLY_CLOSE if day in nyse_early_closes(day.year) else SESSION_CLOSE
+    return datetime.combine(day, SESSION_OPEN), datetime.combine(day, close)
+
+def session_minutes(day):
+    bounds = session_open_close(day)
+    if bounds is None:
+        return 0
+    return int((bounds[1] - bounds[0]).total_seconds() // 60)
+
+def expected_candles(day):
+    # One 1min bar per session minute; thinly traded tickers will have fewer.
+    return session_minutes(day)
+
+def sessions_between(from_day, to_day):
+    days = []
+    day = from_day
+    while day <= to_day:
+        if is_session(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def next_session(day):
+    day += timedelta(days=1)
+    while not is_session(day):
+        day += timedelta(days=1)
+    return day
+
+def exchange_today():
+    return datetime.now(EXCHANGE_TZ).date()
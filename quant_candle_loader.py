@@ -0,0 +1,117 @@
+import io
+
+from quant_columnar import columns_to_copy_binary, columns_to_copy_buffer
+from quant_coverage import ensure_coverage_table, record_coverage, record_staged_coverage
+
+# === Bulk Candle Loader ===
+# Streams candles into a temp staging table with COPY and merges them into
+# quant_candles_intraday with a single INSERT ... SELECT, so a whole FMP
+# response costs a few round trips instead of one per candle. The coverage
+# index is refreshed in the same transaction.
+
+STAGING_TABLE = "quant_candles_staging"
+
+def _ensure_staging(cur):
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            ticker TEXT,
+            datetime TIMESTAMP,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            volume DOUBLE PRECISION
+        ) ON COMMIT DELETE ROWS;
+    """)
+    cur.execute(f"TRUNCATE {STAGING_TABLE};")
+
+def _copy_value(value):
+    return "\\N" if value is None else str(value)
+
+def candles_to_copy_buffer(symbol, candles, buf=None):
+    buf = buf if buf is not None else io.StringIO()
+    staged = 0
+
+    for row in candles:
+        try:
+            line = "\t".join((
+                symbol, row["date"],
+                _copy_value(row["open"]), _copy_value(row["high"]),
+                _copy_value(row["low"]), _copy_value(row["close"]),
+                _copy_value(row["volume"])
+            ))
+        except (KeyError, TypeError) as e:
+            print(f"⚠️ Skipping row due to error: {e}")
+            continue
+        buf.write(line + "\n")
+        staged += 1
+
+    buf.seek(0)
+    return buf, staged
+
+def _stage_and_merge(cur, buf, binary=False):
+    _ensure_staging(cur)
+    cur.copy_expert(
+        f"COPY {STAGING_TABLE} (ticker, datetime, open, high, low, close, volume) FROM STDIN"
+        + (" WITH (FORMAT binary)" if binary else ""),
+        buf
+    )
+    cur.execute(f"""
+        INSERT INTO quant_candles_intraday (ticker, datetime, open, high, low, close, volume)
+        SELECT ticker, datetime, open, high, low, close, volume
+        FROM {STAGING_TABLE}
+        ON CONFLICT (ticker, datetime) DO NOTHING;
+    """)
+    return cur.rowcount
+
+def _load_buffer(conn, symbol, buf, staged, covered_range, binary=False):
+    if staged == 0 and covered_range is None:
+        return 0, 0
+
+    cur = conn.cursor()
+    ensure_coverage_table(cur)
+    inserted = _stage_and_merge(cur, buf, binary) if staged else 0
+
+    if covered_range is None:
+        record_staged_coverage(cur, STAGING_TABLE)
+    else:
+        record_coverage(cur, symbol, *covered_range)
+
+    cur.close()
+    return inserted, staged - inserted
+
+def bulk_load_candles(conn, symbol, candles, covered_range=None):
+    # Returns (inserted, duplicates). The caller owns the transaction.
+    # covered_range=(from_day, to_day) is the range that was requested from FMP;
+    # without it, coverage is recorded for the days present in the batch.
+    buf, staged = candles_to_copy_buffer(symbol, candles)
+    return _load_buffer(conn, symbol, buf, staged, covered_range)
+
+def bulk_load_columns(conn, symbol, cols, covered_range=None):
+    # bulk_load_candles for the typed arrays from quant_columnar, sent as
+    # binary COPY unless a price or volume is missing.
+    staged = len(cols["datetime"])
+    buf = columns_to_copy_binary(symbol, cols) if staged else None
+    if buf is None:
+        buf, staged = columns_to_copy_buffer(symbol, cols)
+        return _load_buffer(conn, symbol, buf, staged, covered_range)
+    return _load_buffer(conn, symbol, buf, staged, covered_range, binary=True)
+
+def bulk_load_candle_batches(conn, batches):
+    # Same as bulk_load_candles for many tickers at once ({symbol: candles}):
+    # one COPY and one merge for the whole batch.
+    buf = io.StringIO()
+    staged = 0
+    for symbol, candles in batches.items():
+        buf.seek(0, io.SEEK_END)
+        staged += candles_to_copy_buffer(symbol, candles, buf)[1]
+    if staged == 0:
+        return 0, 0
+
+    buf.seek(0)
+    cur = conn.cursor()
+    ensure_coverage_table(cur)
+    inserted = _stage_and_merge(cur, buf)
+    record_staged_coverage(cur, STAGING_TABLE)
+    cur.close()
+    return inserted, staged - inserted
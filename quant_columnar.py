@@ -0,0 +1,114 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# === Columnar Candle Ingestion ===
+# Turns a raw historical-chart response body straight into typed arrays:
+# one regex scan per field and a single vectorised conversion per column,
+# with no per-candle dicts and no per-row strptime.
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+_DATE_RE = re.compile(rb'"date"\s*:\s*"([^"]*)"')
+_FIELD_RES = {
+    field: re.compile(rb'"' + field.encode() + rb'"\s*:\s*([^,}\s]+)')
+    for field in PRICE_FIELDS + ("volume",)
+}
+
+def empty_columns():
+    cols = {"datetime": np.empty(0, dtype="datetime64[s]")}
+    cols.update({field: np.empty(0, dtype=np.float64) for field in PRICE_FIELDS})
+    cols["volume"] = np.empty(0, dtype=np.float64)
+    return cols
+
+def _numbers(raw, field, n):
+    values = _FIELD_RES[field].findall(raw)
+    if len(values) != n:
+        raise ValueError(f"Expected {n} '{field}' values, found {len(values)}")
+    arr = np.array(values)
+    arr[arr == b"null"] = b"nan"
+    return arr.astype(np.float64)
+
+def parse_chart_response(raw):
+    # Returns {"datetime", "open", "high", "low", "close", "volume"} arrays
+    # sorted oldest first (FMP returns newest first).
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if not raw.lstrip().startswith(b"["):
+        raise ValueError(f"Unexpected response format: {raw[:200]!r}")
+    dates = _DATE_RE.findall(raw)
+    n = len(dates)
+    if n == 0:
+        return empty_columns()
+
+    cols = {"datetime": np.array(dates).astype("datetime64[s]")}
+    for field in PRICE_FIELDS:
+        cols[field] = _numbers(raw, field, n)
+    # Volume stays float64 so a null volume is kept as NaN and stored as NULL.
+    cols["volume"] = np.rint(_numbers(raw, "volume", n))
+
+    order = np.argsort(cols["datetime"], kind="stable")
+    if not np.all(order[:-1] < order[1:]):
+        cols = {name: arr[order] for name, arr in cols.items()}
+    return cols
+
+def columns_to_frame(cols):
+    # The frame layout compute_indicators expects.
+    return pd.DataFrame({
+        "datetime": cols["datetime"],
+        "open": cols["open"], "high": cols["high"], "low": cols["low"],
+        "close": cols["close"], "volume": cols["volume"],
+    })
+
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+PGCOPY_TRAILER = b"\xff\xff"
+
+def columns_to_copy_binary(symbol, cols):
+    # COPY ... (FORMAT binary) rows for (ticker TEXT, datetime TIMESTAMP, open,
+    # high, low, close, volume DOUBLE PRECISION), packed with one structured
+    # array instead of formatting numbers as text. Returns None when a price
+    # or the volume holds NaN (NULL needs a variable-length field), so callers
+    # fall back to text.
+    n = len(cols["datetime"])
+    values = [cols[field] for field in PRICE_FIELDS + ("volume",)]
+    if any(np.isnan(arr).any() for arr in values):
+        return None
+
+    ticker = symbol.encode()
+    fields = [("nfields", ">i2"), ("ticker_len", ">i4"), ("ticker", f"S{len(ticker)}"),
+              ("datetime_len", ">i4"), ("datetime", ">i8")]
+    for field in PRICE_FIELDS + ("volume",):
+        fields += [(f"{field}_len", ">i4"), (field, ">f8")]
+    rows = np.empty(n, dtype=np.dtype(fields))
+
+    rows["nfields"] = 7
+    rows["ticker_len"] = len(ticker)
+    rows["ticker"] = ticker
+    rows["datetime_len"] = 8
+    rows["datetime"] = (cols["datetime"].astype("datetime64[us]") - PG_EPOCH).astype(np.int64)
+    for field, arr in zip(PRICE_FIELDS + ("volume",), values):
+        rows[f"{field}_len"] = 8
+        rows[field] = arr
+
+    return io.BytesIO(PGCOPY_HEADER + rows.tobytes() + PGCOPY_TRAILER)
+
+def _text(arr):
+    text = arr.astype(str)
+    if arr.dtype.kind == "f":
+        text[np.isnan(arr)] = "\\N"
+    return text
+
+def columns_to_copy_buffer(symbol, cols, buf=None):
+    # COPY text rows built column-wise; returns (buffer, rows staged).
+    buf = buf if buf is not None else io.StringIO()
+    n = len(cols["datetime"])
+    if n:
+        text_cols = [np.full(n, symbol), np.datetime_as_string(cols["datetime"], unit="s")]
+        text_cols += [_text(cols[field]) for field in PRICE_FIELDS + ("volume",)]
+        buf.write("\n".join(map("\t".join, zip(*text_cols))))
+        buf.write("\n")
+    buf.seek(0)
+    return buf, n
@@ -0,0 +1,122 @@
+from datetime import datetime, time, timedelta
+
+from quant_calendar import (EXCHANGE_TZ, exchange_today, expected_candles, next_session, session_minutes,
+                            session_open_close, sessions_between)
+
+# === Coverage Index ===
+# One row per (ticker, day) that has been fetched from FMP, with the number of
+# candles stored for that day. The backfill planner reads it to request only
+# the sessions that are missing or were fetched before the day was over.
+
+COVERAGE_TABLE = "quant_candles_coverage"
+
+# FMP returns ~3 full sessions of 1min bars per request; sizing by minutes
+# lets early-close days pack a little tighter.
+MAX_CHUNK_MINUTES = 3 * 390
+
+# A closed session stored with fewer than this share of its expected bars
+# (thin tickers skip quiet minutes, so not 1.0) is fetched again. A session
+# day with no bars at all is always fetched again.
+MIN_FILL = 0.5
+
+def ensure_coverage_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {COVERAGE_TABLE} (
+            ticker TEXT NOT NULL,
+            day DATE NOT NULL,
+            candle_count INTEGER NOT NULL,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (ticker, day)
+        );
+    """)
+
+def record_coverage(cur, symbol, from_day, to_day):
+    # Recounts stored candles for every day in [from_day, to_day], including
+    # days FMP returned nothing for, so they are not requested again.
+    cur.execute(f"""
+        INSERT INTO {COVERAGE_TABLE} (ticker, day, candle_count, fetched_at)
+        SELECT %s, d::date, (
+            SELECT count(*) FROM quant_candles_intraday c
+            WHERE c.ticker = %s AND c.datetime >= d AND c.datetime < d + interval '1 day'
+        ), now()
+        FROM generate_series(%s::date, %s::date, interval '1 day') d
+        ON CONFLICT (ticker, day) DO UPDATE
+        SET candle_count = EXCLUDED.candle_count, fetched_at = EXCLUDED.fetched_at;
+    """, (symbol, symbol, from_day, to_day))
+
+def record_staged_coverage(cur, staging_table):
+    # Recounts stored candles for every (ticker, day) present in a staging table.
+    cur.execute(f"""
+        INSERT INTO {COVERAGE_TABLE} (ticker, day, candle_count, fetched_at)
+        SELECT s.ticker, s.day, (
+            SELECT count(*) FROM quant_candles_intraday c
+            WHERE c.ticker = s.ticker AND c.datetime >= s.day AND c.datetime < s.day + 1
+        ), now()
+        FROM (SELECT DISTINCT ticker, datetime::date AS day FROM {staging_table}) s
+        ON CONFLICT (ticker, day) DO UPDATE
+        SET candle_count = EXCLUDED.candle_count, fetched_at = EXCLUDED.fetched_at;
+    """)
+
+def bars_final_at(day):
+    # When a day's bars stop changing: its session close (early closes
+    # included), or midnight after a non-session day, in exchange time.
+    bounds = session_open_close(day)
+    end = bounds[1] if bounds else datetime.combine(day + timedelta(days=1), time())
+    return end.replace(tzinfo=EXCHANGE_TZ)
+
+def load_coverage(conn, symbol, from_day, to_day):
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass(%s);", (COVERAGE_TABLE,))
+    if cur.fetchone()[0] is None:
+        cur.close()
+        return {}
+
+    cur.execute(f"""
+        SELECT day, candle_count, fetched_at
+        FROM {COVERAGE_TABLE}
+        WHERE ticker = %s AND day BETWEEN %s AND %s;
+    """, (symbol, from_day, to_day))
+    coverage = {day: (count, fetched_at >= bars_final_at(day)) for day, count, fetched_at in cur.fetchall()}
+    cur.close()
+    return coverage
+
+# === Planner ===
+def needs_fetch(day, entry, today, min_fill=MIN_FILL):
+    if entry is None or day >= today:
+        return True
+    count, final = entry
+    # Bars for a day are final once its session has closed (exchange time);
+    # anything fetched earlier is partial.
+    if not final or count == 0:
+        return True
+    return count < min_fill * expected_candles(day)
+
+def missing_sessions(coverage, from_day, to_day, today, min_fill=MIN_FILL):
+    return [day for day in sessions_between(from_day, to_day)
+            if needs_fetch(day, coverage.get(day), today, min_fill)]
+
+def merge_into_chunks(days, max_minutes=MAX_CHUNK_MINUTES):
+    # Groups missing sessions into (from, to) ranges. A range only spans
+    # consecutive sessions (weekends and holidays in between are free) and
+    # holds at most max_minutes of regular-session trading.
+    chunks = []
+    run = []
+    minutes = 0
+    for day in days:
+        day_minutes = session_minutes(day)
+        if run and (day != next_session(run[-1]) or minutes + day_minutes > max_minutes):
+            chunks.append((run[0], run[-1]))
+            run = []
+            minutes = 0
+        run.append(day)
+        minutes += day_minutes
+    if run:
+        chunks.append((run[0], run[-1]))
+    return chunks
+
+def plan_missing_chunks(conn, symbol, from_day, to_day, max_minutes=MAX_CHUNK_MINUTES, min_fill=MIN_FILL):
+    today = exchange_today()
+    coverage = load_coverage(conn, symbol, from_day, to_day)
+    days = missing_sessions(coverage, from_day, to_day, today, min_fill)
+    return [(start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+            for start, end in merge_into_chunks(days, max_minutes)]
@@ -0,0 +1,76 @@
+from datetime import date
+
+# === Day Fingerprints ===
+# Postgres stamps every row version it inserts or updates with the id of the
+# writing transaction (xmin, kept through VACUUM FREEZE). Per (ticker, day),
+# the row count plus a sum of hashed xmins therefore changes whenever one of
+# that day's rows is inserted, rewritten (e.g. an ON CONFLICT DO UPDATE) or
+# deleted. Anything derived from a table by day (the local mirror, bucket
+# statistics, quantile sketches) compares fingerprints with those it was
+# built from and rebuilds only the days that differ. The tables need no
+# updated_at column or trigger, and the comparison is one server-side pass
+# over the ticker's rows that returns a row per day.
+
+FINGERPRINT_TABLE = "quant_day_fingerprints"
+
+def day_fingerprints(cur, table, ticker):
+    # {day: fingerprint} over every day the ticker has rows in the table.
+    cur.execute(f"""
+        SELECT datetime::date, count(*), sum(hashtext(xmin::text)::bigint)
+        FROM {table}
+        WHERE ticker = %s
+        GROUP BY 1;
+    """, (ticker,))
+    return {day: f"{count}:{total}" for day, count, total in cur.fetchall()}
+
+def changed_days(built, current):
+    # Days whose fingerprint differs, including days that appeared or were
+    # deleted since the build; sorted.
+    return sorted(day for day in set(built) | set(current) if built.get(day) != current.get(day))
+
+def source_fingerprints(cur, table, ticker, source="db"):
+    # The fingerprints of the rows a build reads: from Postgres, or for the
+    # local mirror those it last synced (it may lag the database).
+    if source == "local":
+        from quant_local_mirror import load_fingerprints
+        return {date.fromisoformat(day): fingerprint
+                for day, fingerprint in load_fingerprints(table).get(ticker, {}).items()}
+    return day_fingerprints(cur, table, ticker)
+
+# === Stored Fingerprints ===
+# For derived data kept in Postgres: the fingerprints each consumer (e.g.
+# "bucket_stats:rsi_macd") last built a ticker's days from.
+
+def ensure_fingerprint_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (
+            consumer TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            day DATE NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (consumer, ticker, day)
+        );
+    """)
+
+def load_built(cur, consumer, ticker):
+    # {day: fingerprint} the consumer last built the ticker's days from.
+    cur.execute(f"SELECT day, fingerprint FROM {FINGERPRINT_TABLE} WHERE consumer = %s AND ticker = %s;",
+                (consumer, ticker))
+    return dict(cur.fetchall())
+
+def forget_built(cur, consumer):
+    # Drops a consumer's fingerprints, so its next build covers every day.
+    cur.execute(f"DELETE FROM {FINGERPRINT_TABLE} WHERE consumer = %s;", (consumer,))
+
+def save_built(cur, consumer, ticker, current, days):
+    # Records the current fingerprints of `days` (dropping days that no
+    # longer exist), in the caller's transaction.
+    if not days:
+        return
+    cur.execute(f"DELETE FROM {FINGERPRINT_TABLE} WHERE consumer = %s AND ticker = %s AND day = ANY(%s::date[]);",
+                (consumer, ticker, list(days)))
+    kept = [day for day in days if day in current]
+    cur.execute(f"""
+        INSERT INTO {FINGERPRINT_TABLE} (consumer, ticker, day, fingerprint)
+        SELECT %s, %s, day, fingerprint FROM unnest(%s::date[], %s::text[]) AS f(day, fingerprint);
+    """, (consumer, ticker, kept, [current[day] for day in kept]))
@@ -1,12 +1,18 @@
 import pandas as pd
-import numpy as np
 import psycopg2
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
 from datetime import datetime
+import io
 import os
 import time
 import sys
-from ta.momentum import RSIIndicator
-from ta.trend import MACD, SMAIndicator
+
+from quant_feature_writer import bulk_write_features, ensure_feature_columns
+from quant_feature_registry import (FEATURES, INPUT_COLUMNS, SESSION_FEATURES, compute_features, default_features,
+                                    warmup_bars)
+from quant_resample_bars import TIMEFRAMES, candle_table, feature_table
 
 # === Config ===
 DB_NAME = os.environ.get("DB_NAME")
@@ -15,85 +21,249 @@ DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 
+# Universe mode: one worker process per core; in-flight tickers bound memory
+# (each holds its candle history and features in memory while it runs).
+FEATURE_WORKERS = int(os.environ.get("FEATURE_WORKERS", os.cpu_count() or 1))
+FEATURE_MAX_IN_FLIGHT = int(os.environ.get("FEATURE_MAX_IN_FLIGHT", "0")) or FEATURE_WORKERS
+CANDLE_CHUNK_ROWS = 100000  # rows per fetch when streaming candles from the database
+LOCAL_WARMUP_RETRIES = 3    # widenings of a --local --since read before it reads everything
+
 # === Helpers ===
 def connect():
     conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
     return psycopg2.connect(conn_string)
 
-def compute_indicators(df):
-    df = df.copy()
-    df["rsi"] = RSIIndicator(close=df["close"], window=14).rsi()
-    df["vwap"] = (df["volume"] * (df["high"] + df["low"] + df["close"]) / 3).cumsum() / df["volume"].cumsum()
-
-    macd = MACD(close=df["close"])
-    df["macd"] = macd.macd()
-    df["macd_signal"] = macd.macd_signal()
+def compute_indicators(df, features=None, sessions=False):
+    # features: names from the feature registry (the default set if None).
+    # sessions=True adds the session features (session-anchored VWAP, volume
+    # and opening range).
+    names = list(features or default_features())
+    if sessions:
+        names += [name for name in SESSION_FEATURES if name not in names]
+    values = compute_features({c: df[c].to_numpy() for c in INPUT_COLUMNS if c in df.columns}, names)
+    # A new frame over the existing column arrays instead of df.copy() plus
+    # one insert per feature, which copies every column more than once.
+    columns = {c: df[c].to_numpy() for c in df.columns}
+    columns.update(values)
 
-    df["ma_50"] = SMAIndicator(close=df["close"], window=50).sma_indicator()
-    df["ma_200"] = SMAIndicator(close=df["close"], window=200).sma_indicator()
+    return pd.DataFrame(columns, index=df.index, copy=False)
 
-    df["is_uptrend"] = df["close"] > df["ma_50"]
-    df["rel_volume"] = df["volume"] / df["volume"].rolling(window=20).mean()
+def read_candles(conn, query, params):
+    # Streams the query through a server-side cursor, CANDLE_CHUNK_ROWS at a
+    # time, converting each chunk to typed columns as it arrives. Peak memory
+    # is one chunk of row tuples plus the columns, where read_sql held the
+    # whole result as Python tuples first (several times the final frame).
+    cur = conn.cursor(name="candles")
+    cur.itersize = CANDLE_CHUNK_ROWS
+    cur.execute(query, params)
+    chunks = []
+    while True:
+        rows = cur.fetchmany(CANDLE_CHUNK_ROWS)
+        if not rows:
+            break
+        chunks.append(pd.DataFrame.from_records(rows, columns=list(INPUT_COLUMNS), coerce_float=True))
+    cur.close()
+    if not chunks:
+        return pd.DataFrame(columns=list(INPUT_COLUMNS))
+    return pd.concat(chunks, ignore_index=True)
 
-    return df
-
-def store_features(symbol, df):
+def store_features(symbol, df, timeframe="1min", mode="nothing"):
+    # Writes the registry features present in df. mode="update" overwrites
+    # stored rows whose values changed.
+    table = feature_table(timeframe)
+    columns = [name for name in df.columns if name in FEATURES and FEATURES[name].stored]
+    optional = {name: FEATURES[name].dtype for name in columns if not FEATURES[name].default}
     conn = connect()
+    # Missing optional columns are added and committed on their own, so the
+    # write below never holds the table's ACCESS EXCLUSIVE lock.
     cur = conn.cursor()
-    inserted = 0
-
-    for _, row in df.iterrows():
-        try:
-            cur.execute("""
-                INSERT INTO quant_features_intraday (
-                    ticker, datetime, rsi, vwap, macd, macd_signal, ma_50, ma_200, rel_volume, is_uptrend
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (ticker, datetime) DO NOTHING;
-            """, (
-                symbol, row["datetime"], row["rsi"], row["vwap"], row["macd"],
-                row["macd_signal"], row["ma_50"], row["ma_200"],
-                float(row["rel_volume"]) if not pd.isna(row["rel_volume"]) else None,
-                bool(row["is_uptrend"]) if not pd.isna(row["is_uptrend"]) else None
-            ))
-            inserted += 1
-            if inserted % 1000 == 0:
-                print(f"✅ Inserted {inserted} rows so far...")
-        except Exception as e:
-            print(f"⚠️ Skipped row: {e}")
-
+    ensure_feature_columns(cur, table, optional)
+    conn.commit()
+    cur.close()
+    written, unchanged = bulk_write_features(conn, symbol, df, table, mode, columns)
     conn.commit()
     conn.close()
-    print(f"✅ Inserted {inserted} rows into quant_features_intraday")
+    print(f"✅ {'Wrote' if mode == 'update' else 'Inserted'} {written} rows into {table} ({unchanged} unchanged)")
+    return written
 
 # === Main ===
-def engineer_features(symbol):
-    start_time = time.time()
-    print(f"🔍 Engineering features for: {symbol}")
+def _load_local_candles(symbol, since=None, warmup=0):
+    # The mirror scan only reads from a start time, so `warmup` bars are
+    # turned into calendar days: full 390-bar sessions, five per week, plus
+    # a week for holidays. For a sparse ticker, with fewer bars per session,
+    # the window is widened fourfold until it holds the warm-up, and the last
+    # attempt reads the whole history.
+    from quant_local_mirror import read_local
+    columns = ["datetime", "open", "high", "low", "close", "volume"]
+    if since is None:
+        return read_local("quant_candles_intraday", symbol, columns=columns)
+    since = pd.Timestamp(since)
+    days = (warmup // 390 + 1) * 7 // 5 + 7
+    for attempt in range(LOCAL_WARMUP_RETRIES + 1):
+        start = since - pd.Timedelta(days=days) if attempt < LOCAL_WARMUP_RETRIES else None
+        df = read_local("quant_candles_intraday", symbol, columns=columns, start=start)
+        before = df["datetime"].searchsorted(since, side="right")
+        if before >= warmup:
+            break
+        days *= 4
+    return df.iloc[max(0, before - warmup):].reset_index(drop=True)
+
+def load_candles(symbol, source="db", timeframe="1min", since=None, warmup=0):
+    # since: only candles strictly after this timestamp, plus `warmup` bars
+    # at or before it
+    if source == "local" and timeframe != "1min":
+        raise ValueError("The local mirror only holds 1min candles")
+    if source == "local":
+        return _load_local_candles(symbol, since, warmup)
 
     conn = connect()
-    query = """
+    table = candle_table(timeframe)
+    query = f"""
         SELECT datetime, open, high, low, close, volume
-        FROM quant_candles_intraday
-        WHERE ticker = %s
+        FROM {table}
+        WHERE ticker = %s AND datetime > COALESCE((
+            SELECT datetime FROM {table}
+            WHERE ticker = %s AND datetime <= %s
+            ORDER BY datetime DESC OFFSET %s LIMIT 1
+        ), '-infinity')
         ORDER BY datetime ASC
     """
-    df = pd.read_sql_query(query, conn, params=(symbol,))
+    df = read_candles(conn, query, (symbol, symbol, since or datetime(1900, 1, 1), warmup))
     conn.close()
+    return df
+
+def engineer_features(symbol, source="db", timeframe="1min", incremental=False, mode="nothing",
+                      features=None, since=None, sessions=False):
+    # features: a subset of the registry to compute and write. since: only
+    # write rows after this timestamp, loading just the warm-up the requested
+    # features need before it. sessions: the session_vwap, per-session
+    # volume and opening-range columns.
+    if incremental:
+        if features or sessions:
+            raise ValueError("The stateful incremental path always computes the default feature set")
+        from quant_incremental_features import engineer_features_incremental
+        return engineer_features_incremental(symbol, source, timeframe, mode)
+
+    start_time = time.time()
+    names = list(features or default_features())
+    if sessions:
+        names += [name for name in SESSION_FEATURES if name not in names]
+    print(f"🔍 Engineering {timeframe} features for: {symbol} ({', '.join(names)})")
+
+    warmup = warmup_bars(names) if since is not None else 0
+    if warmup is None:
+        print("⚠️ A cumulative feature needs the whole history; loading every candle")
+        df = load_candles(symbol, source, timeframe)
+    else:
+        df = load_candles(symbol, source, timeframe, since, warmup)
 
     print(f"📊 Retrieved {len(df)} rows")
     if df.empty:
         print("⚠️ No data found.")
-        return
+        return 0
 
-    df = compute_indicators(df)
-    store_features(symbol, df)
+    df = compute_indicators(df, names)
+    if since is not None:
+        df = df[df["datetime"] > pd.Timestamp(since)]
+    inserted = store_features(symbol, df, timeframe, mode)
 
     elapsed = time.time() - start_time
     print(f"⏱️ Done in {elapsed:.2f} seconds")
+    return inserted
+
+# === Universe ===
+def _engineer_worker(symbol, options):
+    # Runs in a pool process; the per-ticker log is dropped and the parent
+    # reports progress instead.
+    start_time = time.time()
+    try:
+        with redirect_stdout(io.StringIO()):
+            rows = engineer_features(symbol, **options)
+        return symbol, rows or 0, time.time() - start_time, None
+    except Exception as e:
+        return symbol, 0, time.time() - start_time, str(e)
+
+def engineer_universe(tickers, workers=FEATURE_WORKERS, max_in_flight=FEATURE_MAX_IN_FLIGHT, **options):
+    # options are passed through to engineer_features for every ticker.
+    start_time = time.time()
+    max_in_flight = max(max_in_flight, 1)
+    print(f"🔍 Engineering {options.get('timeframe', '1min')} features for {len(tickers)} tickers: "
+          f"{workers} workers, {max_in_flight} tickers in flight")
+
+    timings = {}
+    errors = {}
+    rows = 0
+    in_flight = {}  # future -> (symbol, submit time)
+
+    def collect(finished):
+        # Returns True if the pool broke: a worker process died (e.g. killed
+        # by the OOM killer), which fails every ticker the pool had in flight.
+        nonlocal rows
+        broken = False
+        for future in finished:
+            symbol, submitted = in_flight.pop(future)
+            try:
+                symbol, inserted, elapsed, error = future.result()
+            except BrokenProcessPool as e:
+                broken = True
+                inserted, elapsed, error = 0, time.time() - submitted, f"worker process died ({e})"
+            timings[symbol] = elapsed
+            rows += inserted
+            if error:
+                errors[symbol] = error
+                print(f"❌ {symbol} failed after {elapsed:.2f}s: {error}")
+            done = len(timings)
+            if done % 25 == 0 or done == len(tickers):
+                print(f"📈 {done}/{len(tickers)} tickers done, {rows} feature rows, "
+                      f"{time.time() - start_time:.0f}s elapsed")
+        return broken
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for symbol in tickers:
+            if len(in_flight) >= max_in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                if collect(finished):
+                    # The rest of the broken pool's tickers fail right away;
+                    # the remaining ones go to a fresh pool.
+                    collect(wait(in_flight).done)
+                    pool.shutdown()
+                    print("⚠️ A worker process died; restarting the pool for the remaining tickers")
+                    pool = ProcessPoolExecutor(max_workers=workers)
+            in_flight[pool.submit(_engineer_worker, symbol, options)] = (symbol, time.time())
+        collect(wait(in_flight).done)
+    finally:
+        pool.shutdown()
+
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:5]
+    print(f"✅ {len(timings) - len(errors)} tickers done, {len(errors)} failed, {rows} feature rows")
+    if errors:
+        print(f"❌ Failed tickers: {' '.join(sorted(errors))}")
+    if slowest:
+        print(f"⏱️ Per ticker: mean {sum(timings.values()) / len(timings):.2f}s; slowest: "
+              + ", ".join(f"{symbol} {elapsed:.2f}s" for symbol, elapsed in slowest))
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")
+    return {"rows": rows, "timings": timings, "errors": errors}
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        ticker = sys.argv[1].upper()
-        engineer_features(ticker)
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    tickers = [a.upper() for a in sys.argv[1:] if not a.startswith("--") and a not in TIMEFRAMES]
+    options = {
+        "source": "local" if "--local" in sys.argv else "db",
+        "timeframe": next((a for a in sys.argv[1:] if a in TIMEFRAMES), "1min"),
+        "incremental": "--incremental" in sys.argv,
+        "mode": "update" if "--update" in sys.argv else "nothing",
+        "features": flags["features"].split(",") if "features" in flags else None,
+        "since": flags.get("since"),
+        # Feature rows written by --sessions runs before session VWAP had a
+        # column of its own hold it in vwap; --sessions --update rewrites them
+        # with the cumulative vwap and fills session_vwap.
+        "sessions": "--sessions" in sys.argv,
+    }
+    if len(tickers) > 1:
+        engineer_universe(tickers, **options)
+    elif tickers:
+        engineer_features(tickers[0], **options)
     else:
-        print("❌ Please provide a ticker symbol. Example: python3 quant_engineer_features.py GRRR")
+        print("❌ Please provide a ticker symbol. Example: python3 quant_engineer_features.py GRRR "
+              "[5min|15min|60min|daily] [--incremental] [--update] [--features=rsi,macd] [--since=2025-01-02] [--sessions]")
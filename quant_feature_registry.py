@@ -0,0 +1,185 @@
+import os
+
+import numpy as np
+
+from quant_calendar import SESSION_OPEN
+from quant_indicator_kernels import (cumulative_vwap, ema, mask_warmup, opening_range, segment_starts,
+                                     session_vwap, segmented_cumsum, sma, wilder_rsi)
+
+# === Feature Registry ===
+# Every feature declares its inputs (candle columns or other features), the
+# bars of input it needs before its first value, and its dtype. A request for
+# some features computes just those plus their dependencies, in dependency
+# order, and each shared intermediate (e.g. the close EMAs behind MACD) once.
+
+CANDLE_COLUMNS = ("open", "high", "low", "close", "volume")
+INPUT_COLUMNS = ("datetime",) + CANDLE_COLUMNS
+
+# Recursive features (EMAs, Wilder RSI) depend on all earlier bars. For warm-up
+# purposes they count as settled after this many times their window, when the
+# weight left on older bars is below ~1e-4.
+EMA_SETTLE = int(os.environ.get("FEATURE_EMA_SETTLE", "10"))
+
+OPENING_RANGE_MINUTES = int(os.environ.get("OPENING_RANGE_MINUTES", "30"))
+SESSION_BARS = 390  # the longest regular session in 1min bars; covers any session's start
+
+FEATURES = {}
+
+class Feature:
+    def __init__(self, name, inputs, compute, lookback=1, dtype="float64", recursive=False,
+                 stored=True, default=True):
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute
+        self.lookback = lookback      # bars of input per value; None = the whole history
+        self.dtype = dtype
+        self.recursive = recursive
+        self.stored = stored          # False for intermediates with no feature-table column
+        self.default = default        # part of the feature set computed when none is named
+
+def register(name, inputs, lookback=1, dtype="float64", recursive=False, stored=True, default=True):
+    def decorator(compute):
+        FEATURES[name] = Feature(name, inputs, compute, lookback, dtype, recursive, stored, default)
+        return compute
+    return decorator
+
+# === Features ===
+@register("rsi", ["close"], lookback=14, recursive=True)
+def _rsi(close):
+    return wilder_rsi(close, 14)
+
+@register("vwap", ["high", "low", "close", "volume"], lookback=None)
+def _vwap(high, low, close, volume):
+    return cumulative_vwap(high, low, close, volume)
+
+@register("ema_12", ["close"], lookback=12, recursive=True, stored=False)
+def _ema_12(close):
+    return mask_warmup(ema(close, 2.0 / 13), close, 12)
+
+@register("ema_26", ["close"], lookback=26, recursive=True, stored=False)
+def _ema_26(close):
+    return mask_warmup(ema(close, 2.0 / 27), close, 26)
+
+@register("macd", ["ema_12", "ema_26"])
+def _macd(ema_12, ema_26):
+    return ema_12 - ema_26
+
+@register("macd_signal", ["macd"], lookback=9, recursive=True)
+def _macd_signal(macd):
+    return mask_warmup(ema(macd, 2.0 / 10), macd, 9)
+
+@register("ma_50", ["close"], lookback=50)
+def _ma_50(close):
+    return sma(close, 50)
+
+@register("ma_200", ["close"], lookback=200)
+def _ma_200(close):
+    return sma(close, 200)
+
+@register("is_uptrend", ["close", "ma_50"], dtype="bool")
+def _is_uptrend(close, ma_50):
+    return close > ma_50
+
+@register("volume_mean_20", ["volume"], lookback=20, stored=False)
+def _volume_mean_20(volume):
+    return sma(volume, 20)
+
+@register("rel_volume", ["volume", "volume_mean_20"])
+def _rel_volume(volume, volume_mean_20):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return volume / volume_mean_20
+
+# === Session Features ===
+@register("session_day", ["datetime"], stored=False)
+def _session_day(stamps):
+    return stamps.astype("datetime64[D]").astype(np.int64)
+
+@register("minutes_from_open", ["datetime"], stored=False)
+def _minutes_from_open(stamps):
+    opens = stamps.astype("datetime64[D]") + np.timedelta64(SESSION_OPEN.hour * 60 + SESSION_OPEN.minute, "m")
+    return (stamps.astype("datetime64[m]") - opens).astype(np.float64)
+
+# Session-anchored VWAP has a column of its own: vwap is always cumulative
+# over the whole history, whatever else a run computes.
+@register("session_vwap", ["high", "low", "close", "volume", "session_day"], lookback=SESSION_BARS, default=False)
+def _session_vwap(high, low, close, volume, session_day):
+    return session_vwap(high, low, close, volume, segment_starts(session_day))
+
+@register("session_volume", ["volume", "session_day"], lookback=SESSION_BARS, default=False)
+def _session_volume(volume, session_day):
+    return segmented_cumsum(volume, segment_starts(session_day))
+
+@register("opening_range", ["high", "low", "minutes_from_open", "session_day"], lookback=SESSION_BARS, stored=False)
+def _opening_range(high, low, minutes_from_open, session_day):
+    # Rows: range high, range low.
+    return np.stack(opening_range(high, low, minutes_from_open, segment_starts(session_day), OPENING_RANGE_MINUTES))
+
+@register("or_high", ["opening_range"], default=False)
+def _or_high(bounds):
+    return bounds[0]
+
+@register("or_low", ["opening_range"], default=False)
+def _or_low(bounds):
+    return bounds[1]
+
+SESSION_FEATURES = ["session_vwap", "session_volume", "or_high", "or_low"]
+
+# === Engine ===
+def default_features():
+    return [name for name, feature in FEATURES.items() if feature.stored and feature.default]
+
+def resolve(names):
+    # The requested features and their dependencies, dependencies first.
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in INPUT_COLUMNS or name in order:
+            return
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature: {name}")
+        if name in visiting:
+            raise ValueError(f"Feature dependency cycle through {name}")
+        visiting.add(name)
+        for dependency in FEATURES[name].inputs:
+            visit(dependency)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+def warmup_bars(names, settle=EMA_SETTLE):
+    # Bars of history before the first row to emit that make the requested
+    # features match a full recompute; None when one of them is cumulative.
+    memo = {}
+
+    def warmup(name):
+        if name in INPUT_COLUMNS:
+            return 0
+        if name not in memo:
+            feature = FEATURES[name]
+            upstream = [warmup(dependency) for dependency in feature.inputs]
+            if feature.lookback is None or None in upstream:
+                memo[name] = None
+            else:
+                own = (feature.lookback - 1) * (settle if feature.recursive else 1)
+                memo[name] = own + max(upstream, default=0)
+        return memo[name]
+
+    bars = [warmup(name) for name in resolve(names)]
+    return None if None in bars else max(bars, default=0)
+
+def compute_features(columns, names=None):
+    # columns: {"datetime": datetime64 array, candle column: array}. Returns
+    # {name: array} for the requested features (the default set if none).
+    names = list(names or default_features())
+    values = {name: np.asarray(columns[name], dtype=np.float64) for name in CANDLE_COLUMNS if name in columns}
+    if "datetime" in columns:
+        values["datetime"] = np.asarray(columns["datetime"]).astype("datetime64[s]")
+    for name in resolve(names):
+        feature = FEATURES[name]
+        result = feature.compute(*(values[dependency] for dependency in feature.inputs))
+        values[name] = np.asarray(result, dtype=feature.dtype)
+    return {name: values[name] for name in names}
@@ -0,0 +1,174 @@
+import io
+
+import numpy as np
+
+from quant_columnar import PG_EPOCH, PGCOPY_HEADER, PGCOPY_TRAILER
+
+# === Bulk Feature Writer ===
+# Streams feature frames into a temp staging table with binary COPY (text
+# COPY for column types it doesn't encode), one batch of rows at a time.
+# The rows are then merged into the feature table with a single
+# INSERT ... SELECT. mode="nothing" keeps rows that already exist.
+# mode="update" overwrites them when any feature value changed.
+# mode="fill" keeps stored values but fills in those still NULL, e.g. a
+# label whose future bars hadn't arrived when the row was first written.
+# Any other (ticker, datetime)-keyed table of float/bool columns works the
+# same way given its own staging table (e.g. the labeled returns).
+
+STAGING_TABLE = "quant_features_staging"
+FEATURE_COLUMNS = ["rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200", "rel_volume", "is_uptrend"]
+BATCH_ROWS = 100000
+MODES = ("nothing", "update", "fill")
+
+PG_TYPES = {"float64": "DOUBLE PRECISION", "bool": "BOOLEAN"}
+
+def table_columns(cur, table):
+    # Column names of a table (temp tables included), from the catalog
+    # without locking the table itself.
+    cur.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;
+    """, (table,))
+    return {row[0] for row in cur.fetchall()}
+
+def ensure_feature_columns(cur, table, column_types):
+    # Adds columns for optional features ({name: dtype}) the table lacks and
+    # returns their names. ADD COLUMN IF NOT EXISTS takes an ACCESS EXCLUSIVE
+    # lock even when the column is there, held to the end of the caller's
+    # transaction, so only columns missing from the catalog are altered.
+    existing = table_columns(cur, table)
+    missing = [column for column in column_types if column not in existing]
+    for column in missing:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {PG_TYPES[column_types[column]]};")
+    return missing
+
+def _ensure_staging(cur, table, column_types, staging=STAGING_TABLE):
+    # Staged rows take the feature table's column types; every timeframe's
+    # feature table shares them.
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS;
+    """)
+    ensure_feature_columns(cur, staging, column_types)
+    cur.execute(f"TRUNCATE {staging};")
+
+def _text_column(values):
+    if values.dtype == np.bool_:
+        return np.where(values, "t", "f")
+    if values.dtype.kind == "f":
+        text = values.astype(str)
+        text[np.isnan(values)] = "\\N"
+        return text
+    # Object columns (e.g. a nullable boolean): None/NaN become NULL.
+    missing = np.array([v is None or v != v for v in values], dtype=bool)
+    return np.where(missing, "\\N", np.where(values.astype(bool), "t", "f"))
+
+def features_to_copy_buffer(symbol, df, columns=FEATURE_COLUMNS, buf=None):
+    # COPY text rows for (ticker, datetime, *columns), built column-wise.
+    buf = buf if buf is not None else io.StringIO()
+    n = len(df)
+    if n:
+        stamps = df["datetime"].to_numpy().astype("datetime64[us]")
+        text_cols = [np.full(n, symbol), np.datetime_as_string(stamps, unit="s")]
+        text_cols += [_text_column(df[column].to_numpy()) for column in columns]
+        buf.write("\n".join(map("\t".join, zip(*(c.tolist() for c in text_cols)))))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def _binary_column(values):
+    # (big-endian values, field width, NULL mask), or None for a dtype the
+    # binary path doesn't encode.
+    if values.dtype == np.bool_:
+        return values.astype(np.uint8), 1, np.zeros(len(values), dtype=bool)
+    if values.dtype.kind == "f":
+        return values.astype(">f8"), 8, np.isnan(values)
+    if values.dtype == object:
+        missing = np.array([v is None or v != v for v in values], dtype=bool)
+        if all(isinstance(v, (bool, np.bool_)) for v in values[~missing]):
+            return np.where(missing, False, values).astype(np.uint8), 1, missing
+    return None
+
+def features_to_copy_binary(symbol, df, columns=FEATURE_COLUMNS):
+    # COPY ... (FORMAT binary) rows for (ticker, datetime, *columns), or None
+    # when a column has a type only the text format handles. A NULL field is
+    # a bare -1 length, so rows differ in size: each field's offset is the
+    # running total of the sizes before it, and every column is scattered
+    # into one byte buffer at those offsets.
+    encoded = [_binary_column(df[column].to_numpy()) for column in columns]
+    if any(e is None for e in encoded):
+        return None
+    n = len(df)
+    ticker = symbol.encode()
+    prefix = np.empty(n, dtype=np.dtype([("nfields", ">i2"), ("ticker_len", ">i4"), ("ticker", f"S{len(ticker)}"),
+                                         ("datetime_len", ">i4"), ("datetime", ">i8")]))
+    prefix["nfields"] = 2 + len(columns)
+    prefix["ticker_len"] = len(ticker)
+    prefix["ticker"] = ticker
+    prefix["datetime_len"] = 8
+    prefix["datetime"] = (df["datetime"].to_numpy().astype("datetime64[us]") - PG_EPOCH).astype(np.int64)
+
+    sizes = np.full(n, prefix.itemsize + 4 * len(columns), dtype=np.int64)
+    for _, width, missing in encoded:
+        sizes += np.where(missing, 0, width)
+    offsets = np.cumsum(sizes) - sizes
+    buf = np.empty(int(sizes.sum()), dtype=np.uint8)
+    buf[offsets[:, None] + np.arange(prefix.itemsize)] = prefix.view(np.uint8).reshape(n, -1)
+
+    offsets += prefix.itemsize
+    for values, width, missing in encoded:
+        lengths = np.where(missing, -1, width).astype(">i4")
+        buf[offsets[:, None] + np.arange(4)] = lengths.view(np.uint8).reshape(n, 4)
+        offsets += 4
+        present = ~missing
+        buf[offsets[present, None] + np.arange(width)] = values[present].view(np.uint8).reshape(-1, width)
+        offsets += np.where(missing, 0, width)
+    return io.BytesIO(PGCOPY_HEADER + buf.tobytes() + PGCOPY_TRAILER)
+
+def _merge_sql(table, columns, mode, staging=STAGING_TABLE):
+    names = ", ".join(columns)
+    if mode == "nothing":
+        conflict = "DO NOTHING"
+    elif mode == "fill":
+        conflict = ("DO UPDATE SET " + ", ".join(f"{c} = COALESCE({table}.{c}, EXCLUDED.{c})" for c in columns)
+                    + " WHERE " + " OR ".join(f"({table}.{c} IS NULL AND EXCLUDED.{c} IS NOT NULL)" for c in columns))
+    else:
+        conflict = ("DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+                    + f" WHERE ({', '.join(f'{table}.{c}' for c in columns)})"
+                    + f" IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in columns)})")
+    return f"""
+        INSERT INTO {table} (ticker, datetime, {names})
+        SELECT ticker, datetime, {names} FROM {staging}
+        ON CONFLICT (ticker, datetime) {conflict};
+    """
+
+def bulk_write_features(conn, symbol, df, table="quant_features_intraday", mode="nothing",
+                        columns=FEATURE_COLUMNS, batch_rows=BATCH_ROWS, column_types=None,
+                        staging=STAGING_TABLE):
+    # Returns (written, unchanged): rows inserted or updated, and rows that
+    # were skipped. Skipped rows already existed, were identical in "update"
+    # mode, or had nothing to fill in "fill" mode. column_types
+    # ({name: dtype}) lists columns to add to the table first if missing.
+    # A missing one locks the table until the caller commits. staging is
+    # the temp table the rows pass through. The caller owns the transaction.
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if df.empty:
+        return 0, 0
+
+    cur = conn.cursor()
+    if column_types:
+        ensure_feature_columns(cur, table, column_types)
+    _ensure_staging(cur, table, column_types or {}, staging)
+    copy_sql = f"COPY {staging} (ticker, datetime, {', '.join(columns)}) FROM STDIN"
+    for lo in range(0, len(df), batch_rows):
+        batch = df.iloc[lo:lo + batch_rows]
+        buf = features_to_copy_binary(symbol, batch, columns)
+        if buf is None:
+            cur.copy_expert(copy_sql, features_to_copy_buffer(symbol, batch, columns))
+        else:
+            cur.copy_expert(copy_sql + " WITH (FORMAT binary)", buf)
+    cur.execute(_merge_sql(table, columns, mode, staging))
+    written = cur.rowcount
+    cur.close()
+    return written, len(df) - written
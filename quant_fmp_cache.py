@@ -0,0 +1,133 @@
+from datetime import datetime, date
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from quant_calendar import exchange_today
+
+# === FMP Response Cache ===
+# Content-addressed, gzip-compressed response bodies (JSON) on local disk, keyed by
+# (endpoint, symbol, from, to). Ranges that ended before today (exchange time)
+# never change and never expire; ranges that include today or have no end
+# date expire after FMP_CACHE_TTL seconds. An empty answer ([]) may be a
+# transient FMP gap rather than a closed market, so it expires after
+# FMP_CACHE_EMPTY_TTL seconds whatever the range. Total size is bounded by
+# FMP_CACHE_MAX_BYTES with least-recently-used eviction.
+
+FMP_CACHE_DIR = os.environ.get("FMP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fmp_cache"))
+FMP_CACHE_MAX_BYTES = int(os.environ.get("FMP_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+FMP_CACHE_TTL = int(os.environ.get("FMP_CACHE_TTL", "60"))
+FMP_CACHE_EMPTY_TTL = int(os.environ.get("FMP_CACHE_EMPTY_TTL", "3600"))
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def is_closed_range(to_date, today=None):
+    today = today or exchange_today()
+    to_date = _as_date(to_date)
+    return to_date is not None and to_date < today
+
+def is_empty_payload(payload):
+    return payload.strip() in (b"[]", b"[ ]")
+
+class ResponseCache:
+    def __init__(self, directory=FMP_CACHE_DIR, max_bytes=FMP_CACHE_MAX_BYTES, ttl=FMP_CACHE_TTL,
+                 empty_ttl=FMP_CACHE_EMPTY_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, endpoint, symbol, from_date, to_date):
+        key = json.dumps([endpoint, symbol, str(from_date), str(to_date)])
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_atime
+
+    def get(self, endpoint, symbol, from_date, to_date):
+        path = self._path(endpoint, symbol, from_date, to_date)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if not is_closed_range(to_date) and time.time() - st.st_mtime > self.ttl:
+            self.misses += 1
+            return None
+
+        try:
+            with gzip.open(path, "rb") as f:
+                payload = f.read()
+        except (OSError, EOFError):
+            self.misses += 1
+            return None
+        if is_empty_payload(payload) and time.time() - st.st_mtime > self.empty_ttl:
+            self.misses += 1
+            return None
+
+        # atime tracks last use for LRU; mtime stays the write time for the TTL.
+        os.utime(path, (time.time(), st.st_mtime))
+        self.hits += 1
+        return payload
+
+    def put(self, endpoint, symbol, from_date, to_date, payload):
+        path = self._path(endpoint, symbol, from_date, to_date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            f.write(payload)
+
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.total_bytes += os.path.getsize(path) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under 90% of budget.
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_cache():
+    # Shared process-wide cache; FMP_CACHE_DIR="" disables caching.
+    global _default_cache
+    if not FMP_CACHE_DIR:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
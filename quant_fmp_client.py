@@ -0,0 +1,81 @@
+import requests
+from requests.adapters import HTTPAdapter
+import json
+import threading
+import time
+
+# === FMP HTTP Client ===
+# Shared by the candle fetchers: one pooled session, one token-bucket limiter
+# sized to the FMP plan, and retries with backoff on 429 / 5xx responses.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, requests_per_minute, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, int(self.rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_bytes(session, limiter, url, params, max_retries=5, backoff=1.0, timeout=30):
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            res = session.get(url, params=params, timeout=timeout)
+        except requests.exceptions.ConnectionError:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            continue
+
+        if res.status_code in RETRY_STATUSES and attempt < max_retries:
+            retry_after = res.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff * 2 ** attempt
+            print(f"⏳ {res.status_code} from FMP, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        res.raise_for_status()
+        return res.content
+
+def get_json(session, limiter, url, params, **kwargs):
+    return json.loads(get_bytes(session, limiter, url, params, **kwargs))
+
+def get_cached_bytes(session, limiter, url, params, cache=None, **kwargs):
+    # Historical-chart responses are cached by (endpoint, symbol, from, to);
+    # the API key is deliberately not part of the key. Only JSON arrays are
+    # cached, never error payloads.
+    key = (url, params.get("symbol"), params.get("from"), params.get("to"))
+    if cache is not None:
+        payload = cache.get(*key)
+        if payload is not None:
+            return payload
+
+    payload = get_bytes(session, limiter, url, params, **kwargs)
+    if cache is not None and payload.lstrip().startswith(b"["):
+        cache.put(*key, payload)
+    return payload
+
+def get_cached_json(session, limiter, url, params, cache=None, **kwargs):
+    return json.loads(get_cached_bytes(session, limiter, url, params, cache=cache, **kwargs))
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+from psycopg2.extras import Json
+import sys
+import time
+
+from quant_indicator_kernels import ema, sma
+from quant_engineer_features import connect, load_candles, store_features
+from quant_resample_bars import TIMEFRAMES
+
+# === Config ===
+STATE_TABLE = "quant_feature_state"
+
+# === Indicator State ===
+# Each indicator keeps just enough recurrence state to continue a series
+# where the previous run stopped, and produces the same values `ta` and
+# pandas give for the whole history (adjust=False EMAs, min_periods=window).
+
+class EMA:
+    def __init__(self, alpha, min_periods, value=None, count=0):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = value    # last smoothed value, None before the first observation
+        self.count = count    # observations seen so far
+
+    @classmethod
+    def span(cls, span, **state):
+        return cls(2.0 / (span + 1), span, **state)
+
+    def update(self, x):
+        # Starting the recurrence from the stored value continues it exactly.
+        out = ema(x, self.alpha, initial=self.value)
+        counts = self.count + np.cumsum(~np.isnan(x))
+        if len(x):
+            if not np.isnan(out[-1]):
+                self.value = float(out[-1])
+            self.count = int(counts[-1])
+        out[counts < self.min_periods] = np.nan
+        return out
+
+    def state(self):
+        return {"value": self.value, "count": self.count}
+
+class RollingMean:
+    def __init__(self, window, tail=()):
+        self.window = window
+        self.tail = np.asarray(tail, dtype=np.float64)  # the last window - 1 inputs
+
+    def update(self, x):
+        seeded = np.concatenate([self.tail, x])
+        out = sma(seeded, self.window)
+        self.tail = seeded[-(self.window - 1):]
+        return out[len(seeded) - len(x):]
+
+    def state(self):
+        return {"tail": self.tail.tolist()}
+
+class WilderRSI:
+    def __init__(self, window=14, prev_close=None, up=None, down=None):
+        self.window = window
+        self.prev_close = prev_close
+        self.up = EMA(1.0 / window, window, **(up or {}))
+        self.down = EMA(1.0 / window, window, **(down or {}))
+
+    def update(self, close):
+        prev = np.nan if self.prev_close is None else self.prev_close
+        diff = np.diff(close, prepend=prev)
+        avg_up = self.up.update(np.where(diff > 0, diff, 0.0))
+        avg_down = self.down.update(np.where(diff < 0, -diff, 0.0))
+        if len(close):
+            self.prev_close = float(close[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(avg_down == 0, 100, 100 - (100 / (1 + avg_up / avg_down)))
+
+    def state(self):
+        return {"prev_close": self.prev_close, "up": self.up.state(), "down": self.down.state()}
+
+class MACDState:
+    def __init__(self, fast=None, slow=None, signal=None):
+        self.fast = EMA.span(12, **(fast or {}))
+        self.slow = EMA.span(26, **(slow or {}))
+        self.signal = EMA.span(9, **(signal or {}))
+
+    def update(self, close):
+        macd = self.fast.update(close) - self.slow.update(close)
+        return macd, self.signal.update(macd)
+
+    def state(self):
+        return {"fast": self.fast.state(), "slow": self.slow.state(), "signal": self.signal.state()}
+
+class CumulativeVWAP:
+    def __init__(self, pv=0.0, volume=0.0):
+        self.pv = pv
+        self.volume = volume
+
+    def update(self, high, low, close, volume):
+        # A bar with a NaN price or volume is skipped, as in cumulative_vwap.
+        pv = volume * (high + low + close) / 3
+        missing = np.isnan(pv)
+        pv = self.pv + np.cumsum(np.where(missing, 0.0, pv))
+        cum_volume = self.volume + np.cumsum(np.where(missing, 0.0, volume))
+        if len(volume):
+            self.pv, self.volume = float(pv[-1]), float(cum_volume[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(missing, np.nan, pv / cum_volume)
+
+    def state(self):
+        return {"pv": self.pv, "volume": self.volume}
+
+class IncrementalFeatures:
+    # The compute_indicators feature set, continued batch by batch.
+    def __init__(self, state=None):
+        state = state or {}
+        self.rsi = WilderRSI(**state.get("rsi", {}))
+        self.macd = MACDState(**state.get("macd", {}))
+        self.ma_50 = RollingMean(50, **state.get("ma_50", {}))
+        self.ma_200 = RollingMean(200, **state.get("ma_200", {}))
+        self.volume_mean = RollingMean(20, **state.get("volume_mean", {}))
+        self.vwap = CumulativeVWAP(**state.get("vwap", {}))
+
+    def update(self, df):
+        close = df["close"].to_numpy(dtype=np.float64)
+        volume = df["volume"].to_numpy(dtype=np.float64)
+        out = pd.DataFrame({"datetime": df["datetime"].to_numpy()})
+        out["rsi"] = self.rsi.update(close)
+        out["vwap"] = self.vwap.update(df["high"].to_numpy(dtype=np.float64),
+                                       df["low"].to_numpy(dtype=np.float64), close, volume)
+        out["macd"], out["macd_signal"] = self.macd.update(close)
+        out["ma_50"] = self.ma_50.update(close)
+        out["ma_200"] = self.ma_200.update(close)
+        out["is_uptrend"] = close > out["ma_50"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["rel_volume"] = volume / self.volume_mean.update(volume)
+        return out
+
+    def state(self):
+        return {
+            "rsi": self.rsi.state(), "macd": self.macd.state(),
+            "ma_50": self.ma_50.state(), "ma_200": self.ma_200.state(),
+            "volume_mean": self.volume_mean.state(), "vwap": self.vwap.state(),
+        }
+
+# === State Table ===
+def ensure_state_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            ticker TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            last_datetime TIMESTAMP NOT NULL,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (ticker, timeframe)
+        );
+    """)
+
+def load_state(conn, symbol, timeframe="1min"):
+    cur = conn.cursor()
+    ensure_state_table(cur)
+    cur.execute(f"SELECT last_datetime, state FROM {STATE_TABLE} WHERE ticker = %s AND timeframe = %s;",
+                (symbol, timeframe))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return (None, None) if row is None else row
+
+def save_state(conn, symbol, timeframe, last_datetime, state):
+    cur = conn.cursor()
+    ensure_state_table(cur)
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (ticker, timeframe, last_datetime, state)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (ticker, timeframe) DO UPDATE
+        SET last_datetime = EXCLUDED.last_datetime, state = EXCLUDED.state, updated_at = now();
+    """, (symbol, timeframe, last_datetime, Json(state)))
+    conn.commit()
+    cur.close()
+
+# === Main ===
+def engineer_features_incremental(symbol, source="db", timeframe="1min", mode="nothing"):
+    # Continues each indicator from the stored state over the candles that
+    # arrived after the last processed bar. A ticker without state is
+    # processed from its first candle.
+    start_time = time.time()
+    print(f"🔍 Updating {timeframe} features for: {symbol}")
+
+    conn = connect()
+    last_datetime, state = load_state(conn, symbol, timeframe)
+    df = load_candles(symbol, source, timeframe, since=last_datetime)
+    print(f"📊 Retrieved {len(df)} new rows" + (f" after {last_datetime}" if last_datetime else ""))
+    if df.empty:
+        conn.close()
+        print("✅ Features are up to date.")
+        return 0
+
+    engine = IncrementalFeatures(state)
+    features = engine.update(df)
+    inserted = store_features(symbol, features, timeframe, mode)
+    # Saved after the rows are written: a crash in between only means the
+    # same rows are recomputed and skipped as duplicates next time.
+    save_state(conn, symbol, timeframe, pd.Timestamp(df["datetime"].iloc[-1]).to_pydatetime(), engine.state())
+    conn.close()
+
+    elapsed = time.time() - start_time
+    print(f"⏱️ Done in {elapsed:.2f} seconds")
+    return inserted
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        ticker = sys.argv[1].upper()
+        timeframe = next((a for a in sys.argv[2:] if a in TIMEFRAMES), "1min")
+        engineer_features_incremental(ticker, "local" if "--local" in sys.argv else "db", timeframe)
+    else:
+        print("❌ Please provide a ticker symbol. Example: python3 quant_incremental_features.py GRRR [5min|15min|60min|daily]")
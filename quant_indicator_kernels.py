@@ -0,0 +1,222 @@
+import numpy as np
+
+# === Indicator Kernels ===
+# NumPy versions of the indicators compute_indicators used to take from `ta`.
+# They work on contiguous float64 arrays, write into preallocated outputs and
+# reproduce ta's defaults: adjust=False EMAs, Wilder smoothing for RSI and
+# NaN until each window has min_periods observations.
+
+SMA_BLOCK = 1 << 16  # rows per cumulative-sum restart, bounds rounding drift
+EMA_MAX_BLOCK = 4096
+
+def _buffer(n, out):
+    return np.empty(n, dtype=np.float64) if out is None else out
+
+def sma(x, window, out=None):
+    # Window sums from a cumulative sum restarted every SMA_BLOCK rows, so
+    # the error stays at the size of one block rather than the whole series.
+    # A NaN input makes only the windows that contain it NaN, like
+    # rolling(window).mean().
+    n = len(x)
+    out = _buffer(n, out)
+    missing = np.isnan(x)
+    if missing.any():
+        x = np.where(missing, 0.0, x)
+    out[:min(n, window - 1)] = np.nan
+    for lo in range(window - 1, n, SMA_BLOCK):
+        hi = min(lo + SMA_BLOCK, n)
+        sums = np.cumsum(x[lo - window + 1:hi])
+        out[lo:hi] = sums[window - 1:]
+        out[lo + 1:hi] -= sums[:hi - lo - 1]
+        out[lo:hi] /= window
+    if missing.any() and n >= window:
+        seen = np.cumsum(missing)
+        seen[window:] -= seen[:n - window].copy()
+        out[window - 1:][seen[window - 1:] > 0] = np.nan
+    return out
+
+def ema(x, alpha, out=None, initial=None):
+    # y[t] = (1 - alpha) * y[t-1] + alpha * x[t], starting from `initial` or
+    # from the first non-NaN input. NaN inputs are handled like pandas
+    # ewm(adjust=False): the last value carries through the gap, and the
+    # first input after g NaNs is weighted against y decayed by d^(g+1).
+    n = len(x)
+    out = _buffer(n, out)
+    if initial is None:
+        valid = np.flatnonzero(~np.isnan(x))
+        if len(valid) == 0:
+            out[:] = np.nan
+            return out
+        first = valid[0]
+        out[:first] = np.nan
+        out[first] = y = x[first]
+        start = first + 1
+    else:
+        y, start = initial, 0
+
+    decay = 1.0 - alpha
+    gaps = np.flatnonzero(np.isnan(x[start:])) + start
+    if len(gaps) == 0:
+        _ema_run(x, alpha, out, start, n, y)
+        return out
+    # Each run of NaNs [gap_start, gap_end) ends a stretch of valid inputs;
+    # the recurrence resumes after it.
+    breaks = np.flatnonzero(np.diff(gaps) > 1)
+    lo = start
+    for gap_start, gap_end in zip(np.append(gaps[:1], gaps[breaks + 1]), np.append(gaps[breaks] + 1, gaps[-1] + 1)):
+        y = _ema_run(x, alpha, out, lo, gap_start, y)
+        out[gap_start:gap_end] = y
+        if gap_end == n:
+            return out
+        weight = decay ** (gap_end - gap_start + 1)
+        out[gap_end] = y = (weight * y + alpha * x[gap_end]) / (weight + alpha)
+        lo = gap_end + 1
+    _ema_run(x, alpha, out, lo, n, y)
+    return out
+
+def _ema_run(x, alpha, out, start, stop, y):
+    # The recurrence over x[start:stop], which holds no NaN, from y. Inside a
+    # block of k rows it unrolls to y[lo+i] = d^(i+1) * y[lo-1] + alpha * d^i
+    # * cumsum(x * d^-j), so the Python loop runs once per block instead of
+    # once per row. The block is sized so d^-k stays far from overflow.
+    # Returns the last value.
+    decay = 1.0 - alpha
+    block = EMA_MAX_BLOCK if decay >= 1.0 else max(1, min(EMA_MAX_BLOCK, int(600 / -np.log(decay))))
+    powers = decay ** np.arange(block + 1)  # d^0 .. d^block
+    inverse = decay ** -np.arange(block)    # d^0 .. d^-(block-1)
+    for lo in range(start, stop, block):
+        hi = min(lo + block, stop)
+        k = hi - lo
+        segment = out[lo:hi]
+        np.multiply(x[lo:hi], inverse[:k], out=segment)
+        np.cumsum(segment, out=segment)
+        segment *= alpha * powers[:k]
+        segment += powers[1:k + 1] * y
+        y = segment[-1]
+    return y
+
+def mask_warmup(values, x, min_periods, seen=0):
+    # NaN until min_periods non-NaN inputs (plus `seen` earlier ones) have
+    # arrived. Scans a growing prefix, since the warm-up is short.
+    need = min_periods - seen
+    if need <= 0:
+        return values
+    n = len(x)
+    stop = min(n, need)
+    while True:
+        valid = np.flatnonzero(~np.isnan(x[:stop]))
+        if len(valid) >= need:
+            values[:valid[need - 1]] = np.nan
+            return values
+        if stop == n:
+            values[:] = np.nan
+            return values
+        stop = min(n, stop * 4)
+
+def wilder_rsi(close, window=14, out=None):
+    n = len(close)
+    out = _buffer(n, out)
+    if n == 0:
+        return out
+    # ta counts the first bar as a zero move in both directions, and so
+    # the moves into and out of a NaN close (fmax drops the NaN).
+    diff = np.empty(n)
+    diff[0] = 0.0
+    np.subtract(close[1:], close[:-1], out=diff[1:])
+    gains = np.fmax(diff, 0.0)
+    losses = np.negative(diff, out=diff)
+    np.fmax(losses, 0.0, out=losses)
+
+    alpha = 1.0 / window
+    avg_up = mask_warmup(ema(gains, alpha), gains, window)
+    avg_down = mask_warmup(ema(losses, alpha), losses, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(avg_up, avg_down, out=out)
+        out += 1
+        np.divide(100, out, out=out)
+        np.subtract(100, out, out=out)
+    out[avg_down == 0] = 100
+    return out
+
+def _skip_missing(values, volume):
+    # Like pandas cumsum: a bar with a NaN price or volume adds nothing to
+    # the running sums and is NaN itself. Zeroes those bars in place and
+    # returns their mask and the volume to sum, or (None, volume).
+    missing = np.isnan(values)
+    if not missing.any():
+        return None, volume
+    values[missing] = 0.0
+    return missing, np.where(missing, 0.0, volume)
+
+def cumulative_vwap(high, low, close, volume, out=None):
+    out = _buffer(len(close), out)
+    np.add(high, low, out=out)
+    out += close
+    out *= volume
+    out /= 3
+    missing, volume = _skip_missing(out, volume)
+    np.cumsum(out, out=out)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out /= np.cumsum(volume)
+    if missing is not None:
+        out[missing] = np.nan
+    return out
+
+# === Session-Segmented Kernels ===
+# Per-session scans over the whole series at once. `starts` holds the index
+# of each session's first bar (see segment_starts); totals per session come
+# from ufunc.reduceat and are broadcast back with np.repeat.
+
+def segment_starts(keys):
+    # First index of each run of equal keys (e.g. the session day per bar).
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+
+def _lengths(starts, n):
+    return np.diff(np.append(starts, n))
+
+def segmented_cumsum(x, starts, out=None):
+    # Running sum that restarts at every segment start: each start subtracts
+    # the previous segment's total before one cumsum over the whole array,
+    # so rounding stays at the scale of a single segment's sum.
+    n = len(x)
+    out = _buffer(n, out)
+    if n == 0:
+        return out
+    totals = np.add.reduceat(x, starts)  # before out is written, which may alias x
+    if out is not x:
+        out[:] = x
+    out[starts[1:]] -= totals[:-1]
+    np.cumsum(out, out=out)
+    return out
+
+def session_vwap(high, low, close, volume, starts, out=None):
+    out = _buffer(len(close), out)
+    np.add(high, low, out=out)
+    out += close
+    out *= volume
+    out /= 3
+    missing, volume = _skip_missing(out, volume)
+    segmented_cumsum(out, starts, out=out)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out /= segmented_cumsum(volume, starts)
+    if missing is not None:
+        out[missing] = np.nan
+    return out
+
+def opening_range(high, low, minutes_from_open, starts, minutes):
+    # High and low of each session's first `minutes`, from the first bar
+    # after the range closes; NaN before that.
+    n = len(high)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    in_range = (minutes_from_open >= 0) & (minutes_from_open < minutes)
+    lengths = _lengths(starts, n)
+    range_high = np.repeat(np.maximum.reduceat(np.where(in_range, high, -np.inf), starts), lengths)
+    range_low = np.repeat(np.minimum.reduceat(np.where(in_range, low, np.inf), starts), lengths)
+    pending = (minutes_from_open < minutes) | np.isinf(range_high)
+    range_high[pending] = np.nan
+    range_low[pending] = np.nan
+    return range_high, range_low
+
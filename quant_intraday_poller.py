@@ -0,0 +1,254 @@
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from quant_calendar import EXCHANGE_TZ, exchange_today, session_open_close, next_session
+from quant_candle_loader import bulk_load_candle_batches
+from quant_fmp_client import TokenBucket, make_session, get_json
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+FMP_API_KEY = os.environ.get("FMP_API_KEY")
+
+FMP_URL = "https://financialmodelingprep.com/stable/historical-chart/1min"
+
+FMP_REQUESTS_PER_MINUTE = int(os.environ.get("FMP_REQUESTS_PER_MINUTE", "300"))
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "8"))
+FLUSH_INTERVAL = float(os.environ.get("POLL_FLUSH_INTERVAL", "5"))     # seconds
+FLUSH_ROWS = int(os.environ.get("POLL_FLUSH_ROWS", "5000"))
+REPORT_INTERVAL = float(os.environ.get("POLL_REPORT_INTERVAL", "60"))  # seconds
+LAG_METRICS_PATH = os.environ.get("POLL_LAG_METRICS_PATH")             # optional JSON snapshot
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# === Helpers ===
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+def exchange_now():
+    return datetime.now(EXCHANGE_TZ).replace(tzinfo=None)
+
+def load_watchlist(args):
+    # Tickers on the command line, or a file with one ticker per line.
+    if len(args) == 1 and os.path.isfile(args[0]):
+        with open(args[0]) as f:
+            args = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return sorted({t.upper() for t in args})
+
+def load_watermarks(conn, tickers):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT ticker, max(datetime)
+        FROM quant_candles_intraday
+        WHERE ticker = ANY(%s)
+        GROUP BY ticker;
+    """, (tickers,))
+    watermarks = {ticker: newest.strftime(DATE_FORMAT) for ticker, newest in cur.fetchall()}
+    cur.close()
+    return watermarks
+
+# === Poller ===
+class IntradayPoller:
+    def __init__(self, tickers, requests_per_minute=FMP_REQUESTS_PER_MINUTE, max_in_flight=MAX_IN_FLIGHT):
+        self.tickers = tickers
+        self.limiter = TokenBucket(requests_per_minute)
+        self.session = make_session(pool_size=max_in_flight)
+        self.pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        # Spread one sweep of the watchlist evenly over a minute, or over as
+        # long as the rate limit needs if the watchlist is larger than that.
+        self.spacing = max(60.0 / len(tickers), 60.0 / requests_per_minute)
+        self.lock = threading.Lock()
+        self.buffer = {}
+        self.buffered_rows = 0
+        self.fetched = {}  # newest bar fetched per ticker (filters the next poll)
+        self.stored = {}   # newest bar committed per ticker (drives lag metrics)
+        self.errors = {}
+        self.in_flight = {}  # symbol -> future of its latest poll
+        self.skipped = 0     # polls skipped because the previous one was still running
+        self.last_flush = time.monotonic()
+        self.last_report = time.monotonic()
+        self.conn = connect()
+
+        self.stored = load_watermarks(self.conn, tickers)
+        self.conn.commit()
+        self.fetched = dict(self.stored)
+
+    def poll(self, symbol):
+        today = exchange_today().strftime("%Y-%m-%d")
+        params = {"symbol": symbol, "from": today, "to": today, "apikey": FMP_API_KEY}
+        try:
+            candles = get_json(self.session, self.limiter, FMP_URL, params, max_retries=2, timeout=10)
+        except Exception as e:
+            with self.lock:
+                self.errors[symbol] = self.errors.get(symbol, 0) + 1
+            print(f"❌ Poll failed for {symbol}: {e}")
+            return
+        if not isinstance(candles, list):
+            return
+
+        # The bar for the current minute is still forming; it is written on
+        # the next poll once the minute has closed.
+        current_minute = exchange_now().replace(second=0, microsecond=0).strftime(DATE_FORMAT)
+        with self.lock:
+            watermark = self.fetched.get(symbol, "")
+            fresh = [c for c in candles if watermark < c.get("date", "") < current_minute]
+            if not fresh:
+                return
+            self.fetched[symbol] = max(c["date"] for c in fresh)
+            self.buffer.setdefault(symbol, []).extend(fresh)
+            self.buffered_rows += len(fresh)
+
+    def flush(self):
+        with self.lock:
+            batches, self.buffer = self.buffer, {}
+            self.buffered_rows = 0
+        self.last_flush = time.monotonic()
+        if not batches:
+            return
+
+        try:
+            if self.conn is None:
+                self.conn = connect()
+            inserted, duplicates = bulk_load_candle_batches(self.conn, batches)
+            self.conn.commit()
+        except Exception as e:
+            print(f"❌ Flush failed, keeping {sum(map(len, batches.values()))} rows for the next one: {e}")
+            self.recover()
+            with self.lock:
+                for symbol, candles in batches.items():
+                    self.buffer.setdefault(symbol, [])[:0] = candles
+                    self.buffered_rows += len(candles)
+            return
+
+        for symbol, candles in batches.items():
+            newest = max(c["date"] for c in candles)
+            if newest > self.stored.get(symbol, ""):
+                self.stored[symbol] = newest
+        print(f"✅ Flushed {inserted} new candles for {len(batches)} tickers ({duplicates} duplicates skipped)")
+
+    def recover(self):
+        # After a failed flush: keep the connection if it can still roll
+        # back, else reconnect (Supabase drops it while idle, e.g. overnight
+        # in wait_for_session). If that fails too, the next flush retries.
+        try:
+            self.conn.rollback()
+            return
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        try:
+            self.conn = connect()
+        except Exception as e:
+            print(f"❌ Reconnect failed, retrying on the next flush: {e}")
+            self.conn = None
+
+    def lag_metrics(self):
+        # Seconds between each ticker's newest stored bar and the exchange clock.
+        now = exchange_now()
+        lags = {}
+        for symbol in self.tickers:
+            newest = self.stored.get(symbol)
+            lags[symbol] = None if newest is None else (now - datetime.strptime(newest, DATE_FORMAT)).total_seconds()
+        return lags
+
+    def report(self):
+        self.last_report = time.monotonic()
+        lags = self.lag_metrics()
+        known = sorted(lag for lag in lags.values() if lag is not None)
+        if known:
+            p95 = known[min(len(known) - 1, int(len(known) * 0.95))]
+            worst = sorted(((lag, s) for s, lag in lags.items() if lag is not None), reverse=True)[:5]
+            print(f"📈 Lag over {len(known)} tickers: median {statistics.median(known):.0f}s, "
+                  f"p95 {p95:.0f}s, max {known[-1]:.0f}s; worst: "
+                  + ", ".join(f"{s} {lag:.0f}s" for lag, s in worst))
+        missing = len(lags) - len(known)
+        if missing:
+            print(f"⚠️ {missing} tickers have no stored bars yet")
+        if self.skipped:
+            print(f"⚠️ {self.skipped} polls skipped so far while the previous poll of the ticker was still pending")
+
+        if LAG_METRICS_PATH:
+            snapshot = {
+                "as_of": exchange_now().strftime(DATE_FORMAT),
+                "tickers": {s: {"newest_bar": self.stored.get(s), "lag_seconds": lag,
+                                "errors": self.errors.get(s, 0)} for s, lag in lags.items()},
+            }
+            tmp_path = f"{LAG_METRICS_PATH}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, LAG_METRICS_PATH)
+
+    def housekeeping(self):
+        now = time.monotonic()
+        if self.buffered_rows >= FLUSH_ROWS or now - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.report()
+
+    def sweep(self):
+        # One pass over the watchlist, requests spaced evenly in time. A
+        # symbol whose previous poll is still queued or running (FMP slow,
+        # rate limit saturated) is skipped, so polls can't pile up behind it.
+        start = time.monotonic()
+        for i, symbol in enumerate(self.tickers):
+            delay = start + i * self.spacing - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            previous = self.in_flight.get(symbol)
+            if previous is not None and not previous.done():
+                self.skipped += 1
+            else:
+                self.in_flight[symbol] = self.pool.submit(self.poll, symbol)
+            self.housekeeping()
+
+    def wait_for_session(self):
+        today = exchange_today()
+        bounds = session_open_close(today)
+        now = exchange_now()
+        if bounds and bounds[0] <= now <= bounds[1] + timedelta(minutes=2):
+            return
+        self.flush()
+        if bounds and now < bounds[0]:
+            opens = bounds[0]
+        else:
+            opens = session_open_close(next_session(today))[0]
+        print(f"💤 Market closed, sleeping until {opens.strftime(DATE_FORMAT)} ET")
+        while exchange_now() < opens:
+            time.sleep(min(60, max(1, (opens - exchange_now()).total_seconds())))
+
+    def run(self):
+        print(f"🔍 Polling {len(self.tickers)} tickers, one request every {self.spacing:.2f}s")
+        try:
+            while True:
+                self.wait_for_session()
+                self.sweep()
+        except KeyboardInterrupt:
+            print("🛑 Stopping poller")
+        finally:
+            self.pool.shutdown(wait=True)
+            self.flush()
+            self.report()
+            if self.conn is not None:
+                self.conn.close()
+            self.session.close()
+
+if __name__ == "__main__":
+    watchlist = load_watchlist(sys.argv[1:])
+    if watchlist:
+        IntradayPoller(watchlist).run()
+    else:
+        print("❌ Please provide tickers or a watchlist file. Example: python3 quant_intraday_poller.py watchlist.txt")
@@ -1,7 +1,11 @@
 import psycopg2
 import pandas as pd
 import os
-from datetime import datetime
+import sys
+import time
+
+from quant_feature_writer import ensure_feature_columns
+from quant_label_kernels import forward_labels
 
 # === Config ===
 DB_NAME = os.environ.get("DB_NAME")
@@ -10,16 +14,39 @@ DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 
+LABEL_TABLE = "quant_pattern_labeled_intraday"
+LABEL_FEATURES = ["rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200"]
+HORIZONS = (5, 10, 15)  # minutes ahead; each gets a return_{n}min column
+# The bar at t + horizon may be up to this many minutes early (the last bar
+# at or before the target); 0 requires the exact minute.
+LABEL_TOLERANCE = int(os.environ.get("LABEL_TOLERANCE_MINUTES", "0"))
+
 # === Connect to Supabase ===
 def connect():
     conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
     return psycopg2.connect(conn_string)
 
+def return_column(horizon):
+    return f"return_{horizon}min"
+
+def label_columns(horizons, excursions=False):
+    columns = [return_column(h) for h in horizons]
+    if excursions:
+        columns += [f"{kind}_{h}min" for h in horizons for kind in ("mfe", "mae")]
+    return columns
+
 # === Load Features and Candle Data ===
-def load_data(ticker):
+def load_data(ticker, source="db"):
+    if source == "local":
+        from quant_local_mirror import read_local
+        features = read_local("quant_features_intraday", ticker,
+                              columns=["datetime", "rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200"])
+        candles = read_local("quant_candles_intraday", ticker, columns=["datetime", "high", "low", "close"])
+        return features.merge(candles, on="datetime").sort_values("datetime").reset_index(drop=True)
+
     conn = connect()
     query = f"""
-        SELECT f.datetime, f.rsi, f.vwap, f.macd, f.macd_signal, f.ma_50, f.ma_200, c.close
+        SELECT f.datetime, f.rsi, f.vwap, f.macd, f.macd_signal, f.ma_50, f.ma_200, c.high, c.low, c.close
         FROM quant_features_intraday f
         JOIN quant_candles_intraday c
         ON f.ticker = c.ticker AND f.datetime = c.datetime
@@ -32,17 +59,18 @@ def load_data(ticker):
     return df
 
 # === Add Forward Returns ===
-def add_forward_returns(df):
-    df = df.copy()
-    df["future_close_5"] = df["close"].shift(-5)
-    df["future_close_10"] = df["close"].shift(-10)
-    df["future_close_15"] = df["close"].shift(-15)
-
-    df["return_5min"] = (df["future_close_5"] - df["close"]) / df["close"] * 100
-    df["return_10min"] = (df["future_close_10"] - df["close"]) / df["close"] * 100
-    df["return_15min"] = (df["future_close_15"] - df["close"]) / df["close"] * 100
+def forward_returns(df, horizons=HORIZONS, tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    # {column: values} for the frame's bars (datetime, close, and high/low
+    # for excursions), matched by timestamp rather than row position.
+    extremes = (df["high"].to_numpy(), df["low"].to_numpy()) if excursions else ()
+    return forward_labels(df["datetime"].to_numpy(), df["close"].to_numpy(), horizons, tolerance, same_session,
+                          *extremes)
 
-    return df.drop(columns=["future_close_5", "future_close_10", "future_close_15"])
+def add_forward_returns(df, horizons=HORIZONS, tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    df = df.copy()
+    for column, values in forward_returns(df, horizons, tolerance, same_session, excursions).items():
+        df[column] = values
+    return df
 
 # === Save Labeled Data ===
 def save_labeled_data(ticker, df):
@@ -74,14 +102,114 @@ def save_labeled_data(ticker, df):
     conn.close()
     print(f"✅ Labeled and inserted {inserted} rows for {ticker}.")
 
+# === Label in Postgres ===
+# One INSERT ... SELECT labels every horizon with window frames over each
+# ticker's features joined to its candles, so neither the join nor the
+# labels cross the network. The frames are RANGE offsets on datetime, so
+# they find bars by time exactly as forward_labels does. Rows without a
+# shortest-horizon return (the last bars) are skipped, as in save_labeled_data.
+def ensure_label_columns(cur, columns):
+    # Alters the table only for columns it lacks (see ensure_feature_columns).
+    return ensure_feature_columns(cur, LABEL_TABLE, {column: "float64" for column in columns})
+
+def label_sql(horizons, tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    # Each ticker resumes after its newest row labeled for the longest
+    # horizon. Later rows were stored before all their future bars existed
+    # (or predate a newly added horizon) and have their labels filled in.
+    columns = label_columns(horizons, excursions)
+    longest = return_column(max(horizons))
+    shortest = return_column(min(horizons))
+    features = ", ".join(LABEL_FEATURES)
+    windows = []
+    for h in horizons:
+        windows.append(f"(last_value(c.close) OVER (s RANGE BETWEEN INTERVAL '{h - tolerance} minutes' FOLLOWING "
+                       f"AND INTERVAL '{h} minutes' FOLLOWING) - c.close) / c.close * 100 AS {return_column(h)}")
+        if excursions:
+            ahead = f"(s RANGE BETWEEN CURRENT ROW AND INTERVAL '{h} minutes' FOLLOWING EXCLUDE CURRENT ROW)"
+            windows.append(f"(max(c.high) OVER {ahead} - c.close) / c.close * 100 AS mfe_{h}min")
+            windows.append(f"(min(c.low) OVER {ahead} - c.close) / c.close * 100 AS mae_{h}min")
+    # Excursions only where the return is labeled, as in forward_labels.
+    outputs = [return_column(h) for h in horizons]
+    if excursions:
+        outputs += [f"CASE WHEN {return_column(h)} IS NOT NULL THEN {kind}_{h}min END"
+                    for h in horizons for kind in ("mfe", "mae")]
+    windows = ",\n                   ".join(windows)
+    partition = "f.ticker, f.datetime::date" if same_session else "f.ticker"
+    return f"""
+        INSERT INTO {LABEL_TABLE} (ticker, datetime, {features}, close, {", ".join(columns)})
+        SELECT ticker, datetime, {features}, close, {", ".join(outputs)}
+        FROM (
+            SELECT f.ticker, f.datetime, {", ".join(f"f.{c}" for c in LABEL_FEATURES)}, c.close,
+                   {windows}
+            FROM unnest(%s::text[]) AS t(ticker)
+            CROSS JOIN LATERAL (
+                SELECT max(l.datetime) AS labeled_to
+                FROM {LABEL_TABLE} l
+                WHERE l.ticker = t.ticker AND l.{longest} IS NOT NULL
+            ) m
+            JOIN quant_features_intraday f
+            ON f.ticker = t.ticker AND f.datetime > COALESCE(m.labeled_to, '-infinity')
+            JOIN quant_candles_intraday c
+            ON c.ticker = f.ticker AND c.datetime = f.datetime
+            WINDOW s AS (PARTITION BY {partition} ORDER BY f.datetime)
+        ) labeled
+        WHERE {shortest} IS NOT NULL
+        ON CONFLICT (ticker, datetime) DO UPDATE
+        SET {", ".join(f"{c} = EXCLUDED.{c}" for c in columns)}
+        WHERE ({", ".join(f"{LABEL_TABLE}.{c}" for c in columns)})
+        IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in columns)});
+    """
+
+def label_in_database(conn, tickers, horizons=HORIZONS, tolerance=LABEL_TOLERANCE, same_session=True,
+                      excursions=False):
+    # Returns the rows inserted or updated. The caller owns the transaction.
+    horizons = sorted(set(horizons))
+    if tolerance >= horizons[0]:
+        raise ValueError(f"tolerance ({tolerance} min) must be shorter than every horizon")
+    cur = conn.cursor()
+    ensure_label_columns(cur, label_columns(horizons, excursions))
+    cur.execute(label_sql(horizons, tolerance, same_session, excursions), (list(tickers),))
+    labeled = cur.rowcount
+    cur.close()
+    return labeled
+
+def label_server_side(tickers, horizons=HORIZONS, tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    start_time = time.time()
+    print(f"🔍 Labeling {', '.join(tickers)} in Postgres: horizons {', '.join(map(str, horizons))} min")
+    conn = connect()
+    # New horizon columns are committed first, so the labeling transaction
+    # doesn't hold an ACCESS EXCLUSIVE lock on the table.
+    cur = conn.cursor()
+    ensure_label_columns(cur, label_columns(sorted(set(horizons)), excursions))
+    conn.commit()
+    cur.close()
+    labeled = label_in_database(conn, tickers, horizons, tolerance, same_session, excursions)
+    conn.commit()
+    conn.close()
+    print(f"✅ Labeled {labeled} new or updated rows")
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")
+    return labeled
+
 # === Main ===
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        ticker = sys.argv[1].upper()
-        print(f"🔍 Processing labeled returns for: {ticker}")
-        df = load_data(ticker)
-        df_labeled = add_forward_returns(df)
-        save_labeled_data(ticker, df_labeled)
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    tickers = [a.upper() for a in sys.argv[1:] if not a.startswith("--")]
+    options = {
+        "horizons": [int(h) for h in flags["horizons"].split(",")] if "horizons" in flags else HORIZONS,
+        "tolerance": int(flags.get("tolerance", LABEL_TOLERANCE)),
+        "same_session": "--any-session" not in sys.argv,
+        "excursions": "--excursions" in sys.argv,
+    }
+    if not tickers:
+        print("❌ Please provide a ticker symbol. Example: python3 quant_label_forward_returns.py GRRR "
+              "[--horizons=5,10,15,30] [--tolerance=2] [--any-session] [--excursions] [--client] [--local]")
+    elif "--client" in sys.argv or "--local" in sys.argv:
+        # The pandas path: writes the 5/10/15 minute returns, and the only
+        # one that can read the local mirror.
+        for ticker in tickers:
+            print(f"🔍 Processing labeled returns for: {ticker}")
+            df = load_data(ticker, "local" if "--local" in sys.argv else "db")
+            df_labeled = add_forward_returns(df, HORIZONS, options["tolerance"], options["same_session"])
+            save_labeled_data(ticker, df_labeled)
     else:
-        print("❌ Please provide a ticker symbol. Example: python3 quant_label_forward_returns.py GRRR")
+        label_server_side(tickers, **options)
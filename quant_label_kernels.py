@@ -0,0 +1,100 @@
+import numpy as np
+
+from quant_indicator_kernels import segment_starts
+
+# === Forward-Window Kernels ===
+# Labels look ahead by time, not by row: the bar "h minutes later" is found
+# by timestamp, so a missing minute or the session close never pulls in a
+# later bar or the next day's open. Inputs are sorted datetime64 stamps and
+# float64 price arrays; outputs are NaN wherever the target bar is missing.
+
+def _minutes(stamps):
+    return np.asarray(stamps).astype("datetime64[m]").astype(np.int64)
+
+def _session_days(stamps):
+    return np.asarray(stamps).astype("datetime64[D]").astype(np.int64)
+
+def forward_index(stamps, horizon, tolerance=0, same_session=True):
+    # Index of the bar at t + horizon minutes for every bar: the last bar at
+    # or before the target, accepted if it is at most `tolerance` minutes
+    # early, after t and (optionally) in the same session. -1 where none.
+    if tolerance >= horizon:
+        raise ValueError(f"tolerance ({tolerance} min) must be shorter than the horizon ({horizon} min)")
+    minutes = _minutes(stamps)
+    target = minutes + horizon
+    found = np.searchsorted(minutes, target, side="right") - 1
+    ok = (found > np.arange(len(minutes))) & (minutes[found.clip(0)] >= target - tolerance)
+    if same_session:
+        days = _session_days(stamps)
+        ok &= days[found.clip(0)] == days
+    return np.where(ok, found, -1)
+
+def sliding_max(x, window):
+    # max(x[s:s + window]) for every s, windows past the end truncated.
+    # Van Herk/Gil-Werman: within blocks of `window` elements, a prefix and
+    # a suffix running max; any window spans at most two blocks, so its max
+    # is suffix[s] combined with prefix[s + window - 1]. O(n) per window size.
+    n = len(x)
+    if n == 0:
+        return np.empty(0)
+    blocks = -(-n // window) + 1
+    padded = np.full(blocks * window, -np.inf)
+    padded[:n] = x
+    grid = padded.reshape(blocks, window)
+    prefix = np.maximum.accumulate(grid, axis=1).ravel()
+    suffix = np.maximum.accumulate(grid[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:n], prefix[window - 1:window - 1 + n])
+
+def _minute_grid(stamps, horizon, same_session):
+    # Position of every bar on a grid with one slot per minute, so a time
+    # window is a fixed-width slice. With same_session each session gets
+    # its own stretch of slots followed by `horizon` empty ones, so a window
+    # never reaches the next session; this also skips the overnight minutes.
+    minutes = _minutes(stamps)
+    if not same_session:
+        return minutes - minutes[0]
+    starts = segment_starts(_session_days(stamps))
+    lengths = np.diff(np.append(starts, len(minutes)))
+    offsets = minutes - np.repeat(minutes[starts], lengths)
+    span = int(offsets.max()) + 1 + horizon
+    return np.repeat(np.arange(len(starts)) * span, lengths) + offsets
+
+def forward_extremes(stamps, high, low, horizon, same_session=True):
+    # Highest high and lowest low over the bars in (t, t + horizon].
+    n = len(high)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    slots = _minute_grid(stamps, horizon, same_session)
+    size = int(slots[-1]) + 2
+    grid = np.full(size, -np.inf)
+    grid[slots] = high
+    highest = sliding_max(grid, horizon)[slots + 1]
+    grid.fill(-np.inf)
+    grid[slots] = -low
+    lowest = -sliding_max(grid, horizon)[slots + 1]
+    return highest, lowest
+
+def forward_labels(stamps, close, horizons, tolerance=0, same_session=True, high=None, low=None):
+    # {return_{h}min: percent change to the close h minutes later}, plus
+    # mfe_{h}min / mae_{h}min (max favorable / adverse excursion: the
+    # highest high and lowest low over the window, in percent of the
+    # entry close) when high and low are given. Excursions are NaN wherever
+    # the return is, so a window cut short by the close isn't labeled.
+    close = np.asarray(close, dtype=np.float64)
+    labels = {}
+    for horizon in horizons:
+        found = forward_index(stamps, horizon, tolerance, same_session)
+        missing = found < 0
+        returns = (close[found] - close) / close * 100
+        returns[missing] = np.nan
+        labels[f"return_{horizon}min"] = returns
+        if high is not None and low is not None:
+            highest, lowest = forward_extremes(stamps, np.asarray(high, dtype=np.float64),
+                                               np.asarray(low, dtype=np.float64), horizon, same_session)
+            mfe = (highest - close) / close * 100
+            mae = (lowest - close) / close * 100
+            mfe[missing] = np.nan
+            mae[missing] = np.nan
+            labels[f"mfe_{horizon}min"] = mfe
+            labels[f"mae_{horizon}min"] = mae
+    return labels
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+from quant_engineer_features import compute_indicators, connect, load_candles
+from quant_feature_registry import FEATURES
+from quant_feature_writer import bulk_write_features
+from quant_label_forward_returns import (HORIZONS, LABEL_FEATURES, LABEL_TABLE, LABEL_TOLERANCE, ensure_label_columns,
+                                        forward_returns, return_column)
+
+# === Config ===
+FEATURE_TABLE = "quant_features_intraday"
+LABEL_STAGING_TABLE = "quant_labels_staging"
+
+# === Fused Features and Labels ===
+# Reads a ticker's candles once, computes the indicators and forward returns
+# on the same in-memory arrays and writes both tables with COPY in one
+# transaction, instead of writing the features, reading them back joined to
+# the candles and labeling them in a second pass.
+
+def label_frame(features, horizons=HORIZONS, tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    # The labeled-table rows over the feature frame's own column arrays.
+    # Bars without a shortest-horizon return are dropped, as in
+    # save_labeled_data.
+    labels = forward_returns(features, horizons, tolerance, same_session, excursions)
+    columns = {c: features[c].to_numpy() for c in ["datetime"] + LABEL_FEATURES + ["close"]}
+    columns.update(labels)
+    frame = pd.DataFrame(columns, copy=False)
+    return frame[~np.isnan(labels[return_column(min(horizons))])]
+
+def run_pipeline(symbol, source="db", horizons=HORIZONS, persist_features=True, mode="nothing",
+                 tolerance=LABEL_TOLERANCE, same_session=True, excursions=False):
+    # persist_features=False labels without writing quant_features_intraday,
+    # for research runs. Returns (feature rows, label rows) written.
+    start_time = time.time()
+    horizons = sorted(set(horizons))
+    print(f"🔍 Features and labels for: {symbol} (horizons {', '.join(map(str, horizons))} min"
+          + ("" if persist_features else ", features not stored") + ")")
+
+    df = load_candles(symbol, source)
+    print(f"📊 Retrieved {len(df)} rows")
+    if df.empty:
+        print("⚠️ No data found.")
+        return 0, 0
+
+    features = compute_indicators(df)
+    labels = label_frame(features, horizons, tolerance, same_session, excursions)
+    outputs = [c for c in labels.columns if c not in ["datetime"] + LABEL_FEATURES + ["close"]]
+
+    conn = connect()
+    # New horizon columns are added and committed before the writes, which
+    # then take no table lock beyond row locks.
+    cur = conn.cursor()
+    ensure_label_columns(cur, outputs)
+    conn.commit()
+    cur.close()
+    feature_rows = 0
+    if persist_features:
+        columns = [name for name in features.columns if name in FEATURES and FEATURES[name].stored]
+        feature_rows, _ = bulk_write_features(conn, symbol, features, FEATURE_TABLE, mode, columns)
+    # Without --update, stored labels are kept but the longer horizons of the
+    # newest rows, NULL until their future bars arrived, are filled in.
+    label_rows, _ = bulk_write_features(conn, symbol, labels, LABEL_TABLE, "update" if mode == "update" else "fill",
+                                        LABEL_FEATURES + ["close"] + outputs, staging=LABEL_STAGING_TABLE)
+    conn.commit()
+    conn.close()
+
+    if persist_features:
+        print(f"✅ Wrote {feature_rows} rows into {FEATURE_TABLE}")
+    print(f"✅ Labeled and wrote {label_rows} rows into {LABEL_TABLE}")
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")
+    return feature_rows, label_rows
+
+# === Main ===
+if __name__ == "__main__":
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    tickers = [a.upper() for a in sys.argv[1:] if not a.startswith("--")]
+    if tickers:
+        for ticker in tickers:
+            run_pipeline(
+                ticker,
+                source="local" if "--local" in sys.argv else "db",
+                horizons=[int(h) for h in flags["horizons"].split(",")] if "horizons" in flags else HORIZONS,
+                persist_features="--labels-only" not in sys.argv,
+                mode="update" if "--update" in sys.argv else "nothing",
+                tolerance=int(flags.get("tolerance", LABEL_TOLERANCE)),
+                same_session="--any-session" not in sys.argv,
+                excursions="--excursions" in sys.argv,
+            )
+    else:
+        print("❌ Please provide a ticker symbol. Example: python3 quant_label_pipeline.py GRRR "
+              "[--horizons=5,10,15] [--tolerance=2] [--any-session] [--excursions] [--labels-only] [--update] [--local]")
@@ -0,0 +1,190 @@
+import psycopg2
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import json
+import os
+import sys
+import time
+
+from quant_day_fingerprints import changed_days, day_fingerprints
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+MIRROR_DIR = os.environ.get("QUANT_MIRROR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".quant_mirror"))
+
+# Local Parquet copies, laid out as <table>/ticker=<T>/month=<YYYY-MM>/data.parquet
+MIRROR_TABLES = {
+    "quant_candles_intraday": ["datetime", "open", "high", "low", "close", "volume"],
+    "quant_features_intraday": ["datetime", "rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200",
+                                "rel_volume", "is_uptrend"],
+    "quant_pattern_labeled_intraday": ["datetime", "rsi", "vwap", "macd", "macd_signal", "ma_50", "ma_200",
+                                       "close", "return_5min", "return_10min", "return_15min"],
+}
+
+# Everything not listed here is stored as float64, so every month file
+# shares one schema even when a column is entirely NULL for that month.
+COLUMN_TYPES = {"volume": "int64", "is_uptrend": "boolean"}
+
+SYNC_CHUNK_ROWS = 200000
+
+# === Helpers ===
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+def _fingerprint_path(table):
+    return os.path.join(MIRROR_DIR, table, "_fingerprints.json")
+
+def load_fingerprints(table):
+    # {ticker: {"YYYY-MM-DD": day fingerprint}} as of each ticker's last sync.
+    try:
+        with open(_fingerprint_path(table)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_fingerprints(table, fingerprints):
+    path = _fingerprint_path(table)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(fingerprints, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def _month_path(table, ticker, month):
+    return os.path.join(MIRROR_DIR, table, f"ticker={ticker}", f"month={month}", "data.parquet")
+
+def _save_month(path, df):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Underscore-prefixed files are invisible to dataset scans mid-write.
+    tmp_path = os.path.join(os.path.dirname(path), "_data.parquet.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_month(table, ticker, month, df):
+    # Merges new rows into the month file; a re-synced row replaces the old one.
+    path = _month_path(table, ticker, month)
+    df = df.astype({c: COLUMN_TYPES.get(c, "float64") for c in df.columns if c != "datetime"})
+    if os.path.exists(path):
+        df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+        df = df.drop_duplicates(subset="datetime", keep="last")
+    _save_month(path, df.sort_values("datetime").reset_index(drop=True))
+
+def _drop_days(table, ticker, days):
+    # Removes the mirrored rows of `days` ("YYYY-MM-DD"), month file by month
+    # file, before they are re-synced; a day deleted upstream stays gone.
+    for month in sorted({day[:7] for day in days}):
+        path = _month_path(table, ticker, month)
+        if not os.path.exists(path):
+            continue
+        df = pd.read_parquet(path)
+        df = df[~df["datetime"].dt.strftime("%Y-%m-%d").isin(days)]
+        if df.empty:
+            os.remove(path)
+        else:
+            _save_month(path, df.reset_index(drop=True))
+
+# === Sync ===
+def list_tickers(conn, table):
+    cur = conn.cursor()
+    cur.execute(f"SELECT DISTINCT ticker FROM {table};")
+    tickers = sorted(row[0] for row in cur.fetchall())
+    cur.close()
+    return tickers
+
+def sync_table(conn, table, tickers=None, full=False):
+    # Re-syncs every day whose fingerprint changed since the ticker's last
+    # sync: new days, and days whose rows were backfilled, rewritten in place
+    # (feature --update runs, relabeling) or deleted. full=True re-syncs all.
+    fingerprints = load_fingerprints(table)
+    tickers = tickers or list_tickers(conn, table)
+    columns = ", ".join(MIRROR_TABLES[table])
+    synced = resynced_days = 0
+
+    for ticker in tickers:
+        cur = conn.cursor()
+        current = {day.isoformat(): fingerprint for day, fingerprint in day_fingerprints(cur, table, ticker).items()}
+        cur.close()
+        built = fingerprints.get(ticker, {})
+        days = sorted(set(built) | set(current)) if full else changed_days(built, current)
+        if not days:
+            continue
+        _drop_days(table, ticker, set(days))
+
+        query = f"""
+            SELECT {columns}
+            FROM {table}
+            WHERE ticker = %s AND datetime >= %s AND datetime::date = ANY(%s::date[])
+            ORDER BY datetime ASC
+        """
+        # Server-side cursor so a first sync streams instead of buffering the table.
+        cur = conn.cursor(name=f"mirror_{table}")
+        cur.itersize = SYNC_CHUNK_ROWS
+        cur.execute(query, (ticker, days[0], days))
+        while True:
+            rows = cur.fetchmany(SYNC_CHUNK_ROWS)
+            if not rows:
+                break
+            chunk = pd.DataFrame(rows, columns=MIRROR_TABLES[table])
+            chunk["datetime"] = pd.to_datetime(chunk["datetime"])
+            months = chunk["datetime"].dt.strftime("%Y-%m")
+            for month, month_rows in chunk.groupby(months):
+                _write_month(table, ticker, month, month_rows)
+            synced += len(chunk)
+        cur.close()
+        conn.commit()
+        fingerprints[ticker] = current
+        save_fingerprints(table, fingerprints)
+        resynced_days += len(days)
+
+    print(f"✅ Synced {synced} rows of {table} over {resynced_days} new or changed days for {len(tickers)} tickers")
+    return synced
+
+def sync(tickers=None, tables=None, full=False):
+    start_time = time.time()
+    conn = connect()
+    for table in tables or MIRROR_TABLES:
+        sync_table(conn, table, tickers, full)
+    conn.close()
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")
+
+# === Read ===
+def read_local(table, ticker=None, columns=None, start=None, end=None, not_null=()):
+    # Reads the mirror with column projection and ticker/time/not-null
+    # predicates pushed down to the Parquet scan.
+    root = os.path.join(MIRROR_DIR, table)
+    columns = list(columns or MIRROR_TABLES[table])
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns)
+
+    partitioning = ds.partitioning(pa.schema([("ticker", pa.string()), ("month", pa.string())]), flavor="hive")
+    dataset = ds.dataset(root, format="parquet", partitioning=partitioning)
+    conditions = []
+    if ticker is not None:
+        conditions.append(ds.field("ticker") == ticker)
+    if start is not None:
+        conditions.append(ds.field("datetime") >= pd.Timestamp(start).to_datetime64())
+    if end is not None:
+        conditions.append(ds.field("datetime") < pd.Timestamp(end).to_datetime64())
+    conditions += [ds.field(column).is_valid() for column in not_null]
+
+    condition = None
+    for expr in conditions:
+        condition = expr if condition is None else condition & expr
+
+    df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    return df.sort_values("datetime").reset_index(drop=True)
+
+# === Main ===
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        args = [a for a in sys.argv[2:] if not a.startswith("--")]
+        sync([t.upper() for t in args] or None, full="--full" in sys.argv)
+    else:
+        print("❌ Please provide a command. Example: python3 quant_local_mirror.py sync [GRRR ...] [--full]")
@@ -0,0 +1,236 @@
+import psycopg2
+from datetime import date
+import os
+import re
+import sys
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+PARTITIONED_TABLES = [
+    "quant_candles_intraday",
+    "quant_features_intraday",
+    "quant_pattern_labeled_intraday",
+]
+
+PREMAKE_MONTHS = int(os.environ.get("PARTITION_PREMAKE_MONTHS", "3"))
+RETENTION_MONTHS = int(os.environ.get("PARTITION_RETENTION_MONTHS", "0"))  # 0 keeps everything
+
+_BOUND_RE = re.compile(r"FROM \('(\d{4})-(\d{2})-01")
+
+# === Helpers ===
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def partition_name(table, month):
+    return f"{table}_{month.year}_{month.month:02d}"
+
+def is_partitioned(cur, table):
+    cur.execute("""
+        SELECT c.relkind = 'p' FROM pg_class c
+        WHERE c.oid = to_regclass(%s);
+    """, (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+def to_regclass(cur, name):
+    cur.execute("SELECT to_regclass(%s);", (name,))
+    return cur.fetchone()[0]
+
+def list_partitions(cur, table):
+    # {month: partition name} for the monthly range partitions of a table.
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s);
+    """, (table,))
+    partitions = {}
+    for name, bound in cur.fetchall():
+        match = _BOUND_RE.search(bound)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+# === Partition Management ===
+def create_month_partition(cur, table, month):
+    # Rows that already landed in the DEFAULT partition for this month are
+    # moved into the new partition before it is attached.
+    name = partition_name(table, month)
+    lower, upper = month, add_months(month, 1)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {table} INCLUDING DEFAULTS);")
+    if to_regclass(cur, f"{table}_default"):
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default
+                WHERE datetime >= %s AND datetime < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved;
+        """, (lower, upper))
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);",
+                (lower, upper))
+    return name
+
+def ensure_partitions(cur, table, first_month, last_month):
+    existing = list_partitions(cur, table)
+    created = []
+    month = first_month
+    while month <= last_month:
+        if month not in existing:
+            created.append(create_month_partition(cur, table, month))
+        month = add_months(month, 1)
+    return created
+
+def carry_over(cur, legacy, table):
+    # Recreates the legacy table's secondary indexes, grants, row-level
+    # security and policies on the new table (Supabase exposes tables through
+    # these). Returns what could not be carried over: unique indexes without
+    # the datetime partition key, which a partitioned table can't have.
+    dropped = []
+    cur.execute("""
+        SELECT i.relname, x.indisunique, pg_get_indexdef(x.indexrelid),
+               EXISTS (SELECT 1 FROM unnest(x.indkey) k
+                       JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k
+                       WHERE a.attname = 'datetime')
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary;
+    """, (legacy,))
+    for name, unique, definition, keyed in cur.fetchall():
+        if unique and not keyed:
+            dropped.append(f"unique index {name}")
+            continue
+        # Frees the index name for the new table, as with the primary key.
+        cur.execute(f'ALTER INDEX "{name}" RENAME TO "{(name + "_legacy")[:63]}";')
+        using = definition.split(" USING ", 1)[1]
+        cur.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX "{name}" ON {table} USING {using};')
+
+    cur.execute("""
+        SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END,
+               a.privilege_type, a.is_grantable
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = to_regclass(%s) AND a.grantee <> c.relowner;
+    """, (legacy,))
+    for grantee, privilege, grantable in cur.fetchall():
+        cur.execute(f"GRANT {privilege} ON {table} TO {grantee}{' WITH GRANT OPTION' if grantable else ''};")
+    cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class');", (legacy,))
+    comment = cur.fetchone()[0]
+    if comment is not None:
+        cur.execute(f"COMMENT ON TABLE {table} IS %s;", (comment,))
+
+    cur.execute("SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = to_regclass(%s);", (legacy,))
+    enabled, forced = cur.fetchone()
+    if enabled:
+        cur.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;")
+    if forced:
+        cur.execute(f"ALTER TABLE {table} FORCE ROW LEVEL SECURITY;")
+    cur.execute("""
+        SELECT p.polname, p.polpermissive, p.polcmd,
+               ARRAY(SELECT CASE WHEN r = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(r)) END
+                     FROM unnest(p.polroles) r),
+               pg_get_expr(p.polqual, p.polrelid), pg_get_expr(p.polwithcheck, p.polrelid)
+        FROM pg_policy p
+        WHERE p.polrelid = to_regclass(%s);
+    """, (legacy,))
+    commands = {"r": "SELECT", "a": "INSERT", "w": "UPDATE", "d": "DELETE", "*": "ALL"}
+    for name, permissive, command, roles, using, check in cur.fetchall():
+        cur.execute(f'CREATE POLICY "{name}" ON {table} AS {"PERMISSIVE" if permissive else "RESTRICTIVE"} '
+                    f'FOR {commands[command]} TO {", ".join(roles)}'
+                    f'{f" USING ({using})" if using else ""}{f" WITH CHECK ({check})" if check else ""};')
+    return dropped
+
+def migrate_table(cur, table, premake_months=PREMAKE_MONTHS):
+    # Swaps a flat table for a monthly range-partitioned one with the same
+    # columns, (ticker, datetime) key, indexes, grants and policies. The old
+    # rows are copied across and the flat table is kept as <table>_legacy
+    # until it is dropped by hand.
+    if is_partitioned(cur, table):
+        print(f"✅ {table} is already partitioned")
+        return
+
+    legacy = f"{table}_legacy"
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy};")
+    # Frees the <table>_pkey index name for the new table's primary key.
+    cur.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'p';
+    """, (legacy,))
+    row = cur.fetchone()
+    if row and row[0] == f"{table}_pkey":
+        cur.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey;")
+    # Indexes are recreated by carry_over, after the partition-keyed primary key.
+    cur.execute(f"""
+        CREATE TABLE {table} (LIKE {legacy} INCLUDING ALL EXCLUDING INDEXES)
+        PARTITION BY RANGE (datetime);
+    """)
+    cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (ticker, datetime);")
+    dropped = carry_over(cur, legacy, table)
+    cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;")
+
+    cur.execute(f"SELECT min(datetime)::date, max(datetime)::date FROM {legacy};")
+    oldest, newest = cur.fetchone()
+    today = month_start(date.today())
+    first = month_start(oldest) if oldest else today
+    last = max(month_start(newest) if newest else today, add_months(today, premake_months))
+    ensure_partitions(cur, table, first, last)
+
+    cur.execute(f"INSERT INTO {table} SELECT * FROM {legacy};")
+    print(f"✅ Migrated {cur.rowcount} rows of {table} into {len(list_partitions(cur, table))} monthly partitions "
+          f"(old table kept as {legacy})")
+    if dropped:
+        print(f"⚠️ Not carried over to partitioned {table}: {', '.join(dropped)}")
+
+def apply_retention(cur, table, retention_months, drop=False):
+    # Detaches (or drops) partitions that end before the retention horizon.
+    horizon = add_months(month_start(date.today()), -retention_months)
+    removed = []
+    for month, name in sorted(list_partitions(cur, table).items()):
+        if add_months(month, 1) > horizon:
+            break
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name};")
+        if drop:
+            cur.execute(f"DROP TABLE {name};")
+        removed.append(name)
+    return removed
+
+def maintain(cur, table, premake_months=PREMAKE_MONTHS, retention_months=RETENTION_MONTHS, drop=False):
+    today = month_start(date.today())
+    created = ensure_partitions(cur, table, today, add_months(today, premake_months))
+    removed = apply_retention(cur, table, retention_months, drop) if retention_months else []
+    print(f"✅ {table}: created {len(created)} partitions, "
+          f"{'dropped' if drop else 'detached'} {len(removed)} past retention")
+
+# === Main ===
+if __name__ == "__main__":
+    commands = ("migrate", "maintain", "status")
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        command = sys.argv[1]
+        conn = connect()
+        cur = conn.cursor()
+        for table in PARTITIONED_TABLES:
+            if command == "migrate":
+                migrate_table(cur, table)
+            elif command == "maintain":
+                maintain(cur, table, drop="--drop" in sys.argv)
+            else:
+                months = sorted(list_partitions(cur, table))
+                span = f"{months[0]:%Y-%m} → {months[-1]:%Y-%m}" if months else "not partitioned"
+                print(f"📊 {table}: {len(months)} partitions ({span})")
+        conn.commit()
+        conn.close()
+    else:
+        print("❌ Please provide a command: migrate, maintain [--drop] or status. "
+              "Example: python3 quant_partition_manager.py maintain")
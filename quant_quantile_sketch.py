@@ -0,0 +1,258 @@
+import psycopg2
+from psycopg2.extras import Json
+import numpy as np
+import pandas as pd
+import os
+import sys
+import time
+from datetime import datetime
+
+from quant_bucket_analysis import (RETURN_COLUMNS, RSI_EDGES, Axis, QuantileAxis, bucket_stats, load_labeled_data,
+                                   summarize)
+from quant_day_fingerprints import changed_days, ensure_fingerprint_table, load_built, save_built, source_fingerprints
+from quant_label_forward_returns import LABEL_TABLE
+from quant_indicator_kernels import segment_starts
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+SKETCH_TABLE = "quant_feature_sketches"
+COMPRESSION = 200
+DECILES = np.linspace(0, 1, 11).round(2).tolist()
+
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+# === Quantile Sketch ===
+# A merging t-digest: the values seen so far as weighted centroids, small
+# near the tails and large in the middle (the k1 scale function), so any
+# quantile comes back within a fraction of a percent of its rank from a few
+# hundred numbers. Adding a batch or merging another digest sorts the
+# centroids plus the new points and collapses each run that falls in the
+# same unit of k-scale into one centroid: the whole step is array work,
+# and digests built on separate days or tickers merge the same way.
+
+class TDigest:
+    def __init__(self, compression=COMPRESSION, means=(), weights=(), low=None, high=None):
+        self.compression = compression
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.low = low    # exact min and max seen, None while empty
+        self.high = high
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _add(self, means, weights, low, high):
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        left = (np.cumsum(weights) - weights) / weights.sum()
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * left - 1, -1, 1)))
+        starts = segment_starts(k)
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+        return self
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            return self
+        return self._add(x, np.ones(len(x)), float(x.min()), float(x.max()))
+
+    def merge(self, other):
+        if len(other.weights) == 0:
+            return self
+        return self._add(other.means, other.weights, other.low, other.high)
+
+    def quantile(self, q):
+        # Interpolates between centroid means placed at the middle of their
+        # weight, pinned to the exact min and max at the ends.
+        q = np.asarray(q, dtype=np.float64)
+        if len(self.weights) == 0:
+            return np.full(q.shape, np.nan)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(q * self.count, np.concatenate([[0], centers, [self.count]]),
+                         np.concatenate([[self.low], self.means, [self.high]]))
+
+    def state(self):
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+                "low": self.low, "high": self.high}
+
+# === Stored Sketches ===
+# One digest per (ticker, feature expression, day). Quantile bins for any
+# date range come from merging that range's day digests, so a run never
+# re-reads or sorts the history. A refresh rebuilds the days whose labeled
+# rows changed since they were sketched (see quant_day_fingerprints), older
+# days rewritten or deleted included.
+
+def ensure_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+            ticker TEXT NOT NULL,
+            expression TEXT NOT NULL,
+            day DATE NOT NULL,
+            count BIGINT NOT NULL,
+            sketch JSONB NOT NULL,
+            PRIMARY KEY (ticker, expression, day)
+        );
+    """)
+    ensure_fingerprint_table(cur)
+
+def consumer(expression):
+    # The expression's name among the day-fingerprint consumers.
+    return f"sketch:{expression}"
+
+def refresh_sketches(conn, symbol, axes, source="db"):
+    # Day digests of every quantile axis' expression for one ticker.
+    # Returns (labeled rows read, sketches written); the caller owns the
+    # transaction.
+    axes = [axis for axis in axes if isinstance(axis, QuantileAxis)]
+    expressions = sorted({axis.expression for axis in axes})
+    cur = conn.cursor()
+    ensure_table(cur)
+    current = source_fingerprints(cur, LABEL_TABLE, symbol, source)
+    # Each expression tracks its own days: one added later starts from none.
+    changed = {expression: changed_days(load_built(cur, consumer(expression), symbol), current)
+               for expression in expressions}
+    days = sorted(set().union(*changed.values()))
+    if not days:
+        cur.close()
+        return 0, 0
+
+    df = load_labeled_data([symbol], axes, source, returns=(), days=days)
+    columns = {c: df[c].to_numpy() for c in df.columns if c != "datetime"}
+    stamps = df["datetime"].to_numpy().astype("datetime64[D]")
+    starts = segment_starts(stamps)
+    ends = np.append(starts[1:], len(stamps))
+    rows = []
+    for expression in expressions:
+        values = next(axis for axis in axes if axis.expression == expression).values(columns)
+        wanted = set(changed[expression])
+        for lo, hi in zip(starts, ends):
+            day = pd.Timestamp(stamps[lo]).date()
+            if day in wanted:
+                digest = TDigest().update(values[lo:hi])
+                rows.append((symbol, expression, day, int(digest.count), Json(digest.state())))
+        cur.execute(f"DELETE FROM {SKETCH_TABLE} WHERE ticker = %s AND expression = %s AND day = ANY(%s::date[]);",
+                    (symbol, expression, changed[expression]))
+        save_built(cur, consumer(expression), symbol, current, changed[expression])
+    cur.executemany(f"INSERT INTO {SKETCH_TABLE} (ticker, expression, day, count, sketch) VALUES (%s, %s, %s, %s, %s);",
+                    rows)
+    cur.close()
+    return len(df), len(rows)
+
+def load_digest(cur, symbol, expression, start=None, end=None):
+    # The merged digest of the ticker's days in [start, end].
+    cur.execute(f"""
+        SELECT sketch FROM {SKETCH_TABLE}
+        WHERE ticker = %s AND expression = %s AND day >= %s AND day <= %s
+        ORDER BY day;
+    """, (symbol, expression, start or datetime(1900, 1, 1), end or datetime(9999, 12, 31)))
+    digest = TDigest()
+    for (state,) in cur.fetchall():
+        digest.merge(TDigest(**state))
+    return digest
+
+def ticker_edges(digest, quantiles):
+    # Bin edges at the quantiles; the outer bins are open so every value of
+    # the ticker falls in one.
+    edges = digest.quantile(quantiles[1:-1])
+    return np.concatenate([[-np.inf], np.maximum.accumulate(edges), [np.inf]])
+
+# === Adaptive Analysis ===
+# Quantile axes are bound to each ticker's own edges before bucketing, and
+# the per-ticker sums add up by bucket position, so e.g. the top MACD
+# histogram decile pools the top decile of every ticker, whatever its price.
+
+ADAPTIVE_ANALYSES = {
+    "macd": [QuantileAxis("macd", "macd - macd_signal", DECILES)],
+    "rsi_macd": [Axis("rsi", "rsi", RSI_EDGES), QuantileAxis("macd", "macd - macd_signal", DECILES)],
+    "rsi_vwap": [Axis("rsi", "rsi", RSI_EDGES), QuantileAxis("vwap", "close / vwap", DECILES)],
+}
+
+def with_bins(axes, bins):
+    return [QuantileAxis(axis.name, axis.expression, np.linspace(0, 1, bins + 1).round(6).tolist())
+            if isinstance(axis, QuantileAxis) else axis for axis in axes]
+
+def analyze_adaptive(conn, tickers, axes, source="db", returns=RETURN_COLUMNS, start=None, end=None):
+    # Returns (the summarize() table over all tickers, {ticker: {axis name:
+    # edges}}). Edges come from the stored sketches over [start, end];
+    # a ticker without any gets them sketched from the rows just loaded.
+    cur = conn.cursor()
+    size = int(np.prod([axis.buckets for axis in axes]))
+    total = {"rows": np.zeros(size, dtype=np.int64),
+             "count": np.zeros((len(returns), size), dtype=np.int64),
+             "sum": np.zeros((len(returns), size)),
+             "sumsq": np.zeros((len(returns), size))}
+    edges = {}
+    for symbol in tickers:
+        df = load_labeled_data([symbol], axes, source, returns, start)
+        if end is not None:
+            df = df[df["datetime"] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+        if df.empty:
+            continue
+        columns = {c: df[c].to_numpy() for c in df.columns if c != "datetime"}
+        bound = []
+        for axis in axes:
+            if isinstance(axis, QuantileAxis):
+                digest = load_digest(cur, symbol, axis.expression, start, end)
+                if digest.count == 0:
+                    print(f"⚠️ No stored sketches for {symbol} {axis.expression}; sketching the loaded rows")
+                    digest = TDigest().update(axis.values(columns))
+                axis = axis.bind(ticker_edges(digest, axis.quantiles))
+                edges.setdefault(symbol, {})[axis.name] = axis.edges
+            bound.append(axis)
+        stats = bucket_stats(columns, bound, returns)
+        for key in total:
+            total[key] += stats[key]
+    cur.close()
+    return summarize(total, axes, returns), edges
+
+# === Main ===
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    source = "local" if "--local" in sys.argv else "db"
+    if len(args) > 1 and args[0] in ("sketch", "analyze") and args[1] in ADAPTIVE_ANALYSES:
+        start_time = time.time()
+        axes = with_bins(ADAPTIVE_ANALYSES[args[1]], int(flags["bins"])) if "bins" in flags else ADAPTIVE_ANALYSES[args[1]]
+        conn = connect()
+        tickers = [a.upper() for a in args[2:]]
+        if not tickers:
+            from quant_local_mirror import list_tickers
+            tickers = list_tickers(conn, LABEL_TABLE)
+        if args[0] == "sketch":
+            print(f"🔍 Sketching {args[1]} features for {len(tickers)} tickers")
+            read = written = 0
+            for i, symbol in enumerate(tickers, 1):
+                rows, sketches = refresh_sketches(conn, symbol, axes, source)
+                conn.commit()
+                read += rows
+                written += sketches
+                if i % 25 == 0 or i == len(tickers):
+                    print(f"📈 {i}/{len(tickers)} tickers, {read} labeled rows read, {written} day sketches written")
+        else:
+            print(f"🔍 Analyzing {args[1]} with per-ticker quantile bins for: {', '.join(tickers)}\n")
+            result, edges = analyze_adaptive(conn, tickers, axes, source, start=flags.get("start"), end=flags.get("end"))
+            print(result)
+            for symbol, by_axis in edges.items():
+                for name, values in by_axis.items():
+                    print(f"📊 {symbol} {name} edges: {', '.join(f'{v:.4g}' for v in values[1:-1])}")
+        conn.close()
+        print(f"\n⏱️ Done in {time.time() - start_time:.2f} seconds")
+    else:
+        print(f"❌ Please provide a command and an analysis ({', '.join(ADAPTIVE_ANALYSES)}). "
+              "Example: python3 quant_quantile_sketch.py sketch rsi_macd [GRRR ...] [--local] "
+              "or python3 quant_quantile_sketch.py analyze rsi_macd GRRR [AAPL ...] [--bins=10] "
+              "[--start=2025-01-01] [--end=2025-06-30] [--local]")
@@ -0,0 +1,166 @@
+import psycopg2
+import os
+import sys
+import time
+
+from quant_calendar import session_open_close
+
+# === Config ===
+DB_NAME = os.environ.get("DB_NAME")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_HOST = os.environ.get("DB_HOST")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+# Bar size in minutes; None is one bar per session. Bars cover the regular
+# session only (pre- and after-market 1min bars are left out) and are
+# anchored at the 09:30 open, so 60min bars run 09:30-10:30, ..., 15:30-16:00
+# (12:30-13:00 on early-close days).
+TIMEFRAMES = {
+    "5min": 5,
+    "15min": 15,
+    "60min": 60,
+    "daily": None,
+}
+
+STATE_TABLE = "quant_resample_state"
+
+# Loader transactions stamp fetched_at when they start, so one that commits
+# after a run has read the coverage can carry an older stamp. Each run moves
+# the watermark to its own start minus this window rather than to its start.
+OVERLAP = "5 minutes"
+
+# === Helpers ===
+def connect():
+    conn_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+    return psycopg2.connect(conn_string)
+
+def candle_table(timeframe):
+    return "quant_candles_intraday" if timeframe == "1min" else f"quant_candles_{timeframe}"
+
+def feature_table(timeframe):
+    return "quant_features_intraday" if timeframe == "1min" else f"quant_features_{timeframe}"
+
+def _create_like(cur, table, template):
+    cur.execute("SELECT to_regclass(%s);", (table,))
+    if cur.fetchone()[0] is None:
+        cur.execute(f"CREATE TABLE {table} (LIKE {template} INCLUDING DEFAULTS);")
+        cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (ticker, datetime);")
+
+def ensure_timeframe_tables(cur):
+    # Per-timeframe bar and feature tables share the 1min tables' columns.
+    for timeframe in TIMEFRAMES:
+        _create_like(cur, candle_table(timeframe), "quant_candles_intraday")
+        _create_like(cur, feature_table(timeframe), "quant_features_intraday")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            ticker TEXT PRIMARY KEY,
+            resampled_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+def _bucket_sql(minutes):
+    # s.opens: the open of the bar's session, from the sessions join.
+    if minutes is None:
+        return "s.opens"
+    seconds = minutes * 60
+    return f"s.opens + floor(extract(epoch FROM c.datetime - s.opens) / {seconds}) * interval '{seconds} seconds'"
+
+def session_bounds(days):
+    # The session days among days, with their open and close times (naive,
+    # exchange time).
+    bounds = [b for b in map(session_open_close, days) if b is not None]
+    return [b[0].date() for b in bounds], [b[0] for b in bounds], [b[1] for b in bounds]
+
+# === Resampling ===
+def touched_days(cur, symbol, full=False):
+    # Days whose 1min coverage changed since the last run, and the watermark
+    # to store once they are resampled. A ticker seen for the first time (or
+    # with full=True) gets every day it has candles for.
+    cur.execute(f"SELECT now() - interval '{OVERLAP}';")
+    watermark = cur.fetchone()[0]
+    cur.execute(f"SELECT resampled_at FROM {STATE_TABLE} WHERE ticker = %s;", (symbol,))
+    row = cur.fetchone()
+    if row is None or full:
+        cur.execute("""
+            SELECT DISTINCT datetime::date FROM quant_candles_intraday WHERE ticker = %s;
+        """, (symbol,))
+    else:
+        cur.execute("""
+            SELECT day FROM quant_candles_coverage
+            WHERE ticker = %s AND candle_count > 0 AND fetched_at > %s;
+        """, (symbol, row[0]))
+    return [r[0] for r in cur.fetchall()], watermark
+
+def resample_days(cur, symbol, days, timeframe):
+    # Rebuilds every bucket on the given days from their regular-session 1min
+    # bars. The outer range keeps the scan on the index; the join to the
+    # session bounds picks out the days and drops extended-hours bars. Bars
+    # stored outside the session (by runs before the session filter) go.
+    sessions, opens, closes = session_bounds(days)
+    cur.execute(f"""
+        DELETE FROM {candle_table(timeframe)} t
+        WHERE t.ticker = %s AND t.datetime >= %s AND t.datetime < %s::date + 1
+          AND t.datetime::date = ANY(%s::date[])
+          AND NOT EXISTS (SELECT 1 FROM unnest(%s::timestamp[], %s::timestamp[]) AS s(opens, closes)
+                          WHERE t.datetime >= s.opens AND t.datetime < s.closes);
+    """, (symbol, min(days), max(days), days, opens, closes))
+    if not opens:
+        return 0
+    cur.execute(f"""
+        INSERT INTO {candle_table(timeframe)} (ticker, datetime, open, high, low, close, volume)
+        SELECT %s, bucket,
+               (array_agg(open ORDER BY datetime))[1],
+               max(high), min(low),
+               (array_agg(close ORDER BY datetime DESC))[1],
+               sum(volume)
+        FROM (
+            SELECT c.*, {_bucket_sql(TIMEFRAMES[timeframe])} AS bucket
+            FROM quant_candles_intraday c
+            JOIN unnest(%s::date[], %s::timestamp[], %s::timestamp[]) AS s(day, opens, closes)
+              ON c.datetime::date = s.day AND c.datetime >= s.opens AND c.datetime < s.closes
+            WHERE c.ticker = %s AND c.datetime >= %s AND c.datetime < %s
+        ) bars
+        GROUP BY bucket
+        ON CONFLICT (ticker, datetime) DO UPDATE
+        SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+            close = EXCLUDED.close, volume = EXCLUDED.volume;
+    """, (symbol, sessions, opens, closes, symbol, min(opens), max(closes)))
+    return cur.rowcount
+
+def resample_ticker(conn, symbol, timeframes=None, full=False):
+    cur = conn.cursor()
+    ensure_timeframe_tables(cur)
+    days, watermark = touched_days(cur, symbol, full)
+    written = {timeframe: resample_days(cur, symbol, days, timeframe)
+               for timeframe in (timeframes or TIMEFRAMES)} if days else {}
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (ticker, resampled_at) VALUES (%s, %s)
+        ON CONFLICT (ticker) DO UPDATE SET resampled_at = EXCLUDED.resampled_at;
+    """, (symbol, watermark))
+    conn.commit()
+    cur.close()
+    if not days:
+        print(f"✅ {symbol}: nothing new to resample")
+        return
+    print(f"✅ {symbol}: resampled {len(days)} days → "
+          + ", ".join(f"{count} {timeframe}" for timeframe, count in written.items()))
+
+def list_tickers(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT ticker FROM quant_candles_coverage;")
+    tickers = sorted(row[0] for row in cur.fetchall())
+    cur.close()
+    return tickers
+
+# === Main ===
+if __name__ == "__main__":
+    start_time = time.time()
+    conn = connect()
+    # --full rebuilds every stored day, e.g. to drop extended-hours buckets
+    # written before bars were limited to the regular session.
+    tickers = [t.upper() for t in sys.argv[1:] if not t.startswith("--")] or list_tickers(conn)
+    for ticker in tickers:
+        resample_ticker(conn, ticker, full="--full" in sys.argv)
+    conn.close()
+    print(f"⏱️ Done in {time.time() - start_time:.2f} seconds")